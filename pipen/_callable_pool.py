@@ -0,0 +1,236 @@
+"""Provide CallablePool class that calls the python functions of the jobs in
+a process pool or a thread pool"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Mapping, TextIO
+
+from ._pyworker import _append, _exit_code
+
+# The files of the jobs called by the threads, for the thread executor
+_thread_streams = threading.local()
+# How many thread pools are redirecting sys.stdout and sys.stderr
+_redirecting = 0
+_redirecting_lock = threading.Lock()
+
+
+class _ThreadStream:
+    """Write to the file of the job called by the current thread, or to the
+    original stream for the other threads
+
+    Args:
+        stream: The original stream
+        index: 0 for stdout and 1 for stderr
+    """
+
+    def __init__(self, stream: TextIO, index: int) -> None:
+        self.stream = stream
+        self.index = index
+
+    def _target(self) -> TextIO:
+        streams = getattr(_thread_streams, "streams", None)
+        return self.stream if streams is None else streams[self.index]
+
+    def write(self, data: str) -> int:
+        return self._target().write(data)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+
+def _redirect_thread_streams(redirect: bool) -> None:
+    """Install (or uninstall when the last pool is shut down) the streams
+    that write to the files of the jobs called by the threads"""
+    global _redirecting
+    with _redirecting_lock:
+        _redirecting += 1 if redirect else -1
+        if redirect and _redirecting == 1:
+            sys.stdout = _ThreadStream(sys.stdout, 0)  # type: ignore
+            sys.stderr = _ThreadStream(sys.stderr, 1)  # type: ignore
+        elif not redirect and _redirecting == 0:
+            if isinstance(sys.stdout, _ThreadStream):
+                sys.stdout = sys.stdout.stream
+            if isinstance(sys.stderr, _ThreadStream):
+                sys.stderr = sys.stderr.stream
+
+
+def _call(
+    func: Callable,
+    in_: Mapping[str, Any],
+    out: Mapping[str, Any],
+    envs: Mapping[str, Any],
+) -> int:
+    """Call the function of a job, with the traceback printed to the stderr
+    if it fails
+
+    Returns:
+        The return code
+    """
+    try:
+        func(in_, out, envs)
+    except SystemExit as exc:
+        return _exit_code(exc.code)
+    except Exception as exc:
+        # Skip the frame of this function
+        tb = exc.__traceback__
+        traceback.print_exception(type(exc), exc, tb.tb_next if tb else tb)
+        return 1
+    return 0
+
+
+def _call_in_process(
+    func: Callable,
+    in_: Mapping[str, Any],
+    out: Mapping[str, Any],
+    envs: Mapping[str, Any],
+    stdout: str,
+    stderr: str,
+) -> int:
+    """Call the function of a job in a worker process, with the stdout and
+    stderr (file descriptors 1 and 2, so that the outputs of the subprocesses
+    are also captured) redirected to the files of the job"""
+    saved = os.dup(1), os.dup(2)
+    with open(stdout, "wb") as fout, open(stderr, "wb") as ferr:
+        os.dup2(fout.fileno(), 1)
+        os.dup2(ferr.fileno(), 2)
+
+    try:
+        return _call(func, in_, out, envs)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+def _call_in_thread(
+    func: Callable,
+    in_: Mapping[str, Any],
+    out: Mapping[str, Any],
+    envs: Mapping[str, Any],
+    stdout: str,
+    stderr: str,
+) -> int:
+    """Call the function of a job in a thread, with `sys.stdout` and
+    `sys.stderr` of the thread redirected to the files of the job"""
+    with open(stdout, "w") as fout, open(stderr, "w") as ferr:
+        _thread_streams.streams = (fout, ferr)
+        try:
+            return _call(func, in_, out, envs)
+        finally:
+            _thread_streams.streams = None
+
+
+class CallablePool:
+    """Call the python functions of the jobs in a process pool or a thread
+    pool
+
+    With the `process` executor, the functions are called in worker processes
+    started with `spawn`, so the functions and the data of the jobs must be
+    picklable, and the modules defining the functions must be importable
+    without running the pipeline (i.e. guarded by
+    `if __name__ == "__main__":`). If a worker dies while calling a function
+    (i.e. a segfault or `os._exit()`), the jobs running in the pool fail, and
+    new workers are started for the next jobs.
+
+    With the `thread` executor, the functions are called in the threads of
+    the main process, which suits the IO-bound jobs. Only the outputs written
+    to `sys.stdout` and `sys.stderr` are captured.
+
+    A function can't be stopped once it is called, so a killed job runs to
+    the end with its result discarded.
+
+    Args:
+        size: The number of workers
+        executor: `process` or `thread`
+    """
+
+    def __init__(self, size: int, executor: str = "process") -> None:
+        if executor not in ("process", "thread"):
+            raise ValueError(
+                f"Unknown executor: {executor!r}, expecting 'process' or 'thread'"
+            )
+        self.size = max(size, 1)
+        self.executor = executor
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        """Get the executor, start it if it is not started yet"""
+        if self._executor is None:
+            if self.executor == "thread":
+                self._executor = ThreadPoolExecutor(
+                    self.size,
+                    thread_name_prefix="pipen-callable",
+                )
+                _redirect_thread_streams(True)
+            else:
+                self._executor = ProcessPoolExecutor(
+                    self.size,
+                    # fork is not safe with the threads of the main process
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    async def run(
+        self,
+        func: Callable,
+        in_: Mapping[str, Any],
+        out: Mapping[str, Any],
+        envs: Mapping[str, Any],
+        stdout: str,
+        stderr: str,
+    ) -> int:
+        """Call the function of a job
+
+        Args:
+            func: The function, called with `in_`, `out` and `envs`
+            in_: The input data of the job
+            out: The output data of the job
+            envs: The envs of the process
+            stdout: The path of the file to save the stdout
+            stderr: The path of the file to save the stderr
+
+        Returns:
+            The return code, 0 if the function returns, 1 if it raises an
+            exception, or the code of `SystemExit`
+        """
+        executor = self._get_executor()
+        call = _call_in_thread if self.executor == "thread" else _call_in_process
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor,
+                call,
+                func,
+                in_,
+                out,
+                envs,
+                stdout,
+                stderr,
+            )
+        except BrokenProcessPool:
+            if self._executor is executor:
+                executor.shutdown(wait=False)
+                self._executor = None
+            _append(stderr, "!! Python worker exited unexpectedly")
+            return 1
+
+    def shutdown(self) -> None:
+        """Shut down the executor, without waiting for the running functions"""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        if self.executor == "thread":
+            _redirect_thread_streams(False)
@@ -0,0 +1,174 @@
+"""Provide HashCache class that caches the content hashes of files"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from panpath import PanPath, LocalPath
+
+from ._path_cache import PathCache
+
+# The size of the chunks to read when hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_local_file(path: Path) -> str:
+    """Hash a local file in chunks
+
+    Args:
+        path: The path to the file
+
+    Returns:
+        The hex digest of the content
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class HashCache:
+    """Cache the content hashes of files, keyed by the stats of the files
+
+    A file is only hashed again when its size, mtime or inode changes.
+    The cache is saved in the workdir of the pipeline, so that it is shared
+    across runs.
+
+    Args:
+        path: The path to the cache file
+        path_cache: The cache of the metadata of the paths in the run
+    """
+
+    def __init__(self, path: str | Path, path_cache: PathCache | None = None) -> None:
+        self.path = PanPath(path)
+        self.path_cache = path_cache or PathCache()
+        self._hashes: Dict[str, List[Any]] | None = None
+        self._lock = asyncio.Lock()
+        self._dirty = False
+
+    async def _load(self) -> None:
+        """Load the cache file if it is not loaded yet"""
+        async with self._lock:
+            if self._hashes is not None:
+                return
+
+            try:
+                self._hashes = json.loads(await self.path.a_read_text())
+            except Exception:
+                # not exist or broken
+                self._hashes = {}
+
+    async def empty(self) -> bool:
+        """Check if no content hashes are cached
+
+        Returns:
+            True if the cache is empty otherwise False
+        """
+        await self._load()
+        return not self._hashes
+
+    async def save(self) -> None:
+        """Save the cache file if there are any changes"""
+        if not self._dirty:
+            return
+
+        await self.path.parent.a_mkdir(parents=True, exist_ok=True)
+        await self.path.a_write_text(json.dumps(self._hashes))
+        self._dirty = False
+
+    async def _file_digest(self, path: PanPath, compute: bool) -> str:
+        """Get the content hash of a file, from the cache if its stat is unchanged
+
+        Args:
+            path: The path to the file
+            compute: Whether to hash the file if it is not cached
+
+        Returns:
+            The hex digest of the content, or an empty string if it is not
+            cached and compute is False
+        """
+        stat = await path.a_stat()
+        mtime = stat.st_mtime
+        if isinstance(mtime, datetime):
+            mtime = mtime.timestamp()
+        key = [
+            stat.st_size,
+            getattr(stat, "st_mtime_ns", None) or int(mtime * 1e9),
+            getattr(stat, "st_ino", None) or 0,
+        ]
+        cached = self._hashes.get(str(path))
+        if cached and cached[:3] == key:
+            return cached[3]
+
+        if not compute:
+            return ""
+
+        if isinstance(path, LocalPath):
+            digest = await asyncio.to_thread(_hash_local_file, path)
+        else:
+            hasher = hashlib.blake2b(digest_size=16)
+            async with path.a_open("rb") as f:
+                while True:
+                    chunk = await f.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+
+        self._hashes[str(path)] = [*key, digest]
+        self._dirty = True
+        return digest
+
+    async def digest(
+        self,
+        path: str | Path,
+        dir_depth: int = 1,
+        compute: bool = True,
+    ) -> str:
+        """Get the content hash of a path.
+
+        If path is a directory, the hash is computed from the names and the
+        hashes of the contents in the directory at given dir_depth
+
+        Args:
+            path: The path
+            dir_depth: The depth of the directory to check the contents.
+                0 means only the names of the entries are used.
+            compute: Whether to hash the files that are not cached.
+                If False, only the cached hashes are used, for example, the
+                ones recorded by the jobs that generated the files.
+
+        Returns:
+            The hex digest of the content, or an empty string if the path
+            does not exist, or any file is not cached when compute is False
+        """
+        await self._load()
+        path = PanPath(getattr(path, "path", path))  # type: ignore[abstract]
+        if not await path.a_exists():
+            return ""
+
+        target = await self.path_cache.fake_symlink_target(path)
+        if target is not None:
+            path = target
+
+        if not await path.a_is_dir():
+            return await self._file_digest(path, compute)
+
+        hasher = hashlib.blake2b(digest_size=16)
+        entries = sorted([entry async for entry in path.a_iterdir()])
+        for entry in entries:
+            hasher.update(entry.name.encode())
+            hasher.update(b"\0")
+            if dir_depth > 0:
+                entry_digest = await self.digest(entry, dir_depth - 1, compute)
+                if not entry_digest and not compute:
+                    return ""
+                hasher.update(entry_digest.encode())
+                hasher.update(b"\0")
+
+        return hasher.hexdigest()
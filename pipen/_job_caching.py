@@ -2,14 +2,14 @@
 # pyright: reportAttributeAccessIssue=false
 # pyright: reportArgumentType=false
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Dict
 from contextlib import suppress
 
 from diot import Diot
 from simpleconf import Config
 
 from .defaults import ProcInputType, ProcOutputType
-from .utils import get_mtime, path_is_symlink
+from .utils import get_mtime
 
 if TYPE_CHECKING:
     from xqute.path import SpecPath
@@ -27,6 +27,119 @@ class JobCaching:
         """
         return self.metadir / "job.signature.toml"
 
+    @property
+    def _sigmode(self) -> str:
+        """Get the sigmode of the process
+
+        Returns:
+            The sigmode, either "mtime" or "content"
+        """
+        return (
+            self.proc.pipeline.config.sigmode
+            if self.proc.sigmode is None
+            else self.proc.sigmode
+        )
+
+    async def _content_hashes(self, dirsig: int) -> Dict[str, Any]:
+        """Get the content hashes of the script, the input and output files
+
+        With sigmode "content", the files are hashed if needed, and the hashes
+        of the output files are recorded, so that the jobs of the next
+        processes can tell if their input files are changed without hashing
+        them again (early cutoff). Otherwise, only the known hashes are used.
+
+        Args:
+            dirsig: The depth to check the contents of the directories
+
+        Returns:
+            The content hashes
+        """
+        hash_cache = self.proc.pipeline.hash_cache
+        compute = self._sigmode == "content"
+        input_hashes: Dict[str, Any] = {}
+        for inkey, intype in self.proc.input.type.items():
+            if intype == ProcInputType.VAR or self.input[inkey] is None:
+                continue
+
+            if intype in (ProcInputType.FILE, ProcInputType.DIR):
+                input_hashes[inkey] = await hash_cache.digest(
+                    self.input[inkey].spec,
+                    dirsig,
+                    compute,
+                )
+            else:
+                input_hashes[inkey] = [
+                    await hash_cache.digest(file.spec, dirsig, compute)
+                    for file in self.input[inkey]
+                ]
+
+        output_hashes: Dict[str, str] = {}
+        if compute:
+            for outkey, outtype in self._output_types.items():
+                if outtype != ProcOutputType.VAR:
+                    output_hashes[outkey] = await hash_cache.digest(
+                        self.output[outkey].spec,
+                        dirsig,
+                    )
+
+        return {
+            "script": await hash_cache.digest(self.script_file, 0, compute),
+            "input": input_hashes,
+            "output": output_hashes,
+        }
+
+    async def _same_content(
+        self,
+        signature: Diot,
+        path: SpecPath,
+        dirsig: int,
+        inkey: str | None = None,
+        index: int | None = None,
+    ) -> bool:
+        """Check if the content of a newer file is the same as it was when the
+        signature was written.
+
+        With sigmode "mtime", only the known hashes are compared, for example,
+        the ones recorded by the jobs of the required processes with sigmode
+        "content" that generated the input files.
+
+        Args:
+            signature: The signature
+            path: The path to the script or the input file
+            dirsig: The depth to check the contents of the directories
+            inkey: The input key, None for the script
+            index: The index of the file for files/dirs inputs
+
+        Returns:
+            True if the content is the same otherwise False
+        """
+        try:
+            sig_hash = (
+                signature.hash.script
+                if inkey is None
+                else signature.hash.input[inkey]
+            )
+            if index is not None:
+                sig_hash = sig_hash[index]
+        except (AttributeError, KeyError, IndexError, TypeError):
+            return False
+
+        if not sig_hash:
+            return False
+
+        if (
+            await self.proc.pipeline.hash_cache.digest(
+                path,
+                dirsig,
+                self._sigmode == "content",
+            )
+            != sig_hash
+        ):
+            return False
+
+        self.log("debug", "Content unchanged, though it is newer: %s", path)
+        return True
+
     async def cache(self) -> None:
         """write signature to signature file"""
         dirsig = (
@@ -34,6 +147,7 @@ class JobCaching:
             if self.proc.dirsig is None
             else self.proc.dirsig
         )
+        path_cache = self.proc.pipeline.path_cache
         # Check if mtimes of input is greater than those of output
         try:
             max_mtime = await get_mtime(self.script_file, 0)
@@ -54,7 +168,7 @@ class JobCaching:
                     input_data[inkey] = str(self.input[inkey].spec)
                     max_mtime = max(
                         max_mtime,
-                        await get_mtime(self.input[inkey].spec, dirsig),
+                        await path_cache.get_mtime(self.input[inkey].spec, dirsig),
                     )
 
             if intype in (ProcInputType.FILES, ProcInputType.DIRS):
@@ -64,13 +178,18 @@ class JobCaching:
                     input_data[inkey] = []
                     for file in self.input[inkey]:
                         input_data[inkey].append(str(file.spec))
-                        max_mtime = max(max_mtime, await get_mtime(file.spec, dirsig))
+                        max_mtime = max(
+                            max_mtime,
+                            await path_cache.get_mtime(file.spec, dirsig),
+                        )
 
         # Make self.output serializable
         output_data = {}
         for outkey, outval in self._output_types.items():
             if outval in (ProcOutputType.FILE, ProcInputType.DIR):
                 output_data[outkey] = str(self.output[outkey].spec)
+                # The output is just written by the job
+                path_cache.invalidate(self.output[outkey].spec)
                 max_mtime = max(
                     max_mtime,
                     await get_mtime(self.output[outkey].spec, dirsig),
@@ -78,29 +197,47 @@ class JobCaching:
             else:
                 output_data[outkey] = self.output[outkey]
 
+        self._ctime = float("inf") if max_mtime == 0 else max_mtime
         signature = {
             "input": {
                 "type": self.proc.input.type,
                 "data": input_data,
             },
             "output": {"type": self._output_types, "data": output_data},
-            "ctime": float("inf") if max_mtime == 0 else max_mtime,
+            "ctime": self._ctime,
         }
+        if (
+            self._sigmode == "content"
+            or not await self.proc.pipeline.hash_cache.empty()
+        ):
+            signature["hash"] = await self._content_hashes(dirsig)
+
+        if self.proc._signature_store is not None:
+            await self.proc._signature_store.add(self.key, signature)
+            return
+
+        path_cache.invalidate(self.signature_file)
         async with self.signature_file.a_open("w") as f:
             await f.write(Diot(signature).to_toml())
 
     async def _clear_output(self) -> None:
         """Clear output if not cached"""
         self.log("debug", "Clearing previous output files.")
+        path_cache = self.proc.pipeline.path_cache
         for outkey, outval in self._output_types.items():
             if outval not in (ProcOutputType.FILE, ProcOutputType.DIR):
                 continue
 
             path = self.output[outkey].spec
-            if not await path.a_exists() and await path_is_symlink(path):  # dead link
+            exists = await path_cache.exists(path)
+            is_dir = exists and await path_cache.is_dir(path)
+            # dead link
+            is_dead_link = not exists and await path_cache.is_symlink(path)
+            path_cache.invalidate(path)
+            if is_dead_link:
                 await path.a_unlink()
-            elif await path.a_exists():
-                if not await path.a_is_dir():
+            elif exists:
+                if not is_dir:
                     await path.a_unlink()
                 else:
                     with suppress(Exception):
@@ -108,22 +245,42 @@ class JobCaching:
                     # in case rmtree fails anyhow
                     await path.a_mkdir(exist_ok=True)
 
-    async def _check_cached(self) -> bool:
-        """Check if the job is cached based on signature
+    async def _load_signature(self) -> Diot | None:
+        """Load the signature from the signature store of the process, or
+        the signature file if it is not in the store
 
         Returns:
-            True if the job is cached otherwise False
+            The signature, or None if it is not found
         """
+        if self.proc._signature_store is not None:
+            signature = await self.proc._signature_store.get(self.key)
+            if signature is not None:
+                return signature
+
+        if not await self.proc.pipeline.path_cache.is_file(self.signature_file):
+            return None
+
         async with self.signature_file.a_open("r") as sf:
-            signature = Config.load(await sf.read(), loader="tomls")
+            return Config.load(await sf.read(), loader="tomls")
+
+    async def _check_cached(self, signature: Diot) -> bool:
+        """Check if the job is cached based on signature
+
+        Args:
+            signature: The signature
 
+        Returns:
+            True if the job is cached otherwise False
+        """
         dirsig = (
             self.proc.pipeline.config.dirsig
             if self.proc.dirsig is None
             else self.proc.dirsig
         )
 
+        path_cache = self.proc.pipeline.path_cache
         try:
+            self._ctime = signature.ctime
             # check if inputs/outputs are still the same
             if (
                 signature.input.type != self.proc.input.type
@@ -134,7 +291,9 @@ class JobCaching:
 
             # check if any script file is newer
             script_mtime = await get_mtime(self.script_file, 0)
-            if script_mtime > signature.ctime + 1e-3:
+            if script_mtime > signature.ctime + 1e-3 and not (
+                await self._same_content(signature, self.script_file, 0)
+            ):
                 self.log(
                     "debug",
                     "Not cached (script file is newer: %s > %s)",
@@ -184,8 +343,11 @@ class JobCaching:
                         return False
 
                     if (
-                        await get_mtime(self.input[inkey].spec, dirsig)
+                        await path_cache.get_mtime(self.input[inkey].spec, dirsig)
                         > signature.ctime + 1e-3
+                        and not await self._same_content(
+                            signature, self.input[inkey].spec, dirsig, inkey
+                        )
                     ):
                         self.log(
                             "debug",
@@ -232,7 +394,13 @@ class JobCaching:
                             )
                             return False
 
-                        if await get_mtime(file.spec, dirsig) > signature.ctime + 1e-3:
+                        if (
+                            await path_cache.get_mtime(file.spec, dirsig)
+                            > signature.ctime + 1e-3
+                            and not await self._same_content(
+                                signature, file.spec, dirsig, inkey, i
+                            )
+                        ):
                             self.log(
                                 "debug",
                                 "Not cached (input %s:%s at index %s is newer)",
@@ -265,7 +433,7 @@ class JobCaching:
                         )
                         return False
 
-                    if not await self.output[outkey].spec.a_exists():
+                    if not await path_cache.exists(self.output[outkey].spec):
                         self.log(
                             "debug",
                             "Not cached (output %s:%s was removed)",
@@ -316,14 +484,16 @@ class JobCaching:
             else:
                 out = True
         else:
-            if not await self.signature_file.a_is_file():
+            signature = await self._load_signature()
+            if signature is None:
                 self.log(
                     "debug",
                     "Signature file not found, this is probably an obselete job.",
                 )
                 await self.cache()
+                signature = await self._load_signature()
 
-            out = await self._check_cached()
+            out = await self._check_cached(signature)
 
         if not out:
             await self._clear_output()
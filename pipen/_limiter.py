@@ -0,0 +1,85 @@
+"""Provide PrepareLimiter class that limits the number of jobs being prepared
+(and checked for caching) at the same time"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+# The most jobs to prepare at the same time with prepare_concurrency="auto"
+ADAPTIVE_MAX_CONCURRENCY = 256
+# With prepare_concurrency="auto", keep raising the limit while the average
+# time to prepare a job is within this times the best one seen
+ADAPTIVE_LATENCY_TOLERANCE = 1.5
+
+
+class PrepareLimiter:
+    """Limit the number of jobs being prepared at the same time
+
+    With `maximum` larger than `limit`, the limit is adaptive. After every
+    `limit` jobs, the average time to prepare them is compared to the best
+    one seen. The limit is doubled (up to `maximum`) if it is within
+    `ADAPTIVE_LATENCY_TOLERANCE` times the best, meaning that the file
+    system (or the cloud storage) keeps up, otherwise it is halved (down to
+    the initial limit).
+
+    Args:
+        limit: The initial limit
+        maximum: The maximum limit, None for a fixed limit
+    """
+
+    def __init__(self, limit: int, maximum: int | None = None) -> None:
+        self.minimum = self.limit = self.peak = max(limit, 1)
+        self.maximum = max(self.limit, maximum or 0)
+        self._active = 0
+        self._cond = asyncio.Condition()
+        # The best average time to prepare a job
+        self._baseline: float | None = None
+        self._elapsed = 0.0
+        self._count = 0
+
+    @property
+    def adaptive(self) -> bool:
+        """Whether the limit is adaptive"""
+        return self.maximum > self.minimum
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot and hold it while preparing a job"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.adaptive:
+                self._record(time.monotonic() - start)
+            async with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _record(self, elapsed: float) -> None:
+        """Record the time to prepare a job and adjust the limit
+
+        Args:
+            elapsed: The time to prepare the job, in seconds
+        """
+        self._elapsed += elapsed
+        self._count += 1
+        if self._count < self.limit:
+            return
+
+        latency = self._elapsed / self._count
+        self._elapsed = 0.0
+        self._count = 0
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+
+        if latency <= self._baseline * ADAPTIVE_LATENCY_TOLERANCE:
+            self.limit = min(self.limit * 2, self.maximum)
+            self.peak = max(self.peak, self.limit)
+        else:
+            self.limit = max(self.limit // 2, self.minimum)
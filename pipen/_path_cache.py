@@ -0,0 +1,366 @@
+"""Provide PathCache class that caches the metadata of paths in a run"""
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Set,
+    Tuple,
+)
+
+from panpath import PanPath, CloudPath, LocalPath
+
+from .utils import get_mtime, logger, path_is_symlink
+
+# The files with sizes out of this range can't be fake symlinks,
+# see `pipen.utils.path_is_symlink()`
+FAKE_SYMLINK_SIZE_RANGE = (8, 4096)
+
+
+async def _list_gs_objects(
+    path: CloudPath,
+) -> AsyncIterator[Tuple[str, int, float]]:
+    """List all objects under a prefix of a Google Cloud Storage bucket
+
+    Args:
+        path: The path to the prefix
+
+    Yields:
+        The keys, sizes and mtimes of the objects
+    """
+    from datetime import datetime
+
+    storage = await path.async_client._get_client()  # type: ignore
+    params = {"prefix": f"{path.key}/" if path.key else ""}
+    while True:
+        response = await storage.list_objects(path.parts[1], params=params)
+        for item in response.get("items", []):
+            yield (
+                item["name"],
+                int(item.get("size", 0)),
+                datetime.fromisoformat(
+                    item["updated"].replace("Z", "+00:00")
+                ).timestamp(),
+            )
+
+        if not response.get("nextPageToken"):
+            break
+        params["pageToken"] = response["nextPageToken"]
+
+
+async def _list_s3_objects(
+    path: CloudPath,
+) -> AsyncIterator[Tuple[str, int, float]]:
+    """List all objects under a prefix of an S3 bucket
+
+    Args:
+        path: The path to the prefix
+
+    Yields:
+        The keys, sizes and mtimes of the objects
+    """
+    client = await path.async_client._get_client()  # type: ignore
+    paginator = client.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(
+        Bucket=path.parts[1],
+        Prefix=f"{path.key}/" if path.key else "",
+    ):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["Size"], obj["LastModified"].timestamp()
+
+
+async def _list_azure_objects(
+    path: CloudPath,
+) -> AsyncIterator[Tuple[str, int, float]]:
+    """List all blobs under a prefix of an Azure Blob Storage container
+
+    Args:
+        path: The path to the prefix
+
+    Yields:
+        The names, sizes and mtimes of the blobs
+    """
+    client = await path.async_client._get_client()  # type: ignore
+    container = client.get_container_client(path.parts[1])
+    async for blob in container.list_blobs(
+        name_starts_with=f"{path.key}/" if path.key else ""
+    ):
+        yield blob.name, blob.size, blob.last_modified.timestamp()
+
+
+# The functions to list all objects under a prefix, with pagination,
+# by the scheme of the cloud paths
+OBJECT_LISTERS: Dict[
+    str,
+    Callable[[CloudPath], AsyncIterator[Tuple[str, int, float]]],
+] = {
+    "gs": _list_gs_objects,
+    "s3": _list_s3_objects,
+    "az": _list_azure_objects,
+    "azure": _list_azure_objects,
+}
+
+
+class PathCache:
+    """Cache the metadata of paths during a run
+
+    The same files (i.e. reference files) are usually the inputs of all the
+    jobs of a process, or even of multiple processes. With this cache, their
+    metadata are only fetched once in a run, instead of once per job.
+    The entries of a path are invalidated when a job writes to it.
+
+    Concurrent requests of the same entry share the same fetching.
+
+    Cloud directories can also be prefetched, with a few list requests, so
+    that the existence, sizes and mtimes of the objects under them are
+    answered from the listing, instead of a request for each object.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Dict[Tuple[Any, ...], asyncio.Future]] = {}
+        # The objects listed by prefetch(), path => (size, mtime)
+        self._objects: Dict[str, Tuple[int, float]] = {}
+        # The directories implied by the listed objects
+        self._dirs: Set[str] = set()
+        # The prefetched directories
+        self._listed: Set[str] = set()
+        # The paths written after they are listed
+        self._written: Set[str] = set()
+
+    async def _get(
+        self,
+        path: str | Path,
+        key: Tuple[Any, ...],
+        getter: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Get the entry of a path, fetch it if it is not cached
+
+        Args:
+            path: The path
+            key: The key of the entry
+            getter: The function to fetch the entry
+
+        Returns:
+            The entry
+        """
+        entries = self._entries.setdefault(str(path), {})
+        future = entries.get(key)
+        if future is None:
+            future = entries[key] = asyncio.ensure_future(getter())
+
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Don't cache the failures, i.e. the path does not exist yet
+            if entries.get(key) is future:
+                del entries[key]
+            raise
+
+    def invalidate(self, path: str | Path) -> None:
+        """Invalidate the entries of a path
+
+        The listed objects under the path are also not used anymore.
+
+        Args:
+            path: The path
+        """
+        self._entries.pop(str(path), None)
+        if self._listed:
+            self._written.add(str(path))
+
+    async def prefetch(self, path: str | Path) -> None:
+        """List all objects under a cloud directory
+
+        Nothing is done for local paths or clouds without listers.
+        If the listing fails, the metadata are fetched for each path as usual.
+
+        Args:
+            path: The path to the directory
+        """
+        if not isinstance(path, CloudPath):
+            return
+
+        lister = OBJECT_LISTERS.get(path.parts[0].rstrip(":"))
+        if lister is None:
+            return
+
+        base = str(path)
+        objects: Dict[str, Tuple[int, float]] = {}
+        dirs = {base}
+        try:
+            async for key, size, mtime in lister(path):
+                objpath = f"{path.cloud_prefix}/{key.rstrip('/')}"
+                if key.endswith("/"):  # directory marker
+                    dirs.add(objpath)
+                else:
+                    objects[objpath] = (size, mtime)
+
+                parent = objpath.rpartition("/")[0]
+                while len(parent) > len(base) and parent not in dirs:
+                    dirs.add(parent)
+                    parent = parent.rpartition("/")[0]
+        except Exception as exc:
+            logger.debug("Failed to list %s: %s", base, exc)
+            return
+
+        def _outdated(p: str) -> bool:
+            return p == base or p.startswith(f"{base}/")
+
+        if base in self._listed:
+            self._objects = {
+                p: obj for p, obj in self._objects.items() if not _outdated(p)
+            }
+            self._dirs = {p for p in self._dirs if not _outdated(p)}
+
+        self._objects.update(objects)
+        self._dirs.update(dirs)
+        self._listed.add(base)
+        # The listing is newer than the writes
+        self._written = {p for p in self._written if not _outdated(p)}
+
+    def _listed_entry(self, path: str | Path) -> Tuple[str, int, float] | None:
+        """Get the entry of a path from the prefetched listings
+
+        Args:
+            path: The path
+
+        Returns:
+            None if the path is not under any prefetched directories, or it
+            is written after listed. Otherwise, a tuple of the kind
+            ("file", "dir" or "missing"), the size and the mtime.
+        """
+        if not self._listed:
+            return None
+
+        path = str(path)
+        listed = False
+        node = path
+        while node:
+            if node in self._written:
+                return None
+            listed = listed or node in self._listed
+            node = node.rpartition("/")[0]
+
+        if not listed:
+            return None
+        if path in self._objects:
+            return ("file", *self._objects[path])
+        if path in self._dirs:
+            return ("dir", 0, 0.0)
+        return ("missing", 0, 0.0)
+
+    async def exists(self, path: Path) -> bool:
+        """Check if a path exists
+
+        Args:
+            path: The path
+
+        Returns:
+            True if the path exists otherwise False
+        """
+        entry = self._listed_entry(path)
+        if entry is None:
+            return await path.a_exists()  # type: ignore[attr-defined]
+        return entry[0] != "missing"
+
+    async def is_file(self, path: Path) -> bool:
+        """Check if a path is a file
+
+        Args:
+            path: The path
+
+        Returns:
+            True if the path is a file otherwise False
+        """
+        entry = self._listed_entry(path)
+        if entry is None:
+            return await path.a_is_file()  # type: ignore[attr-defined]
+        return entry[0] == "file"
+
+    async def is_dir(self, path: Path) -> bool:
+        """Check if a path is a directory
+
+        Args:
+            path: The path
+
+        Returns:
+            True if the path is a directory otherwise False
+        """
+        entry = self._listed_entry(path)
+        if entry is None:
+            return await path.a_is_dir()  # type: ignore[attr-defined]
+        return entry[0] == "dir"
+
+    async def is_symlink(self, path: Path) -> bool:
+        """Check if a path is a symlink, see `pipen.utils.path_is_symlink()`
+
+        Args:
+            path: The path
+
+        Returns:
+            True if the path is a symlink otherwise False
+        """
+        entry = self._listed_entry(path)
+        if entry is not None and (
+            entry[0] != "file"
+            or not FAKE_SYMLINK_SIZE_RANGE[0]
+            <= entry[1]
+            <= FAKE_SYMLINK_SIZE_RANGE[1]
+        ):
+            return False
+        return await path_is_symlink(path)  # type: ignore[arg-type]
+
+    async def get_mtime(self, path: str | Path, dir_depth: int = 1) -> float:
+        """Get the modification time of a path, see `pipen.utils.get_mtime()`
+
+        Args:
+            path: The path
+            dir_depth: The depth of the directory to check
+
+        Returns:
+            The last modification time of path
+        """
+
+        async def _mtime() -> float:
+            entry = self._listed_entry(path)
+            if (
+                entry is not None
+                and entry[0] == "file"
+                and not await self.is_symlink(path)
+            ):
+                return entry[2]
+            return await get_mtime(path, dir_depth)
+
+        return await self._get(path, ("mtime", dir_depth), _mtime)
+
+    async def fake_symlink_target(self, path: str | Path) -> PanPath | None:
+        """Get the target of a fake symlink created by
+        `pipen.utils.path_symlink_to()`
+
+        Args:
+            path: The path
+
+        Returns:
+            The target of the fake symlink, or None if path is not a
+            fake symlink
+        """
+
+        async def _target() -> PanPath | None:
+            p = PanPath(getattr(path, "path", path))  # type: ignore[abstract]
+            if isinstance(p, LocalPath) and await p.a_is_symlink():
+                return None
+            if not await self.is_symlink(p):
+                return None
+
+            return PanPath(  # type: ignore[abstract]
+                (await p.a_read_text())
+                .removeprefix("symlink:")
+                .removeprefix("pipen-symlink:")
+            )
+
+        return await self._get(path, ("fake_symlink_target",), _target)
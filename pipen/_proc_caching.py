@@ -0,0 +1,467 @@
+"""Provide ProcCaching class that implements caching for processes"""
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportArgumentType=false
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Sequence
+
+from xqute.path import MountedPath
+
+from .defaults import ProcInputType, ProcOutputType
+from .job import (
+    _output_data_from_json,
+    _output_data_to_json,
+    _process_input_file_or_dir,
+)
+from .utils import get_mtime
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas
+    from xqute.path import SpecPath
+
+
+def _json_default(obj: Any) -> str:
+    """Serialize the objects that are not JSON serializable for fingerprints
+
+    Callables (i.e. filters passed to the template engine) are serialized by
+    their qualified names, since their reprs contain the memory addresses.
+    """
+    if callable(obj):
+        return f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', obj)}"
+    return repr(obj)
+
+
+def _fingerprint(obj: Any) -> str:
+    """Get the fingerprint of an object
+
+    Args:
+        obj: The object
+
+    Returns:
+        The sha256 hex digest of the JSON representation of the object
+    """
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, default=_json_default).encode()
+    ).hexdigest()
+
+
+class ProcCaching:
+    """Provide caching functionality of processes
+
+    With `manifest_check`, when a process is done successfully, a manifest is
+    saved with the fingerprints of the input data and the templates, together
+    with the output data. Next time, if the manifest matches, the process is
+    marked as cached, and the output data is restored from the manifest,
+    without constructing any jobs.
+    """
+
+    @property
+    def manifest_file(self) -> SpecPath:
+        """Get the path to the manifest file
+
+        Returns:
+            The path to the manifest file
+        """
+        return self.workdir / "proc.manifest.json"
+
+    @property
+    def output_data_file(self) -> SpecPath:
+        """Get the path to the file where the output data is saved with the
+        fingerprints, to be loaded by the next runs (`manifest_check =
+        "fingerprint"`), or after it is released (`release_output_data =
+        "spill"`)
+
+        Returns:
+            The path to the file
+        """
+        return self.workdir / "proc.output.json"
+
+    def _input_fingerprint(self) -> str:
+        """Get the fingerprint of the input types and data
+
+        Returns:
+            The fingerprint
+        """
+        data = self.input.data
+        return _fingerprint(
+            {
+                "type": self.input.type,
+                "columns": list(data.columns),
+                "data": data.values.tolist(),
+            }
+        )
+
+    def _template_fingerprint(self) -> str:
+        """Get the fingerprint of the script, output and other settings that
+        affect the rendering of the jobs
+
+        Returns:
+            The fingerprint
+        """
+        return _fingerprint(
+            {
+                "script": self._script_source,
+                "output": self.__class__.output,
+                "lang": self.lang or self.pipeline.config.lang,
+                "envs": self.envs,
+                "template": self.template,
+                "template_opts": self.template_opts,
+                "export": self.export,
+                "output_flatten": self.output_flatten,
+                "export_dir": str(self._export_dir),
+                "scheduler": self.scheduler.name,
+            }
+        )
+
+    def _compute_job_keys(self) -> List[str] | None:
+        """Compute the keys of the jobs from the hashes of the input rows,
+        if `job_key` is "input"
+
+        The duplicated rows are distinguished by their occurrences, i.e.
+        `<hash>`, `<hash>-1`, `<hash>-2`, etc.
+
+        Returns:
+            The keys of the jobs, or None if the jobs are keyed by indexes
+        """
+        job_key = (
+            self.pipeline.config.job_key if self.job_key is None else self.job_key
+        )
+        if job_key != "input":
+            return None
+
+        if self.stream:
+            self.log(
+                "warning",
+                "job_key = 'input' is not supported for streaming processes, "
+                "using 'index'.",
+            )
+            return None
+
+        data = self.input.data
+        columns = list(data.columns)
+        keys = []
+        occurrences: Dict[str, int] = {}
+        for row in data.itertuples(index=False, name=None):
+            key = _fingerprint(dict(zip(columns, row)))[:16]
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            keys.append(f"{key}-{occurrence}" if occurrence else key)
+
+        return keys
+
+    def _job_key(self, index: int) -> str:
+        """Get the key of a job, which is the name of its metadir
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            The key of the job
+        """
+        if self._job_keys is None:
+            return str(index)
+        return self._job_keys[index]
+
+    async def _clear_manifest(self) -> None:
+        """Remove the manifest and the saved output data before the jobs run"""
+        if await self.manifest_file.a_exists():
+            await self.manifest_file.a_unlink()
+        if await self.output_data_file.a_exists():
+            await self.output_data_file.a_unlink()
+
+    async def _write_manifest(self) -> None:
+        """Write the manifest after all jobs are done successfully"""
+        jobs = sorted(self.jobs, key=lambda job: job.index)
+        output_types = jobs[0]._output_types if jobs else {}
+        output_data = []
+        for job in jobs:
+            output_data.append(
+                [
+                    (
+                        job.output[outkey]
+                        if outtype == ProcOutputType.VAR
+                        else [str(job.output[outkey]), str(job.output[outkey].spec)]
+                    )
+                    for outkey, outtype in output_types.items()
+                ]
+            )
+
+        manifest = {
+            "input": self._input_fingerprint(),
+            "template": self._template_fingerprint(),
+            "size": self.size,
+            "output": {"type": output_types, "data": output_data},
+            "ctime": [job._ctime for job in jobs],
+        }
+        await self.manifest_file.a_write_text(json.dumps(manifest))
+
+    async def _check_manifest_rows(
+        self,
+        indexes: Iterable[int],
+        ctimes: Sequence[float],
+        output_rows: List[Dict[str, Any]],
+        output_types: Dict[str, str],
+        dirsig: int,
+    ) -> bool:
+        """Check if the files of the jobs are still intact
+
+        The number of jobs checked at the same time is limited by
+        `prepare_concurrency`, like how the jobs are prepared.
+
+        Args:
+            indexes: The indexes of the jobs to check, an iterator shared by
+                the lanes to take the next job from
+            ctimes: The ctimes from the signatures of the jobs
+            output_rows: The output data restored from the manifest
+            output_types: The output types
+            dirsig: The depth to check the input directories
+
+        Returns:
+            True if all files are intact otherwise False
+        """
+        for i in indexes:
+            async with self._prepare_limiter.slot():
+                if not await self._check_manifest_row(
+                    i, ctimes, output_rows, output_types, dirsig
+                ):
+                    return False
+
+        return True
+
+    async def _check_manifest_row(
+        self,
+        i: int,
+        ctimes: Sequence[float],
+        output_rows: List[Dict[str, Any]],
+        output_types: Dict[str, str],
+        dirsig: int,
+    ) -> bool:
+        """Check if the files of a job are still intact
+
+        These are the same checks as the job signatures do for the files,
+        which can't be covered by the fingerprints.
+
+        Args:
+            i: The index of the job
+            ctimes: The ctimes from the signatures of the jobs
+            output_rows: The output data restored from the manifest
+            output_types: The output types
+            dirsig: The depth to check the input directories
+
+        Returns:
+            True if all files are intact otherwise False
+        """
+        data = self.input.data
+        path_cache = self.pipeline.path_cache
+        ctime = ctimes[i]
+        key = self._job_key(i)
+        metadir = self.workdir / key
+        if (
+            self._signature_store is None
+            or await self._signature_store.get(key) is None
+        ) and not await path_cache.is_file(metadir / "job.signature.toml"):
+            self.log("debug", "Manifest not matched (job #%s signature removed)", i)
+            return False
+
+        if await get_mtime(metadir / "job.script", 0) > ctime + 1e-3:
+            self.log("debug", "Manifest not matched (job #%s script is newer)", i)
+            return False
+
+        for j, (inkey, intype) in enumerate(self.input.type.items()):
+            inval = data.iat[i, j]
+            if intype == ProcInputType.VAR or inval is None:
+                continue
+
+            if intype in (ProcInputType.FILE, ProcInputType.DIR):
+                infiles = [inval]
+            elif isinstance(inval, (str, Path)):
+                infiles = [inval]
+            else:
+                infiles = inval
+
+            for infile in infiles:
+                infile = _process_input_file_or_dir(
+                    inkey, intype, infile, None, self.name
+                )
+                if await path_cache.get_mtime(infile.spec, dirsig) > ctime + 1e-3:
+                    self.log(
+                        "debug",
+                        "Manifest not matched (job #%s input %s is newer)",
+                        i,
+                        inkey,
+                    )
+                    return False
+
+        for outkey, outtype in output_types.items():
+            if outtype == ProcOutputType.VAR:
+                continue
+
+            if not await path_cache.exists(output_rows[i][outkey].spec):
+                self.log(
+                    "debug",
+                    "Manifest not matched (job #%s output %s was removed)",
+                    i,
+                    outkey,
+                )
+                return False
+
+        return True
+
+    def _manifest_check(self) -> str | None:
+        """Get how to check if the process is cached as a whole
+
+        Returns:
+            "files", "fingerprint", or None if the manifest is not used
+        """
+        manifest_check = (
+            self.pipeline.config.manifest_check
+            if self.manifest_check is None
+            else self.manifest_check
+        )
+        return manifest_check or None
+
+    def _manifest_usable(self) -> bool:
+        """Check if the process can be cached as a whole, by the manifest or
+        the saved output data
+
+        Returns:
+            True if `manifest_check` is set, caching is enabled (but not
+            forced), the process is not streaming, and all the required
+            processes are cached
+        """
+        proc_cache = (
+            self.pipeline.config.cache if self.cache is None else self.cache
+        )
+        # "force" has to write the signatures of the jobs
+        if (
+            not self._manifest_check()
+            or not proc_cache
+            or proc_cache == "force"
+            or self.stream
+        ):
+            return False
+
+        return all(
+            req._INSTANCES[req]._all_cached  # type: ignore
+            for req in self.requires or ()
+        )
+
+    async def _save_output_channel(self) -> None:
+        """Save the output data (`_output_channel`) with the fingerprints to
+        `output_data_file`, as JSON, since the working directory may be
+        shared"""
+        await self.output_data_file.a_write_text(
+            json.dumps(
+                {
+                    "size": self.size,
+                    "input": self._input_fingerprint(),
+                    "template": self._template_fingerprint(),
+                    "data": _output_data_to_json(self._output_channel),
+                },
+                default=str,
+            )
+        )
+        self._output_data_saved = True
+
+    async def _load_output_channel(self) -> pandas.DataFrame | None:
+        """Load the output data saved by the last run if the fingerprints
+        match, with `manifest_check = "fingerprint"`
+
+        Unlike `_check_manifest()`, the files of the jobs are not checked, so
+        that it takes no time to resume a pipeline from a process with a
+        large number of jobs.
+
+        Returns:
+            The output data if the process is cached, otherwise None
+        """
+        if self._manifest_check() != "fingerprint" or not self._manifest_usable():
+            return None
+
+        if not await self.pipeline.path_cache.is_file(self.output_data_file):
+            return None
+
+        try:
+            saved = json.loads(await self.output_data_file.a_read_text())
+            if (
+                saved["size"] != self.size
+                or saved["input"] != self._input_fingerprint()
+                or saved["template"] != self._template_fingerprint()
+            ):
+                self.log("debug", "Saved output data not matched")
+                return None
+        except Exception as exc:
+            self.log("debug", "Saved output data not matched (%s)", exc)
+            return None
+
+        return _output_data_from_json(saved["data"])
+
+    async def _check_manifest(self) -> List[Dict[str, Any]] | None:
+        """Check if the process is cached based on the manifest
+
+        Returns:
+            The output data restored from the manifest if the process is
+            cached, otherwise None
+        """
+        if not self._manifest_usable():
+            return None
+
+        if not await self.pipeline.path_cache.is_file(self.manifest_file):
+            return None
+
+        dirsig = (
+            self.pipeline.config.dirsig if self.dirsig is None else self.dirsig
+        )
+
+        try:
+            manifest = json.loads(await self.manifest_file.a_read_text())
+            if manifest["size"] != self.size:
+                self.log("debug", "Manifest not matched (number of jobs changed)")
+                return None
+
+            if manifest["input"] != self._input_fingerprint():
+                self.log("debug", "Manifest not matched (input changed)")
+                return None
+
+            if manifest["template"] != self._template_fingerprint():
+                self.log("debug", "Manifest not matched (script or output changed)")
+                return None
+
+            output_types = manifest["output"]["type"]
+            output_rows = [
+                {
+                    outkey: (
+                        outval
+                        if outtype == ProcOutputType.VAR
+                        else MountedPath(outval[0], spec=outval[1])
+                    )
+                    for (outkey, outtype), outval in zip(output_types.items(), row)
+                }
+                for row in manifest["output"]["data"]
+            ]
+
+            # check the files in lanes, like how the jobs are prepared
+            indexes = iter(range(self.size))
+            lanes = await asyncio.gather(
+                *(
+                    self._check_manifest_rows(
+                        indexes,
+                        manifest["ctime"],
+                        output_rows,
+                        output_types,
+                        dirsig,
+                    )
+                    for _ in range(self._prepare_limiter.maximum)
+                )
+            )
+        except Exception as exc:
+            self.log("debug", "Manifest not matched (%s)", exc)
+            return None
+
+        if not all(lanes):
+            return None
+
+        return output_rows
@@ -0,0 +1,344 @@
+"""Provide PythonWorkerPool class that runs the python scripts of the jobs in
+warm worker processes
+
+This file is also the script of the worker processes, which are started by
+the interpreters of the jobs, where pipen may not be installed. So only the
+standard library is used here.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import os
+import runpy
+import signal
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Mapping, Sequence
+
+# How often (in seconds) a worker checks if the main process is still alive
+WORKER_WATCH_INTERVAL = 1.0
+
+
+class PythonWorkerPool:
+    """Run the python scripts of the jobs in warm worker processes
+
+    A worker imports the `preload` modules once when it starts, and then runs
+    the scripts of the jobs one after another with `runpy.run_path()`, in a
+    fresh namespace (as `__main__`), with the stdout and stderr (file
+    descriptors 1 and 2, so that the outputs of the subprocesses are also
+    captured) redirected to the files of the job. The environment variables,
+    the working directory, `sys.argv` and `sys.path` are restored after each
+    job. The modules imported by the jobs are kept, so that the next jobs
+    don't import them again.
+
+    A worker is killed and replaced after `max_jobs` jobs, to release the
+    memory that the jobs may leak. If a worker dies while running a job
+    (i.e. a segfault or `os._exit()`), only that job fails, and a new worker
+    is started for the next jobs.
+
+    Args:
+        size: The number of worker processes
+        preload: The modules to import when a worker starts
+        max_jobs: How many jobs a worker runs before it is replaced,
+            0 to never replace the workers
+        timeout: The timeout (in seconds) of a job, 0 for no timeout
+    """
+
+    def __init__(
+        self,
+        size: int,
+        preload: Sequence[str] = (),
+        max_jobs: int = 0,
+        timeout: float = 0,
+    ) -> None:
+        self.size = max(size, 1)
+        self.preload = list(preload)
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        # The number of workers started, for debugging
+        self.spawned = 0
+        # The idle workers by the interpreters
+        self._idle: Dict[str, List[asyncio.subprocess.Process]] = {}
+        # The busy workers by the keys of the jobs
+        self._busy: Dict[Any, asyncio.subprocess.Process] = {}
+        # The number of jobs run by the workers, by their pids
+        self._jobs: Dict[int, int] = {}
+        self._semaphore = asyncio.Semaphore(self.size)
+
+    async def run(
+        self,
+        key: Any,
+        interpreter: str,
+        script: str,
+        stdout: str,
+        stderr: str,
+        envs: Mapping[str, Any] | None = None,
+        cwd: str | None = None,
+    ) -> int:
+        """Run a python script in a worker
+
+        Args:
+            key: The key of the job, to kill it with `kill()`
+            interpreter: The python interpreter of the job
+            script: The path of the script
+            stdout: The path of the file to save the stdout
+            stderr: The path of the file to save the stderr
+            envs: The environment variables for the job
+            cwd: The working directory for the job
+
+        Returns:
+            The return code, 124 if it timed out, or 128 plus the signal if
+            the worker is killed by the signal, like bash does
+        """
+        request = json.dumps(
+            {
+                "script": script,
+                "stdout": stdout,
+                "stderr": stderr,
+                "envs": {key: str(val) for key, val in (envs or {}).items()},
+                "cwd": cwd,
+            }
+        )
+        async with self._semaphore:
+            worker = await self._acquire(interpreter)
+            self._busy[key] = worker
+            try:
+                worker.stdin.write(request.encode() + b"\n")  # type: ignore
+                await worker.stdin.drain()  # type: ignore
+                reply = await self._reply(worker, self.timeout or None)
+            except asyncio.TimeoutError:
+                self._jobs.pop(worker.pid, None)
+                worker.kill()
+                await worker.wait()
+                _append(stderr, f"!! Job timed out after {self.timeout} seconds")
+                return 124
+            finally:
+                self._busy.pop(key, None)
+
+            if reply is None:
+                self._jobs.pop(worker.pid, None)
+                rc = worker.returncode
+                _append(stderr, f"!! Python worker exited unexpectedly (rc={rc})")
+                return 128 - rc if rc < 0 else rc or 1
+
+            self._release(interpreter, worker)
+            return int(reply["rc"])
+
+    def kill(self, key: Any) -> bool:
+        """Kill the worker running a job
+
+        Args:
+            key: The key of the job
+
+        Returns:
+            True if the job is running in a worker, otherwise False
+        """
+        worker = self._busy.get(key)
+        if worker is None:
+            return False
+        if worker.returncode is None:
+            worker.kill()
+        return True
+
+    def shutdown(self) -> None:
+        """Kill all the workers"""
+        for worker in [
+            *(worker for workers in self._idle.values() for worker in workers),
+            *self._busy.values(),
+        ]:
+            if worker.returncode is None:
+                worker.kill()
+        self._idle = {}
+        self._busy = {}
+
+    async def _acquire(self, interpreter: str) -> asyncio.subprocess.Process:
+        """Get an idle worker of the interpreter, or start a new one"""
+        idle = self._idle.get(interpreter, [])
+        while idle:
+            worker = idle.pop()
+            if worker.returncode is None:
+                return worker
+
+        worker = await asyncio.create_subprocess_exec(
+            interpreter,
+            __file__,
+            *self.preload,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # Not to receive the signals (i.e. SIGINT) to the main process
+            start_new_session=True,
+        )
+        self.spawned += 1
+        self._jobs[worker.pid] = 0
+        # Wait for the modules to be imported
+        if await self._reply(worker, None) is None:
+            raise RuntimeError(
+                f"Python worker exited unexpectedly (rc={worker.returncode}): "
+                f"{interpreter}"
+            )
+        return worker
+
+    def _release(self, interpreter: str, worker: asyncio.subprocess.Process) -> None:
+        """Put the worker back to the idle ones, or kill it if it has run
+        `max_jobs` jobs"""
+        self._jobs[worker.pid] += 1
+        if self.max_jobs and self._jobs[worker.pid] >= self.max_jobs:
+            del self._jobs[worker.pid]
+            worker.kill()
+        else:
+            self._idle.setdefault(interpreter, []).append(worker)
+
+    @staticmethod
+    async def _reply(
+        worker: asyncio.subprocess.Process,
+        timeout: float | None,
+    ) -> Dict[str, Any] | None:
+        """Wait for the reply of a worker
+
+        The exit of the worker is waited at the same time, since the end of
+        its stdout may not be seen, when the pipe is inherited by the other
+        subprocesses.
+
+        Returns:
+            The reply, or None if the worker exits
+
+        Raises:
+            asyncio.TimeoutError: If the timeout is reached
+        """
+        reading = asyncio.ensure_future(worker.stdout.readline())  # type: ignore
+        exiting = asyncio.ensure_future(worker.wait())
+        try:
+            done, _ = await asyncio.wait(
+                (reading, exiting),
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            exiting.cancel()
+            reading.cancel()
+
+        if not done:
+            raise asyncio.TimeoutError
+
+        if reading in done and reading.result():
+            return json.loads(reading.result())
+
+        await worker.wait()
+        return None
+
+
+def _append(path: str, message: str) -> None:
+    """Append a message to a file, like the wrapper of the job does"""
+    with open(path, "a") as fout:
+        fout.write(f"\n\n{message}\n")
+
+
+def _exit_code(code: Any) -> int:
+    """Get the return code from the code of SystemExit, like python does"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_job(request: Dict[str, Any], devnull: int, stderr: int) -> int:
+    """Run the script of a job in the worker
+
+    Args:
+        request: The request from the main process
+        devnull: The file descriptor of /dev/null, for the stdout of the worker
+        stderr: The file descriptor of the stderr of the worker
+
+    Returns:
+        The return code
+    """
+    environ = dict(os.environ)
+    cwd = os.getcwd()
+    argv = sys.argv[:]
+    path = sys.path[:]
+    with open(request["stdout"], "wb") as fout, open(request["stderr"], "wb") as ferr:
+        os.dup2(fout.fileno(), 1)
+        os.dup2(ferr.fileno(), 2)
+
+    try:
+        os.environ.update(request["envs"])
+        if request["cwd"]:
+            os.chdir(request["cwd"])
+        sys.argv = [request["script"]]
+        # like `python <script>` does
+        sys.path.insert(0, os.path.dirname(os.path.abspath(request["script"])))
+        runpy.run_path(request["script"], run_name="__main__")
+        rc = 0
+    except SystemExit as exc:
+        rc = _exit_code(exc.code)
+    except BaseException as exc:
+        # Skip the frames of the worker
+        tb = exc.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["script"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(exc), exc, tb or exc.__traceback__)
+        rc = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(devnull, 1)
+        os.dup2(stderr, 2)
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+        sys.argv = argv
+        sys.path[:] = path
+
+    return rc
+
+
+def _watch_parent(parent: int) -> None:
+    """Exit the worker when the main process is gone"""
+    while os.getppid() == parent:
+        time.sleep(WORKER_WATCH_INTERVAL)
+    os._exit(1)
+
+
+def main(preload: Sequence[str]) -> None:
+    """The entry of the worker processes
+
+    The requests are read from stdin and the replies are written to stdout,
+    one JSON object per line. The file descriptors are duplicated, so that
+    the jobs can't read or write them.
+
+    Args:
+        preload: The modules to import
+    """
+    requests = os.fdopen(os.dup(0), "r")
+    replies = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    stderr = os.dup(2)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # The directory of this file, not to shadow the modules of the jobs
+    sys.path.pop(0)
+
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            traceback.print_exc()
+
+    threading.Thread(target=_watch_parent, args=(os.getppid(),), daemon=True).start()
+    replies.write(json.dumps({"ready": True}) + "\n")
+    replies.flush()
+    for line in requests:
+        rc = _run_job(json.loads(line), devnull, stderr)
+        replies.write(json.dumps({"rc": rc}) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,292 @@
+"""Provide RunDB class that records the status of the runs in a SQLite
+database"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Set, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .job import Job
+    from .proc import Proc
+
+# How many job updates to buffer before writing them to the database
+RUN_DB_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline TEXT NOT NULL,
+    profile TEXT,
+    started REAL,
+    ended REAL,
+    succeeded INTEGER
+);
+CREATE TABLE IF NOT EXISTS procs (
+    run_id INTEGER NOT NULL,
+    proc TEXT NOT NULL,
+    size INTEGER,
+    status TEXT,
+    started REAL,
+    ended REAL,
+    PRIMARY KEY (run_id, proc)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id INTEGER NOT NULL,
+    proc TEXT NOT NULL,
+    job_index INTEGER NOT NULL,
+    status TEXT,
+    rc INTEGER,
+    jid TEXT,
+    trial_count INTEGER,
+    queued REAL,
+    submitted REAL,
+    started REAL,
+    ended REAL,
+    PRIMARY KEY (run_id, proc, job_index)
+);
+"""
+
+_JOB_FIELDS = (
+    "status",
+    "rc",
+    "jid",
+    "trial_count",
+    "queued",
+    "submitted",
+    "started",
+    "ended",
+)
+
+
+class RunDB:
+    """Record the status of the runs, processes and jobs of a pipeline in a
+    SQLite database, so that they can be queried without walking through
+    the working directories of the jobs.
+
+    The updates of the jobs are buffered and written in batches, as well as
+    when a process is done. The writes are done in a single writer thread,
+    in the order they are requested, so that the event loop is not blocked
+    by the database (e.g. waiting for the lock of it).
+
+    Args:
+        path: The path to the database file
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.run_id: int | None = None
+        self._conn: sqlite3.Connection | None = None
+        # (proc, index) => the fields of the job
+        self._jobs: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._dirty: Set[Tuple[str, int]] = set()
+        # The threads are only started with the first write
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="pipen-run-db")
+        # The batches of job updates being written
+        self._pending: List[Future] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the database and create the tables if needed
+
+        Returns:
+            The connection
+        """
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # created by the writer thread, but may be queried by others
+            self._conn = sqlite3.connect(
+                self.path,
+                timeout=30,
+                check_same_thread=False,
+            )
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    async def _write(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Call a function that writes the database in the writer thread
+
+        Args:
+            func: The function
+            *args: The arguments of the function
+
+        Returns:
+            The return value of the function
+        """
+        return await asyncio.wrap_future(self._writer.submit(func, *args))
+
+    def _insert_run(self, pipeline: str, profile: str, started: float) -> int:
+        """Insert a run, in the writer thread"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (pipeline, profile, started) VALUES (?, ?, ?)",
+                (pipeline, profile, started),
+            )
+        return cursor.lastrowid  # type: ignore[return-value]
+
+    def _update_run(self, succeeded: bool, ended: float) -> None:
+        """Update the end of the run and close the database, in the writer
+        thread"""
+        with self._conn:  # type: ignore[union-attr]
+            self._conn.execute(  # type: ignore[union-attr]
+                "UPDATE runs SET ended = ?, succeeded = ? WHERE run_id = ?",
+                (ended, int(succeeded), self.run_id),
+            )
+        self._conn.close()  # type: ignore[union-attr]
+        self._conn = None
+
+    def _upsert_proc(self, row: Tuple[Any, ...]) -> None:
+        """Insert or update a process, in the writer thread"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO procs (run_id, proc, size, status, started) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, proc) DO UPDATE SET "
+                "status = excluded.status, ended = ?",
+                row,
+            )
+
+    def _upsert_jobs(self, rows: List[Tuple[Any, ...]]) -> None:
+        """Insert or update the jobs, in the writer thread"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO jobs "
+                f"(run_id, proc, job_index, {', '.join(_JOB_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(_JOB_FIELDS))})",
+                rows,
+            )
+
+    async def start_run(self, pipeline: str, profile: str) -> None:
+        """Record the start of a run
+
+        Args:
+            pipeline: The name of the pipeline
+            profile: The profile used to run the pipeline
+        """
+        self.run_id = await self._write(
+            self._insert_run,
+            pipeline,
+            profile,
+            time.time(),
+        )
+
+    async def end_run(self, succeeded: bool) -> None:
+        """Record the end of a run and close the database
+
+        Args:
+            succeeded: Whether the run succeeded
+        """
+        if self.run_id is None:
+            return
+
+        try:
+            await self.flush()
+            await self._write(self._update_run, succeeded, time.time())
+        finally:
+            self._writer.shutdown()
+
+    async def update_proc(self, proc: Proc, status: str) -> None:
+        """Record the status of a process
+
+        The buffered job updates of the process are written when it is done.
+
+        Args:
+            proc: The process
+            status: The status, running, succeeded, failed or cached
+        """
+        now = time.time()
+        if status != "running":
+            await self.flush()
+            self._jobs = {
+                key: fields
+                for key, fields in self._jobs.items()
+                if key[0] != proc.name
+            }
+
+        await self._write(
+            self._upsert_proc,
+            (self.run_id, proc.name, proc.size, status, now, now),
+        )
+
+    def update_job(self, job: Job, status: str, **fields: Any) -> None:
+        """Record the status of a job
+
+        The update is buffered, and handed to the writer thread when there
+        are `RUN_DB_BATCH_SIZE` of them.
+
+        Args:
+            job: The job
+            status: The status of the job
+            **fields: Other fields to update, such as rc, jid and the
+                timestamps (queued, submitted, started and ended)
+        """
+        key = (job.proc.name, job.index)
+        job_fields = self._jobs.setdefault(key, dict.fromkeys(_JOB_FIELDS))
+        job_fields.update(fields, status=status, trial_count=job.trial_count)
+        self._dirty.add(key)
+        if len(self._dirty) >= RUN_DB_BATCH_SIZE:
+            self._submit_jobs()
+
+    def _submit_jobs(self) -> None:
+        """Hand the buffered job updates to the writer thread"""
+        if not self._dirty:
+            return
+
+        rows = [
+            (
+                self.run_id,
+                *key,
+                *(self._jobs[key][field] for field in _JOB_FIELDS),
+            )
+            for key in self._dirty
+        ]
+        self._dirty.clear()
+        self._pending.append(self._writer.submit(self._upsert_jobs, rows))
+
+    async def flush(self) -> None:
+        """Write the buffered job updates to the database, and wait for
+        them to be written"""
+        self._submit_jobs()
+        pending, self._pending = self._pending, []
+        for future in pending:
+            await asyncio.wrap_future(future)
+
+    def jobs(
+        self,
+        proc: str | None = None,
+        status: str | None = None,
+        run_id: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Query the jobs of a run
+
+        Args:
+            proc: The name of the process, None for all processes
+            status: The status of the jobs, None for all statuses
+            run_id: The id of the run, None for the latest one
+
+        Returns:
+            The records of the jobs
+        """
+        conn = self._connect()
+        if run_id is None:
+            run_id = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+
+        sql = "SELECT * FROM jobs WHERE run_id = ?"
+        params: List[Any] = [run_id]
+        if proc is not None:
+            sql += " AND proc = ?"
+            params.append(proc)
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+
+        return [
+            dict(row)
+            for row in conn.execute(f"{sql} ORDER BY proc, job_index", params)
+        ]
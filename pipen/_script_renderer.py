@@ -0,0 +1,247 @@
+"""Provide ScriptRenderer class that renders the scripts of the jobs in
+worker processes"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Tuple, Type
+
+from diot import Diot
+
+from .utils import logger
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .proc import Proc
+    from .template import Template
+
+# How many scripts to send to a worker at once at most
+RENDER_BATCH_SIZE = 64
+
+# The attributes of the process that are available to the templates in the
+# worker processes, as `proc.<attr>`
+PROC_SNAPSHOT_ATTRS = (
+    "name",
+    "desc",
+    "envs",
+    "lang",
+    "workdir",
+    "export",
+    "size",
+    "forks",
+    "cache",
+    "dirsig",
+    "error_strategy",
+    "num_retries",
+    "plugin_opts",
+    "scheduler_opts",
+)
+
+# The template and the process snapshot in the worker processes
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(
+    template: Type[Template],
+    source: str,
+    template_opts: Mapping[str, Any],
+    proc: Diot,
+) -> None:
+    """Compile the template once in a worker process"""
+    _worker_state["template"] = template(source, **template_opts)
+    _worker_state["proc"] = proc
+
+
+def _render_batch(
+    batch: List[Dict[str, Any]],
+) -> List[Tuple[bool, Any]]:
+    """Render the scripts of a batch of jobs in a worker process
+
+    Args:
+        batch: The template data of the jobs, without `proc`
+
+    Returns:
+        A list of (succeeded, script or exception) for the jobs
+    """
+    template = _worker_state["template"]
+    out: List[Tuple[bool, Any]] = []
+    for data in batch:
+        data["proc"] = _worker_state["proc"]
+        # the same for all jobs, sent once
+        data.setdefault("envs", data["proc"].envs)
+        try:
+            out.append((True, template.render(data)))
+        except Exception as exc:
+            try:
+                pickle.dumps(exc)
+            except Exception:
+                exc = RuntimeError(f"{type(exc).__name__}: {exc}")
+            out.append((False, exc))
+    return out
+
+
+class ScriptRenderer:
+    """Render the scripts of the jobs of a process in worker processes, so
+    that heavy templates don't block the event loop, and the scripts are
+    rendered in parallel
+
+    The template is compiled once in each worker. The requests are sent in
+    batches. The ones made in the same iteration of the event loop are sent
+    together, up to `batch_size`.
+
+    In the templates, `proc` is a snapshot of the process with the attributes
+    in `PROC_SNAPSHOT_ATTRS`, since the process can't be sent to the workers.
+
+    If anything can't be sent to the workers (i.e. a lambda filter in
+    `template_opts`, or an input value that can't be pickled), the scripts
+    are rendered in the main process instead.
+
+    Args:
+        proc: The process
+        workers: The number of worker processes
+        batch_size: How many scripts to send to a worker at once at most
+    """
+
+    def __init__(
+        self,
+        proc: Proc,
+        workers: int,
+        batch_size: int = RENDER_BATCH_SIZE,
+    ) -> None:
+        self.proc = proc
+        self.batch_size = batch_size
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_scheduled = False
+        self.pool: ProcessPoolExecutor | None = None
+
+        initargs = (
+            proc.template,
+            proc._script_source,
+            proc.template_opts,
+            Diot({attr: getattr(proc, attr, None) for attr in PROC_SNAPSHOT_ATTRS}),
+        )
+        try:
+            pickle.dumps(initargs)
+        except Exception as exc:
+            proc.log(
+                "warning",
+                "Rendering scripts in the main process, "
+                "template can't be sent to the workers: %s",
+                exc,
+            )
+            return
+
+        self.pool = ProcessPoolExecutor(
+            workers,
+            # fork is not safe with the threads of the main process
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+
+    async def render(self, data: Mapping[str, Any]) -> str:
+        """Render the script of a job
+
+        Args:
+            data: The template data of the job
+
+        Returns:
+            The rendered script
+        """
+        if self.pool is None:
+            return self.proc.script.render(data)  # type: ignore[union-attr]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(
+            (
+                {
+                    key: val
+                    for key, val in data.items()
+                    if key != "proc"
+                    and (key != "envs" or val is not self.proc.envs)
+                },
+                future,
+            )
+        )
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send the pending requests to the workers"""
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        loop = asyncio.get_running_loop()
+        try:
+            result = self.pool.submit(  # type: ignore[union-attr]
+                _render_batch,
+                [data for data, _ in pending],
+            )
+        except Exception as exc:  # pragma: no cover, i.e. broken pool
+            self._fallback(pending, exc)
+            return
+
+        def _done(result: Future) -> None:
+            loop.call_soon_threadsafe(self._resolve, pending, result)
+
+        result.add_done_callback(_done)
+
+    def _resolve(
+        self,
+        pending: List[Tuple[Dict[str, Any], asyncio.Future]],
+        result: Future,
+    ) -> None:
+        """Set the results of the requests from the result of a batch"""
+        try:
+            rendered = result.result()
+        except Exception as exc:
+            # i.e. the data can't be pickled
+            self._fallback(pending, exc)
+            return
+
+        for (_, future), (succeeded, out) in zip(pending, rendered):
+            if future.done():  # pragma: no cover, cancelled
+                continue
+            if succeeded:
+                future.set_result(out)
+            else:
+                future.set_exception(out)
+
+    def _fallback(
+        self,
+        pending: List[Tuple[Dict[str, Any], asyncio.Future]],
+        exc: Exception,
+    ) -> None:
+        """Render the requests in the main process when the workers fail"""
+        logger.debug(
+            "[%s] Failed to render scripts in the workers, "
+            "rendering in the main process: %s",
+            self.proc.name,
+            exc,
+        )
+        for data, future in pending:
+            if future.done():  # pragma: no cover, cancelled
+                continue
+            try:
+                future.set_result(
+                    self.proc.script.render(  # type: ignore[union-attr]
+                        {"envs": self.proc.envs, **data, "proc": self.proc}
+                    )
+                )
+            except Exception as render_exc:
+                future.set_exception(render_exc)
+
+    def shutdown(self) -> None:
+        """Shut down the worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,124 @@
+"""Provide SignatureStore class that saves the signatures of the jobs of a
+process in a single file"""
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from diot import Diot
+from panpath import PanPath, LocalPath
+
+# How many signatures to buffer before writing them to the file
+SIGNATURE_BATCH_SIZE = 100
+
+
+class SignatureStore:
+    """Save the signatures of the jobs of a process in an append-only JSON
+    lines file, instead of a TOML file for each job
+
+    The file is read once for all jobs, and the signatures are appended in
+    batches. The later lines of the same job override the earlier ones, and
+    the file is compacted when it has too many overridden lines.
+
+    Args:
+        path: The path to the file
+        batch_size: How many signatures to buffer before writing them
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        batch_size: int = SIGNATURE_BATCH_SIZE,
+    ) -> None:
+        self.path = PanPath(path)
+        self.batch_size = batch_size
+        self._signatures: Dict[str, Dict[str, Any]] | None = None
+        # The lines in the file, including the overridden ones
+        self._nlines = 0
+        # The lines to write
+        self._pending: List[str] = []
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> None:
+        """Load the file if it is not loaded yet"""
+        async with self._lock:
+            if self._signatures is not None:
+                return
+
+            self._signatures = {}
+            try:
+                content = await self.path.a_read_text()
+            except Exception:
+                # not exist
+                return
+
+            for line in content.splitlines():
+                try:
+                    record = json.loads(line)
+                    self._signatures[record["key"]] = record["signature"]
+                except Exception:
+                    # a broken line, i.e. the last one when the pipeline
+                    # was killed while writing
+                    continue
+                self._nlines += 1
+
+    async def get(self, key: str) -> Diot | None:
+        """Get the signature of a job
+
+        Args:
+            key: The key of the job, see `pipen.job.Job.key`
+
+        Returns:
+            The signature, or None if it is not saved
+        """
+        await self._load()
+        signature = self._signatures.get(key)  # type: ignore[union-attr]
+        return None if signature is None else Diot(signature)
+
+    async def add(self, key: str, signature: Dict[str, Any]) -> None:
+        """Save the signature of a job
+
+        The signature is written to the file when the batch is full, or
+        when `flush()` is called.
+
+        Args:
+            key: The key of the job, see `pipen.job.Job.key`
+            signature: The signature
+        """
+        await self._load()
+        line = json.dumps({"key": key, "signature": signature}, default=str)
+        # Keep what is loaded from the file next time
+        self._signatures[key] = json.loads(line)["signature"]  # type: ignore
+        self._pending.append(line)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write the buffered signatures to the file"""
+        async with self._lock:
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, []
+            nlines = self._nlines + len(pending)
+            # Cloud storages don't support appending
+            if isinstance(self.path, LocalPath) and nlines <= 2 * max(
+                len(self._signatures),  # type: ignore[arg-type]
+                self.batch_size,
+            ):
+                async with self.path.a_open("a") as f:
+                    await f.write("".join(f"{line}\n" for line in pending))
+                self._nlines = nlines
+                return
+
+            # rewrite the file with the latest signatures only
+            await self.path.a_write_text(
+                "".join(
+                    json.dumps({"key": key, "signature": signature}, default=str)
+                    + "\n"
+                    for key, signature in self._signatures.items()  # type: ignore
+                )
+            )
+            self._nlines = len(self._signatures)  # type: ignore[arg-type]
@@ -0,0 +1,86 @@
+"""Provide StatusPoller class that queries the statuses of the jobs of a
+process from the scheduler in bulk"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+from xqute.defaults import SLEEP_INTERVAL_POLLING_JOBS
+
+
+class StatusPoller:
+    """Query the statuses of the jobs of a process from the scheduler in bulk
+
+    The statuses of all watched jobs are queried at once, and shared by the
+    jobs until they are older than `interval`, so that there is one query
+    per polling iteration, instead of one for each job. A job that is not
+    watched (i.e. checked before it is submitted) is queried on its own.
+
+    Args:
+        query: The async function to query the statuses of the given keys
+            from the scheduler, returning the statuses of the ones in the
+            scheduler (queued or running)
+        interval: How long (in seconds) the queried statuses are valid
+    """
+
+    def __init__(
+        self,
+        query: Callable[[List[str]], Awaitable[Dict[str, str]]],
+        interval: float = SLEEP_INTERVAL_POLLING_JOBS,
+    ) -> None:
+        self.query = query
+        self.interval = interval
+        # The number of queries made, for debugging
+        self.queries = 0
+        # The number of jobs watching each key, the tasks of an array job
+        # may share the same key
+        self._watched: Dict[str, int] = {}
+        self._statuses: Dict[str, str] = {}
+        self._queried: Set[str] = set()
+        self._queried_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def watch(self, key: str) -> None:
+        """Start to query the status of a job in bulk
+
+        Args:
+            key: The key of the job in the scheduler, i.e. the job id
+        """
+        self._watched[key] = self._watched.get(key, 0) + 1
+
+    def unwatch(self, key: str) -> None:
+        """Stop querying the status of a job
+
+        Args:
+            key: The key of the job in the scheduler
+        """
+        count = self._watched.pop(key, 0) - 1
+        if count > 0:
+            self._watched[key] = count
+
+    async def status(self, key: str) -> str | None:
+        """Get the status of a job
+
+        Args:
+            key: The key of the job in the scheduler
+
+        Returns:
+            The status, or None if the job is not in the scheduler
+        """
+        if key not in self._watched:
+            self.queries += 1
+            return (await self.query([key])).get(key)
+
+        async with self._lock:
+            if (
+                key not in self._queried
+                or time.monotonic() - self._queried_at >= self.interval
+            ):
+                keys = list(self._watched)
+                self.queries += 1
+                self._statuses = await self.query(keys)
+                self._queried = set(keys)
+                self._queried_at = time.monotonic()
+
+        return self._statuses.get(key)
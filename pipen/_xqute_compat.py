@@ -0,0 +1,39 @@
+"""Provide the functions that depend on the internals of xqute, so that they
+are kept in one place when xqute changes"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:  # pragma: no cover
+    from xqute import Job, Xqute
+
+
+def xqute_cancelled(xqute: Xqute) -> bool:
+    """Check if xqute is cancelled, i.e. halted by a failed job, by a signal,
+    or when all the jobs are done
+
+    xqute doesn't expose it. `Xqute._cancelling` is False until
+    `Xqute.cancel()` is called, and then True or the signal.
+
+    Args:
+        xqute: The xqute object
+
+    Returns:
+        True if xqute is cancelled, otherwise False
+    """
+    return getattr(xqute, "_cancelling", False) is not False
+
+
+async def poll_jobs(xqute: Xqute, jobs: List[Job], counter: int) -> None:
+    """Poll the jobs like the polling loop of xqute does, which only starts
+    after the feeding is stopped
+
+    The statuses of the jobs are refreshed, with the hooks called, and the
+    failed jobs are retried.
+
+    Args:
+        xqute: The xqute object
+        jobs: The jobs to poll
+        counter: The polling counter, for the polling hooks
+    """
+    await xqute.scheduler.check_all_done(jobs, counter)
@@ -29,6 +29,22 @@ CONFIG = Diot(
     # process level: Whether expand directory to check signature
     dirsig=1,
     # process level:
+    # How to tell whether the input files/directories are changed for caching
+    # mtime: by the last modification time
+    # content: by the content hashes, when they are newer
+    sigmode="mtime",
+    # process level:
+    # Where to save the signatures of the jobs
+    # toml: a TOML file for each job
+    # jsonl: a JSON lines file for all jobs of the process
+    sigstore="toml",
+    # process level:
+    # How to name the working directories of the jobs
+    # index: by the indexes of the jobs
+    # input: by the hashes of the input data of the jobs, so that the jobs
+    #   keep their caches when the input data is reordered or appended
+    job_key="index",
+    # process level:
     # How to deal with the errors
     # retry, ignore, halt
     # halt to halt the whole pipeline, no submitting new jobs
@@ -46,6 +62,33 @@ CONFIG = Diot(
     # How many jobs to be submitted in a batch
     # Use the default value from the scheduler itself if None
     submission_batch=None,
+    # process level:
+    # How many jobs to keep alive (being prepared or running) at most
+    # None to create all jobs at once
+    job_window=None,
+    # process level:
+    # How to check if a process is cached as a whole, without constructing
+    # the jobs (so the job-level plugin hooks are not called for them)
+    # None/False: not checked, the jobs are checked one by one
+    # "files": by the manifest and the input/output files of the jobs
+    # "fingerprint": by the fingerprints of the input data and the templates
+    # only, loading the output data saved by the last run directly
+    manifest_check=None,
+    # process level:
+    # How many jobs to prepare (and check for caching) at the same time
+    # None to use submission_batch, "auto" to adapt it to the I/O latency
+    prepare_concurrency=None,
+    # process level:
+    # How many worker processes to render the scripts of the jobs
+    # 0 to render them in the main process
+    render_workers=0,
+    # process level:
+    # How many jobs to submit to the scheduler as one job (a bundle)
+    # 1 to submit the jobs one by one
+    job_bundle_size=1,
+    # process level:
+    # How many jobs in a bundle to run at the same time
+    job_bundle_forks=1,
     # pipeline level:
     # The working directory for the pipeline
     workdir="./.pipen",
@@ -61,6 +104,26 @@ CONFIG = Diot(
     plugins=None,
     # pipeline level: plugin opts
     plugin_opts={},
+    # pipeline level:
+    # How many processes to run simultaneously
+    # 1 to run the processes one by one.
+    # Otherwise, a process starts as soon as all its required processes are done
+    proc_forks=1,
+    # process level:
+    # Whether to start the jobs as soon as the corresponding jobs of the
+    # required processes are done, instead of waiting for the required processes
+    # to finish. Only works when proc_forks > 1.
+    stream=False,
+    # pipeline level:
+    # Whether to record the status of the runs, processes and jobs in
+    # <workdir>/<pipeline>/run.db, a SQLite database. Only for local workdirs.
+    run_db=False,
+    # pipeline level:
+    # Release the output data of a process once all the next processes have
+    # computed their input, to save memory. False to keep it, "drop" to drop
+    # it, "spill" to save it to <workdir>/<pipeline>/<proc>/proc.output.json,
+    # which can be loaded back by Proc.load_output_data()
+    release_output_data=False,
 )
 
 # Just the total width of the terminal
@@ -10,11 +10,11 @@ from contextlib import suppress
 from collections.abc import Iterable
 from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, Mapping
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Sequence, Tuple
 
 from panpath import PanPath, CloudPath, LocalPath
 from diot import OrderedDiot
-from xqute import Job as XquteJob
+from xqute import Job as XquteJob, JobStatus
 from xqute.path import SpecPath, MountedPath
 
 from ._job_caching import JobCaching
@@ -27,10 +27,11 @@ from .exceptions import (
     TemplateRenderingError,
 )
 from .template import Template
-from .utils import logger, strsplit, path_is_symlink, path_symlink_to
+from .utils import logger, strsplit, path_symlink_to
 from .pluginmgr import plugin
 
 if TYPE_CHECKING:  # pragma: no cover
+    import pandas
     from .proc import Proc
 
 
@@ -107,10 +108,246 @@ def _process_input_file_or_dir(
     return MountedPath(path2, spec=path1)
 
 
+def _resolve_input_column(
+    inkey: str,
+    intype: str,
+    values: Sequence[Any],
+    proc_name: str | None = None,
+) -> List[Any]:
+    """Process the values of an input key for all jobs at once
+
+    The same values (i.e. a reference file for all jobs) are only processed
+    once, and the processed paths are shared by the jobs.
+
+    Args:
+        inkey: The input key
+        intype: The input type
+        values: The values of the input key of the jobs
+        proc_name: The name of the process, for error messages
+
+    Returns:
+        The processed values
+    """
+    import pandas
+
+    if intype == ProcInputType.VAR:
+        return list(values)
+
+    processed: Dict[str, CloudPath | MountedPath] = {}
+
+    def _process(inval: Any, index: int | None) -> CloudPath | MountedPath:
+        if not isinstance(inval, str):
+            return _process_input_file_or_dir(inkey, intype, inval, index, proc_name)
+
+        out = processed.get(inval)
+        if out is None:
+            out = processed[inval] = _process_input_file_or_dir(
+                inkey, intype, inval, index, proc_name
+            )
+        return out
+
+    out: List[Any] = []
+    for inval in values:
+        if inval is None:
+            out.append(None)
+
+        elif intype in (ProcInputType.FILE, ProcInputType.DIR):
+            out.append(_process(inval, None))
+
+        else:  # FILES, DIRS
+            if isinstance(inval, pandas.DataFrame):  # pragma: no cover
+                # // todo: nested dataframe
+                inval = inval.iloc[0, 0]
+
+            if isinstance(inval, (str, Path)):
+                # if a single file, convert to list
+                inval = [inval]
+
+            if not isinstance(inval, Iterable):
+                raise ProcInputTypeError(
+                    f"[{proc_name}] Expected an iterable for input: "
+                    f"{inkey + ':' + intype!r}, got {type(inval)}"
+                )
+
+            out.append([_process(file, i) for i, file in enumerate(inval)])
+
+    return out
+
+
+# The key in `output_data.attrs` for the names of the path columns
+OUTPUT_PATHS_ATTR = "pipen_paths"
+
+
+def _compact_output_data(rows: Iterable[Mapping[str, Any]]) -> pandas.DataFrame:
+    """Build the output data of a process from the outputs of the jobs
+
+    The data is built column by column. The paths are saved as strings
+    (`<spec>:<mounted>` if they are mounted from other paths), which are
+    turned back to paths by `_resolve_input_column()` when the jobs of the
+    next processes read them, or by `_expand_output_data()` for the
+    `input_data` callbacks. The columns with repeated strings are saved as
+    categories.
+
+    Args:
+        rows: The outputs of the jobs, in the order of the job indexes
+
+    Returns:
+        The output data, with the names of the path columns in
+        `attrs[OUTPUT_PATHS_ATTR]`
+    """
+    import pandas
+
+    columns: Dict[str, List[Any]] = {}
+    nrows = 0
+    for row in rows:
+        nrows += 1
+        for key, val in row.items():
+            columns.setdefault(key, []).append(val)
+
+    paths = []
+    data: Dict[str, Any] = {}
+    for key, values in columns.items():
+        if isinstance(values[0], MountedPath):
+            paths.append(key)
+            values = [
+                str(val) if str(val.spec) == str(val) else f"{val.spec}:{val}"
+                for val in values
+            ]
+
+        if all(isinstance(val, str) for val in values) and (
+            len(set(values)) * 2 <= len(values)
+        ):
+            data[key] = pandas.Categorical(values)
+        else:
+            data[key] = values
+
+    # keep the rows for the processes without output
+    out = pandas.DataFrame(data, index=range(nrows))
+    out.attrs[OUTPUT_PATHS_ATTR] = paths
+    return out
+
+
+def _expand_output_data(data: pandas.DataFrame) -> pandas.DataFrame:
+    """Turn the output data of a process back to what the jobs output
+
+    The path columns are turned back to paths, and the categorical columns
+    back to object columns.
+
+    Args:
+        data: The output data built by `_compact_output_data()`
+
+    Returns:
+        A copy of the data with the paths and the strings, or the data
+        itself if there is nothing to turn back
+    """
+    import pandas
+
+    attrs = getattr(data, "attrs", {})
+    paths = [key for key in attrs.get(OUTPUT_PATHS_ATTR, ()) if key in data]
+    categories = [
+        key
+        for key in getattr(data, "columns", ())
+        if key not in paths
+        and isinstance(data[key].dtype, pandas.CategoricalDtype)
+    ]
+    if not paths and not categories and OUTPUT_PATHS_ATTR not in attrs:
+        return data
+
+    data = data.copy()
+    data.attrs = {
+        key: val for key, val in data.attrs.items() if key != OUTPUT_PATHS_ATTR
+    }
+    for key in paths:
+        data[key] = _resolve_input_column(
+            key,
+            ProcInputType.FILE,
+            data[key].tolist(),
+        )
+    for key in categories:
+        data[key] = data[key].astype(object)
+    return data
+
+
+def _output_data_to_json(data: pandas.DataFrame) -> Dict[str, Any]:
+    """Turn the output data of a process to an object to be saved as JSON
+
+    The output data is compacted first if it is not (e.g. the one read by
+    the users), so that the paths are saved as strings. The other values
+    that are not JSON serializable are saved as strings.
+
+    Args:
+        data: The output data
+
+    Returns:
+        The object with the columns, the names of the path columns and
+        the rows of the data
+    """
+    if OUTPUT_PATHS_ATTR not in data.attrs:
+        data = _compact_output_data(data.to_dict("records"))
+    return {
+        "columns": [str(col) for col in data.columns],
+        "paths": list(data.attrs[OUTPUT_PATHS_ATTR]),
+        "rows": data.astype(object).values.tolist(),
+    }
+
+
+def _output_data_from_json(obj: Mapping[str, Any]) -> pandas.DataFrame:
+    """Turn the object saved by `_output_data_to_json()` back to the output
+    data, in the form that `_compact_output_data()` builds
+
+    Args:
+        obj: The object
+
+    Returns:
+        The output data
+    """
+    import pandas
+
+    out = pandas.DataFrame(
+        obj["rows"],
+        columns=obj["columns"],
+        index=range(len(obj["rows"])),
+    )
+    out.attrs[OUTPUT_PATHS_ATTR] = list(obj["paths"])
+    return out
+
+
+def _parse_output(oput: str, proc_name: str | None = None) -> Tuple[str, str, str]:
+    """Parse a rendered output, `name:value` or `name:type:value`
+
+    Args:
+        oput: The rendered output
+        proc_name: The name of the process, for error messages
+
+    Returns:
+        The name, type and value of the output
+    """
+    if ":" not in oput:
+        raise ProcOutputNameError(f"[{proc_name}] No name given in output.")
+
+    if oput.count(":") == 1:
+        output_name, output_value = oput.split(":")
+        return output_name, ProcOutputType.VAR, output_value
+
+    output_name, output_type, output_value = oput.split(":", 2)
+    if output_type not in ProcOutputType.__dict__.values():
+        raise ProcOutputTypeError(
+            f"[{proc_name}] " f"Unsupported output type: {output_type}"
+        )
+    return output_name, output_type, output_value
+
+
 class Job(XquteJob, JobCaching):
     """The job for pipen"""
 
-    __slots__ = XquteJob.__slots__ + ("proc", "_output_types", "outdir", "output")
+    __slots__ = XquteJob.__slots__ + (
+        "proc",
+        "_output_types",
+        "_ctime",
+        "outdir",
+        "output",
+        "key",
+    )
 
     def __init__(
         self,
@@ -118,8 +355,17 @@ class Job(XquteJob, JobCaching):
         **kwargs: Any,
     ) -> None:
         super().__init__(*args, **kwargs)
+        # The name of the metadir (and the output directory of a multi-job
+        # export process), the index by default, or the hash of the input
+        # row if `job_key` is "input", passed by the process
+        self.key: str = self.envs.get("PIPEN_JOB_KEY") or str(self.index)
+        if self.key != str(self.index):
+            self.metadir = self.metadir.parent / self.key  # type: ignore
+            self.envs["XQUTE_JOB_METADIR"] = str(self.metadir.mounted)
         self.proc: Proc | None = None
         self._output_types: Dict[str, str] = {}
+        # The ctime in the signature
+        self._ctime = 0.0
         # Where the real output directory is
         self.outdir: SpecPath | None = None
         self.output: Mapping[str, Any] | None = None
@@ -143,10 +389,10 @@ class Job(XquteJob, JobCaching):
             else:
                 self.outdir = proc._export_dir  # type: ignore
 
-            # Put job output in a subdirectory with index
+            # Put job output in a subdirectory with index (or key)
             # if it is a multi-job process
             if not proc.output_flatten:
-                self.outdir = self.outdir / str(self.index)  # type: ignore
+                self.outdir = self.outdir / self.key  # type: ignore
 
             if proc.scheduler.fs_shared:
                 await self.outdir.mounted.a_mkdir(parents=True, exist_ok=True)
@@ -161,23 +407,23 @@ class Job(XquteJob, JobCaching):
 
         if not proc.script:
             self.cmd = ("true",)
+        elif callable(proc.script):
+            # Called by the callable scheduler, the source is saved for
+            # caching only
+            await self._save_script(proc._script_source)  # type: ignore
+            self.cmd = ("true",)
         else:
             try:
-                script = proc.script.render(self.template_data)
+                if proc._script_renderer is None:
+                    script = proc.script.render(self.template_data)
+                else:
+                    script = await proc._script_renderer.render(self.template_data)
             except Exception as exc:
                 raise TemplateRenderingError(
                     f"[{self.proc.name}] Failed to render script."
                 ) from exc
 
-            if (
-                await self.script_file.a_is_file()
-                and await self.script_file.a_read_text() != script
-            ):
-                self.log("debug", "Job script updated.")
-                await self.script_file.a_write_text(script)
-            elif not await self.script_file.a_is_file():
-                await self.script_file.a_write_text(script)
-
+            await self._save_script(script)
             lang = proc.lang or proc.pipeline.config.lang
             script_file = self.script_file.mounted
             script_file = await script_file.get_fspath()
@@ -186,6 +432,22 @@ class Job(XquteJob, JobCaching):
 
         await plugin.hooks.on_job_init(self)
 
+    async def _save_script(self, script: str) -> None:
+        """Save the script of the job, if it is changed, so that the job
+        is not rerun because of a newer script
+
+        Args:
+            script: The script
+        """
+        path_cache = self.proc.pipeline.path_cache
+        if not await path_cache.is_file(self.script_file):
+            path_cache.invalidate(self.script_file)
+            await self.script_file.a_write_text(script)
+        elif await self.script_file.a_read_text() != script:
+            self.log("debug", "Job script updated.")
+            path_cache.invalidate(self.script_file)
+            await self.script_file.a_write_text(script)
+
     @property
     def script_file(self) -> SpecPath:
         """Get the path to script file
@@ -213,21 +475,28 @@ class Job(XquteJob, JobCaching):
         # if ret is a dead link
         # when switching a proc from end/nonend to nonend/end
         # if path_is_symlink(self.outdir) and not self.outdir.exists():
-        if await path_is_symlink(self.outdir) and (  # type: ignore
+        path_cache = self.proc.pipeline.path_cache
+        if await path_cache.is_symlink(self.outdir) and (  # type: ignore
             # A local deak link
-            not await self.outdir.a_exists()
+            not await path_cache.exists(self.outdir)  # type: ignore
             # A cloud fake link
             or isinstance(getattr(self.outdir, "path", self.outdir), CloudPath)
         ):
+            path_cache.invalidate(self.outdir)  # pragma: no cover
             await self.outdir.a_unlink()  # pragma: no cover
 
         await self.outdir.a_mkdir(parents=True, exist_ok=True)
         # If it is somewhere else, make a symbolic link to the metadir
         metaout = self.metadir / "output"
         if self.outdir != metaout:
-            if await path_is_symlink(metaout) or await metaout.a_is_file():
+            is_file = await path_cache.is_symlink(metaout) or (
+                await path_cache.is_file(metaout)
+            )
+            is_dir = not is_file and await path_cache.is_dir(metaout)
+            path_cache.invalidate(metaout)
+            if is_file:
                 await metaout.a_unlink()
-            elif await metaout.a_is_dir():
+            elif is_dir:
                 # Remove the directory, it is inconsistent with current setting
                 await metaout.a_rmtree()
 
@@ -242,39 +511,17 @@ class Job(XquteJob, JobCaching):
         Returns:
             A key-value map, where keys are the input keys
         """
-        import pandas
+        if self.proc._input_records is not None:
+            # resolved for all jobs at once
+            return self.proc._input_records[self.index]
 
+        # streaming processes, whose input rows are filled one by one, or
+        # processes with a job window, not to keep the input of all jobs
         ret = self.proc.input.data.iloc[self.index, :].to_dict()
-        # check types
         for inkey, intype in self.proc.input.type.items():
-
-            if intype == ProcInputType.VAR or ret[inkey] is None:
-                continue  # pragma: no cover, covered actually
-
-            if intype in (ProcInputType.FILE, ProcInputType.DIR):
-                ret[inkey] = _process_input_file_or_dir(
-                    inkey, intype, ret[inkey], None, self.proc.name
-                )
-
-            if intype in (ProcInputType.FILES, ProcInputType.DIRS):
-                if isinstance(ret[inkey], pandas.DataFrame):  # pragma: no cover
-                    # // todo: nested dataframe
-                    ret[inkey] = ret[inkey].iloc[0, 0]
-
-                if isinstance(ret[inkey], (str, Path)):
-                    # if a single file, convert to list
-                    ret[inkey] = [ret[inkey]]
-
-                if not isinstance(ret[inkey], Iterable):
-                    raise ProcInputTypeError(
-                        f"[{self.proc.name}] Expected an iterable for input: "
-                        f"{inkey + ':' + intype!r}, got {type(ret[inkey])}"
-                    )
-
-                for i, file in enumerate(ret[inkey]):
-                    ret[inkey][i] = _process_input_file_or_dir(
-                        inkey, intype, file, i, self.proc.name
-                    )
+            [ret[inkey]] = _resolve_input_column(
+                inkey, intype, [ret[inkey]], self.proc.name
+            )
 
         return ret
 
@@ -289,9 +536,19 @@ class Job(XquteJob, JobCaching):
             self.output = {}
             return
 
+        output_spec = self.proc._output_spec
+        if output_spec is not None and all(
+            isinstance(value, str) for _, _, value in output_spec
+        ):
+            # static outputs, no rendering needed
+            outputs = self._parse_output_spec(output_spec, {})
+            await self._set_output(outputs)
+            return
+
         data = {
             "job": dict(
                 index=self.index,
+                key=self.key,
                 metadir=self.metadir.mounted,
                 outdir=self.outdir.mounted,
                 stdout_file=self.stdout_file.mounted,
@@ -303,34 +560,79 @@ class Job(XquteJob, JobCaching):
             "proc": self.proc,
             "envs": self.proc.envs,
         }
-        try:
-            if isinstance(output_template, Template):
-                # // TODO: check ',' in output value?
-                outputs = strsplit(output_template.render(data), ",")
-            else:
-                outputs = [oput.render(data) for oput in output_template]
-        except Exception as exc:
-            raise TemplateRenderingError(
-                f"[{self.proc.name}] Failed to render output."
-            ) from exc
+        if output_spec is not None:
+            outputs = self._parse_output_spec(output_spec, data)
+        else:
+            try:
+                if isinstance(output_template, Template):
+                    # // TODO: check ',' in output value?
+                    rendered = strsplit(output_template.render(data), ",")
+                else:
+                    rendered = [oput.render(data) for oput in output_template]
+            except Exception as exc:
+                raise TemplateRenderingError(
+                    f"[{self.proc.name}] Failed to render output."
+                ) from exc
 
-        self.output = ret = OrderedDiot()
-        for oput in outputs:
-            if ":" not in oput:
-                raise ProcOutputNameError(
-                    f"[{self.proc.name}] No name given in output."
-                )
+            outputs = [_parse_output(oput, self.proc.name) for oput in rendered]
 
-            if oput.count(":") == 1:
-                output_name, output_value = oput.split(":")
-                output_type = ProcOutputType.VAR
+        await self._set_output(outputs)
+
+    def _parse_output_spec(
+        self,
+        output_spec: Sequence[Tuple[str, str | None, Template | str]],
+        data: Mapping[str, Any],
+    ) -> List[Tuple[str, str, str]]:
+        """Render the values of the output specification compiled by the
+        process (see `pipen.proc.Proc._compile_output()`)
+
+        The rendered values are parsed as the whole outputs are rendered, if
+        they contain the separators (`,` or `:`).
+
+        Args:
+            output_spec: The names, types and values of the outputs
+            data: The data to render the values
+
+        Returns:
+            The names, types and rendered values of the outputs
+        """
+        split = isinstance(self.proc.output, Template)
+        outputs = []
+        for output_name, output_type, value in output_spec:
+            if not isinstance(value, str):
+                try:
+                    value = value.render(data)
+                except Exception as exc:
+                    raise TemplateRenderingError(
+                        f"[{self.proc.name}] Failed to render output."
+                    ) from exc
+
+            if split:
+                value = value.rstrip()
+
+            if (split and "," in value) or (output_type is None and ":" in value):
+                oput = (
+                    f"{output_name}:{value}"
+                    if output_type is None
+                    else f"{output_name}:{output_type}:{value}"
+                )
+                outputs.extend(
+                    _parse_output(part, self.proc.name)
+                    for part in (strsplit(oput, ",") if split else [oput])
+                )
             else:
-                output_name, output_type, output_value = oput.split(":", 2)
-                if output_type not in ProcOutputType.__dict__.values():
-                    raise ProcOutputTypeError(
-                        f"[{self.proc.name}] " f"Unsupported output type: {output_type}"
-                    )
+                outputs.append((output_name, output_type or ProcOutputType.VAR, value))
+
+        return outputs
+
+    async def _set_output(self, outputs: Sequence[Tuple[str, str, str]]) -> None:
+        """Set the output data of the job from the parsed outputs
 
+        Args:
+            outputs: The names, types and values of the outputs
+        """
+        self.output = ret = OrderedDiot()
+        for output_name, output_type, output_value in outputs:
             self._output_types[output_name] = output_type
 
             if output_type == ProcOutputType.VAR:
@@ -378,6 +680,7 @@ class Job(XquteJob, JobCaching):
         return {
             "job": dict(
                 index=self.index,
+                key=self.key,
                 metadir=self.metadir.mounted,
                 outdir=self.outdir.mounted,
                 script_file=self.script_file.mounted,
@@ -428,3 +731,29 @@ class Job(XquteJob, JobCaching):
             )
 
         self.proc.log(level, job_index_indicator + msg, *args, logger=logger)
+
+
+class JobRecord:
+    """A compact record of a finished job
+
+    With `job_window`, the finished jobs are replaced by their records in
+    `proc.jobs`, so that the memory doesn't grow with the number of jobs.
+    Only what is needed after the jobs are done (i.e. for the output data of
+    the process and the manifest) is kept.
+
+    Args:
+        job: The finished job
+    """
+
+    __slots__ = ("index", "key", "_status", "output", "_output_types", "_ctime")
+
+    def __init__(self, job: Job) -> None:
+        self.index = job.index
+        self.key = job.key
+        self._status = job._status
+        self.output = job.output
+        self._output_types = job._output_types
+        self._ctime = job._ctime
+
+    def __repr__(self) -> str:
+        return f"<JobRecord-{self.index}: {JobStatus.get_name(self._status)}>"
@@ -4,8 +4,23 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import heapq
+import itertools
+import signal
 from pathlib import Path
-from typing import Any, ClassVar, Iterable, List, Sequence, Type
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
 
 from diot import Diot
 from rich import box
@@ -13,16 +28,20 @@ from rich.panel import Panel
 from rich.text import Text
 from simpleconf import ProfileConfig
 from varname import varname, VarnameException
-from panpath import PanPath
+from panpath import PanPath, LocalPath
 
+from ._hash_cache import HashCache
+from ._path_cache import PathCache
+from ._run_db import RunDB
 from .defaults import CONFIG, CONFIG_FILES
 from .exceptions import (
+    ConfigurationError,
     PipenOrProcNameError,
     ProcDependencyError,
     PipenSetDataError,
 )
 from .pluginmgr import plugin
-from .proc import Proc
+from .proc import Proc, ProcMeta
 from .progressbar import PipelinePBar
 from .utils import (
     copy_dict,
@@ -111,6 +130,16 @@ class Pipen:
 
         self.workdir: str | Path | None = None
         self.profile: str = "default"
+        # The content hashes of the files for caching with sigmode "content"
+        self.hash_cache: HashCache | None = None
+        # The metadata of the paths, shared by all jobs in a run
+        self.path_cache: PathCache | None = None
+        # The database to record the status of the runs
+        self.run_db: RunDB | None = None
+        # The processes whose input is computed and whose output data is
+        # ready in a run, to release the output data
+        self._input_computed: Set[Type[Proc]] = set()
+        self._output_ready: Set[Type[Proc]] = set()
 
         self.starts: List[Type[Proc]] = self.__class__.starts
         if self.starts and not isinstance(self.starts, (tuple, list)):
@@ -165,7 +194,11 @@ class Pipen:
         cls.PIPELINE_COUNT = 0
 
     async def async_run(self, profile: str = "default") -> bool:
-        """Run the processes one by one
+        """Run the processes
+
+        The processes are run one by one by default. When `proc_forks` is
+        greater than 1, a process starts as soon as all its required processes
+        are done, with at most `proc_forks` processes running simultaneously.
 
         Args:
             profile: The default profile to use for the run
@@ -178,6 +211,17 @@ class Pipen:
 
         succeeded = True
         await self._init()
+        self._input_computed = set()
+        self._output_ready = set()
+        self.path_cache = PathCache()
+        self.hash_cache = HashCache(
+            self.workdir / "hash.cache.json",
+            self.path_cache,
+        )
+        # SQLite doesn't work with the cloud storages
+        if self.config.run_db and isinstance(self.workdir, LocalPath):
+            self.run_db = RunDB(self.workdir / "run.db")
+            await self.run_db.start_run(self.name, profile)
         logger.setLevel(self.config.loglevel.upper())
         log_rich_renderable(pipen_banner(), "magenta", logger.info)
         try:
@@ -185,27 +229,17 @@ class Pipen:
             self._log_pipeline_info()
             logger.info("Initializing plugins ...")
             await plugin.hooks.on_start(self)
-            for proc in self.procs:  # type: ignore
-                self.pbar.update_proc_running()
-                proc_obj = proc(self)
-                await proc_obj._init()
-                if proc in self.starts and proc.input_data is None:  # type: ignore
-                    proc_obj.log(
-                        "warning",
-                        "This is a start process, but no 'input_data' specified.",
-                    )
-                # await proc_obj.init()
-                await proc_obj.run()
-                if proc_obj.succeeded:
-                    self.pbar.update_proc_done()
-                else:
-                    self.pbar.update_proc_error()
-                    succeeded = False
-                    break
-                proc_obj.gc()
+            if (self.config.proc_forks or 1) > 1:
+                succeeded = await self._run_procs_dag()
+            else:
+                for proc in self.procs:  # type: ignore
+                    if not await self._run_proc(proc):
+                        succeeded = False
+                        break
 
             logger.info("")
         except Exception:
+            succeeded = False
             raise
         else:
             await plugin.hooks.on_complete(self, succeeded)
@@ -213,9 +247,190 @@ class Pipen:
             self.plugin_context.__exit__()
             if self.pbar:
                 self.pbar.done()
+            await self.hash_cache.save()
+            if self.run_db:
+                await self.run_db.end_run(succeeded)
 
         return succeeded
 
+    async def _run_proc(
+        self,
+        proc: Type[Proc],
+        inited: Callable[[Type[Proc]], None] | None = None,
+    ) -> bool:
+        """Initialize and run a single process
+
+        Args:
+            proc: The process class
+            inited: A callback to call when the process is initialized
+
+        Returns:
+            True if the process succeeded else False
+        """
+        self.pbar.update_proc_running()
+        proc_obj = proc(self)
+        await proc_obj._init()
+        self._input_computed.add(proc)
+        for req in proc.requires or ():
+            await self._release_output_data(req)
+        if inited is not None:
+            inited(proc)
+        if proc in self.starts and proc.input_data is None:  # type: ignore
+            proc_obj.log(
+                "warning",
+                "This is a start process, but no 'input_data' specified.",
+            )
+        await proc_obj.run()
+        if not proc_obj.succeeded:
+            self.pbar.update_proc_error()
+            return False
+
+        self.pbar.update_proc_done()
+        proc_obj.gc()
+        self._output_ready.add(proc)
+        await self._release_output_data(proc)
+        return True
+
+    async def _release_output_data(self, proc: Type[Proc]) -> None:
+        """Release the output data of a process if all the next processes
+        have computed their input, with `release_output_data`
+
+        Args:
+            proc: The process class
+        """
+        release = self.config.release_output_data
+        if (
+            not release
+            or not proc.nexts
+            or proc not in self._output_ready
+            or not all(nxt in self._input_computed for nxt in proc.nexts)
+            or proc._output_data is None
+        ):
+            return
+
+        if release not in ("drop", "spill"):
+            raise ConfigurationError(
+                "Expect False, 'drop' or 'spill' for release_output_data, "
+                f"got {release!r}"
+            )
+
+        proc_obj = proc._INSTANCES[proc]  # type: ignore[index]
+        if release == "spill":
+            await proc_obj._spill_output_data()
+        proc.output_data = None
+        proc_obj.log("debug", "Output data released (%s)", release)
+
+    def _proc_streams(self, proc: Type[Proc]) -> bool:
+        """Check if the jobs of a process are streamed from the required processes
+
+        Streaming only works when processes are running simultaneously, and the
+        input data is computed from the outputs of the required processes
+        row by row (`input_data` is not a callback).
+
+        Args:
+            proc: The process class
+
+        Returns:
+            True if the process is streaming else False
+        """
+        stream = self.config.stream if proc.stream is None else proc.stream
+        return (
+            bool(stream)
+            and (self.config.proc_forks or 1) > 1
+            and bool(proc.requires)
+            and not callable(proc.input_data)
+        )
+
+    async def _run_procs_dag(self) -> bool:
+        """Run the processes as a DAG
+
+        A process is started once all its required processes are done, or,
+        for a streaming process, once all its required processes are
+        initialized.
+        At most `proc_forks` processes are running at the same time.
+        Once a process fails, no new processes are started, and the running
+        ones are waited to finish.
+
+        Returns:
+            True if all processes succeeded else False
+        """
+        proc_forks = self.config.proc_forks
+        # self.procs is topologically sorted, keep the order as the priority
+        pending: List[Type[Proc]] = list(self.procs)  # type: ignore
+        inited: set = set()
+        done: set = set()
+        running: Dict[asyncio.Task, Type[Proc]] = {}
+        succeeded = True
+        changed = asyncio.Event()
+
+        def _inited(proc: Type[Proc]) -> None:
+            inited.add(proc)
+            changed.set()
+
+        try:
+            while pending or running:
+                if succeeded:
+                    for proc in pending[:]:
+                        if len(running) >= proc_forks:
+                            break
+                        ready = inited if self._proc_streams(proc) else done
+                        if all(req in ready for req in proc.requires or ()):
+                            pending.remove(proc)
+                            task = asyncio.create_task(
+                                self._run_proc(proc, _inited)
+                            )
+                            task.add_done_callback(lambda _: changed.set())
+                            running[task] = proc
+
+                if not running:
+                    break
+
+                await changed.wait()
+                changed.clear()
+                for task in [task for task in running if task.done()]:
+                    proc = running.pop(task)
+                    if task.result():
+                        done.add(proc)
+                    else:
+                        succeeded = False
+        finally:
+            for task in running:
+                task.cancel()
+            # let the cancelled processes clean up before returning
+            await asyncio.gather(*running, return_exceptions=True)
+
+        return succeeded
+
+    def _cancel_running_procs(self, sig: signal.Signals | None = None) -> None:
+        """Cancel all the processes that are running
+
+        The signal handlers registered by each process (xqute) overwrite each
+        other, so when processes are running simultaneously, this is used as
+        the signal handler to cancel all of them.
+
+        Args:
+            sig: The signal
+        """
+        for proc in self.procs:  # type: ignore
+            proc_obj = ProcMeta._INSTANCES.get(proc)
+            if proc_obj is not None and proc_obj.xqute is not None:
+                proc_obj.xqute.cancel(sig)
+
+    def _add_signal_handlers(self) -> None:
+        """Make the signals cancel all running processes
+
+        Only needed when processes are running simultaneously.
+        """
+        if (self.config.proc_forks or 1) <= 1:
+            return
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(
+                sig,
+                functools.partial(self._cancel_running_procs, sig),
+            )
+
     def run(
         self,
         profile: str = "default",
@@ -359,9 +574,17 @@ class Pipen:
             logger.info(fmt, "plugins" if i == 0 else "", plug)
         logger.info(fmt, "# procs", len(self.procs))
         logger.info(fmt, "profile", self.profile)
+        logger.info(fmt, "proc_forks", self.config.proc_forks)
+        logger.info(fmt, "stream", self.config.stream)
+        logger.info(fmt, "run_db", self.config.run_db)
+        logger.info(fmt, "release_output_data", self.config.release_output_data)
         logger.info(fmt, "outdir", self.outdir)
         logger.info(fmt, "cache", self.config.cache)
         logger.info(fmt, "dirsig", self.config.dirsig)
+        logger.info(fmt, "sigmode", self.config.sigmode)
+        logger.info(fmt, "sigstore", self.config.sigstore)
+        logger.info(fmt, "job_key", self.config.job_key)
+        logger.info(fmt, "manifest_check", self.config.manifest_check)
         logger.info(fmt, "error_strategy", self.config.error_strategy)
         logger.info(fmt, "forks", self.config.forks)
         logger.info(fmt, "lang", self.config.lang)
@@ -369,6 +592,11 @@ class Pipen:
         logger.info(fmt, "num_retries", self.config.num_retries)
         logger.info(fmt, "scheduler", self.config.scheduler)
         logger.info(fmt, "submission_batch", self.config.submission_batch)
+        logger.info(fmt, "job_window", self.config.job_window)
+        logger.info(fmt, "prepare_concurrency", self.config.prepare_concurrency)
+        logger.info(fmt, "render_workers", self.config.render_workers)
+        logger.info(fmt, "job_bundle_size", self.config.job_bundle_size)
+        logger.info(fmt, "job_bundle_forks", self.config.job_bundle_forks)
         logger.info(fmt, "template", self.config.template)
         logger.info(fmt, "workdir", self.workdir)
         for i, (key, val) in enumerate(sorted(self.config.plugin_opts.items())):
@@ -421,44 +649,66 @@ class Pipen:
                 "Did you forget to call `Pipen.set_starts()`?"
             )
 
-        # build proc relationships
+        # build proc relationships with a topological sort (Kahn's algorithm)
         # Allow starts to be set as a tuple
         self.procs = list(self.starts)  # type: ignore
-        nexts = set(sum((proc.nexts or [] for proc in self.procs), []))  # type: ignore
+        added = set(self.procs)
+        names = {proc.name for proc in self.procs}
+        # The next processes found, with their requires not added yet
+        waiting: Dict[Type[Proc], Set[Type[Proc]]] = {}
+        # The next processes whose requires are all added, by (order, name)
+        ready: List[Tuple[int, str, int, Type[Proc]]] = []
+        queued: Set[Type[Proc]] = set()
+        counter = itertools.count()
         logger.debug("")
         logger.debug("Building process relationships:")
         logger.debug("- Start processes: %s", self.procs)
-        while nexts:
-            logger.debug("- Next processes: %s", nexts)
-            # pick up one that can be added to procs
-            for proc in sorted(nexts, key=lambda prc: (prc.order or 0, prc.name)):
-                if proc in self.procs:
-                    raise ProcDependencyError(f"Cyclic dependency: {proc.name}")
-
-                if proc.name in [p.name for p in self.procs]:
-                    raise PipenOrProcNameError(
-                        f"'{proc.name}' is already used by another process."
-                    )
 
-                # Add proc to self.procs if all their requires
-                # are added to self.procs
-                # Then remove proc from nexts
-                # If there are still procs in nexts
-                # meaning some requires of those procs cannot run before
-                # those procs.
-                if not set(proc.requires) - set(self.procs):  # type: ignore
-                    self.procs.append(proc)  # type: ignore
-                    nexts.remove(proc)
-                    nexts |= set(proc.nexts or ())
-                    break
-            else:
-                if nexts:
-                    raise ProcDependencyError(
-                        f"No available next processes for {nexts}. "
-                        "Did you forget to start with their "
-                        "required processes?"
+        def _add_nexts(proc: Type[Proc]) -> None:
+            for nxt in proc.nexts or ():
+                if nxt in added:
+                    raise ProcDependencyError(f"Cyclic dependency: {nxt.name}")
+
+                if nxt in queued:
+                    continue
+
+                if nxt not in waiting:
+                    waiting[nxt] = set(nxt.requires or ()) - added
+                else:
+                    waiting[nxt].discard(proc)
+
+                if not waiting[nxt]:
+                    del waiting[nxt]
+                    queued.add(nxt)
+                    heapq.heappush(
+                        ready,
+                        (nxt.order or 0, nxt.name, next(counter), nxt),
                     )
 
+        for proc in self.procs:
+            _add_nexts(proc)
+
+        while ready:
+            *_, proc = heapq.heappop(ready)
+            if proc.name in names:
+                raise PipenOrProcNameError(
+                    f"'{proc.name}' is already used by another process."
+                )
+
+            logger.debug("- Next process: %s", proc)
+            self.procs.append(proc)  # type: ignore
+            added.add(proc)
+            names.add(proc.name)
+            _add_nexts(proc)
+
+        if waiting:
+            # Some requires of those procs cannot run before those procs.
+            raise ProcDependencyError(
+                f"No available next processes for {set(waiting)}. "
+                "Did you forget to start with their "
+                "required processes?"
+            )
+
         self.pbar = PipelinePBar(len(self.procs), self.name.upper())
 
 
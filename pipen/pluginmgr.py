@@ -9,7 +9,8 @@
 # pyright: reportOperatorIssue=false
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import time
+from typing import TYPE_CHECKING, Any
 
 from simplug import Simplug, SimplugResult
 from xqute import JobStatus, Scheduler
@@ -323,9 +324,16 @@ def on_jobcmd_end(job: Job) -> str:
     """
 
 
+def _update_run_db(job: Job, status: str, **fields: Any) -> None:
+    """Record the status of a job in the run database if it is enabled"""
+    run_db = job.proc.pipeline.run_db
+    if run_db is not None:
+        run_db.update_job(job, status, **fields)
+
+
 class PipenMainPlugin:
-    """The builtin core plugin, used to update the progress bar and
-    cache the job"""
+    """The builtin core plugin, used to update the progress bar, cache the
+    job and record the status in the run database"""
 
     name = "core"
     # The priority is set to -1000 to make sure it is the first plugin
@@ -342,6 +350,25 @@ class PipenMainPlugin:
                 sig.name,
             )
 
+    @plugin.impl
+    async def on_proc_start(proc: Proc):  # type: ignore[misc]
+        """Record the start of a process in the run database"""
+        if proc.pipeline.run_db is not None:
+            await proc.pipeline.run_db.update_proc(proc, "running")
+
+    @plugin.impl
+    async def on_proc_done(proc: Proc, succeeded: bool | str):  # type: ignore[misc]
+        """Record the end of a process in the run database"""
+        if proc.pipeline.run_db is not None:
+            await proc.pipeline.run_db.update_proc(
+                proc,
+                (
+                    "cached"
+                    if succeeded == "cached"
+                    else "succeeded" if succeeded else "failed"
+                ),
+            )
+
     @plugin.impl
     async def on_job_init(job: Job):  # type: ignore[misc]
         """Update the progress bar when a job is submitted"""
@@ -351,16 +378,24 @@ class PipenMainPlugin:
     async def on_job_queued(job: Job):  # type: ignore[misc]
         """Update the progress bar when a job is submitted"""
         job.proc.pbar.update_job_queued()
+        _update_run_db(job, "queued", queued=time.time())
 
     @plugin.impl
     async def on_job_started(job: Job):  # type: ignore[misc]
         """Update the progress bar when a job starts to run"""
         job.proc.pbar.update_job_running()
+        _update_run_db(job, "running", started=time.time())
 
     @plugin.impl
     async def on_job_submitted(job: Job):  # type: ignore[misc]
         """Update the progress bar when a job is submitted"""
         job.proc.pbar.update_job_submitted()
+        _update_run_db(
+            job,
+            "submitted",
+            submitted=time.time(),
+            jid=await job.get_jid(),
+        )
 
     @plugin.impl
     async def on_job_cached(job: Job):  # type: ignore[misc]
@@ -370,6 +405,8 @@ class PipenMainPlugin:
         job.proc.pbar.update_job_running()
         job.proc.pbar.update_job_succeeded(cached=True)
         await job.set_status(JobStatus.FINISHED)
+        job.proc._stream_job_done(job)
+        _update_run_db(job, "cached")
 
     @plugin.impl
     async def on_job_succeeded(job: Job):  # type: ignore[misc]
@@ -406,24 +443,34 @@ class PipenMainPlugin:
                     stderr += "."
 
                 await job.stderr_file.a_write_text(stderr)
+                if not job._error_retry or job.trial_count >= job._num_retries:
+                    job.proc._stream_job_done(job, succeeded=False)
+                _update_run_db(job, "failed", rc=0, ended=time.time())
                 break
         else:
             await job.cache()
             job.proc.pbar.update_job_succeeded()
+            job.proc._stream_job_done(job)
+            _update_run_db(job, "succeeded", rc=0, ended=time.time())
 
     @plugin.impl
     async def on_job_failed(job: Job):  # type: ignore[misc]
         """Update the progress bar when a job is failed"""
         job.proc.pbar.update_job_failed()
+        _update_run_db(job, "failed", rc=await job.get_rc(), ended=time.time())
         if job._error_retry and job.trial_count < job._num_retries:  # pragma: no cover
             job.log("debug", "Retrying #%s", job.trial_count + 1)
             job.proc.pbar.update_job_retrying()
+        else:
+            job.proc._stream_job_done(job, succeeded=False)
 
     @plugin.impl
     async def on_job_killed(job: Job):  # type: ignore[misc]
         """Update the status of a killed job"""
         # instead of FINISHED to force the whole pipeline to quit
         await job.set_status(JobStatus.FAILED)  # pragma: no cover
+        job.proc._stream_job_done(job, succeeded=False)  # pragma: no cover
+        _update_run_db(job, "killed", ended=time.time())  # pragma: no cover
 
 
 plugin.register(PipenMainPlugin)
@@ -9,15 +9,21 @@ from __future__ import annotations
 
 import asyncio
 import inspect
+import json
 import logging
+import textwrap
 from abc import ABC, ABCMeta
+from contextlib import suppress
 from functools import cached_property
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterable,
     List,
     Mapping,
     Sequence,
+    Tuple,
     Type,
     TYPE_CHECKING,
 )
@@ -28,17 +34,37 @@ from rich.panel import Panel
 from varname import VarnameException, varname
 from panpath import PanPath
 from xqute import JobStatus, Xqute
-
-from .defaults import ProcInputType
+from xqute.defaults import SLEEP_INTERVAL_POLLING_JOBS
+
+from ._limiter import ADAPTIVE_MAX_CONCURRENCY, PrepareLimiter
+from ._proc_caching import ProcCaching
+from ._script_renderer import ScriptRenderer
+from ._signature_store import SignatureStore
+from ._xqute_compat import poll_jobs, xqute_cancelled
+from .defaults import ProcInputType, ProcOutputType
 from .exceptions import (
+    ConfigurationError,
     ProcInputKeyError,
     ProcInputTypeError,
     ProcScriptFileNotFound,
     PipenOrProcNameError,
 )
+from .job import (
+    Job,
+    JobRecord,
+    _compact_output_data,
+    _expand_output_data,
+    _output_data_from_json,
+    _resolve_input_column,
+)
 from .pluginmgr import plugin
 from .scheduler import get_scheduler
-from .template import Template, get_template_engine
+from .template import (
+    Template,
+    TemplateJinja2,
+    TemplateLiquid,
+    get_template_engine,
+)
 from .utils import (
     brief_list,
     copy_dict,
@@ -57,6 +83,7 @@ from .utils import (
 )
 
 if TYPE_CHECKING:  # pragma: no cover
+    import pandas
     from pathlib import Path
     from .pipen import Pipen
     from .scheduler import Scheduler
@@ -77,6 +104,28 @@ class ProcMeta(ABCMeta):
             value = cls._compute_requires(value)
         return super().__setattr__(name, value)
 
+    @property
+    def output_data(cls) -> pandas.DataFrame | None:
+        """The output data of the process, to pass to the next processes
+
+        It is kept compact (see `_compact_output_data()`) until it is read
+        here, when the paths and the categories are turned back, and the
+        data is kept that way, so that the changes to it are seen by the
+        next processes.
+        """
+        data = cls._output_data
+        if data is None:
+            return None
+
+        expanded = _expand_output_data(data)
+        if expanded is not data:
+            cls._output_data = expanded
+        return expanded
+
+    @output_data.setter
+    def output_data(cls, value: pandas.DataFrame | None) -> None:
+        cls._output_data = value
+
     def __call__(cls, *args: Any, **kwds: Any) -> Proc:
         """Make sure Proc subclasses are singletons
 
@@ -93,7 +142,7 @@ class ProcMeta(ABCMeta):
         return cls._INSTANCES[cls]
 
 
-class Proc(ABC, metaclass=ProcMeta):
+class Proc(ABC, ProcCaching, metaclass=ProcMeta):
     """The abstract class for processes.
 
     It's an abstract class. You can't instantise a process using it directly.
@@ -117,6 +166,22 @@ class Proc(ABC, metaclass=ProcMeta):
         dirsig: When checking the signature for caching, whether should we walk
             through the content of the directory? This is sometimes
             time-consuming if the directory is big.
+        sigmode: How to tell whether the input files/directories are changed
+            when checking the signature for caching
+            - mtime: by the last modification time
+            - content: by the content hashes. Files that are newer are still
+                cached if their contents are not changed.
+        sigstore: Where to save the signatures of the jobs
+            - toml: a TOML file for each job
+            - jsonl: a JSON lines file for all jobs of the process, which is
+                read once and written in batches. The TOML files are still
+                used for the jobs not in it.
+        job_key: How to name the working directories of the jobs
+            - index: by the indexes of the jobs
+            - input: by the hashes of the input data of the jobs, so that
+                inserting, removing or reordering the input rows doesn't
+                make the other jobs rerun. The indexes are still the row
+                numbers, and not supported for streaming processes.
         export: When True, the results will be exported to `<pipeline.outdir>`
             Defaults to None, meaning only end processes will export.
             You can set it to True/False to enable or disable exporting
@@ -162,10 +227,44 @@ class Proc(ABC, metaclass=ProcMeta):
             - True: flatten the output for all processes
             - False: never flatten the output
         plugin_opts: Options for process-level plugins
+        job_window: How many jobs to keep alive (being prepared or running)
+            at most. The jobs are created just ahead of the free slots, and
+            the finished ones are replaced by compact records (see
+            `pipen.job.JobRecord`) in `proc.jobs`, so that the memory doesn't
+            grow with the number of jobs. None or 0 to create all jobs at once.
+        manifest_check: How to check if the process is cached as a whole,
+            without constructing the jobs
+            - False: not checked, the jobs are checked one by one
+            - files: by the manifest, and the input/output files of the jobs
+            - fingerprint: by the fingerprints of the input data and the
+                templates only, and the output data saved by the last run is
+                loaded directly, without checking the files
+        prepare_concurrency: How many jobs to prepare (and check for caching)
+            at the same time. None or 0 to use `submission_batch`. "auto" to
+            start from `submission_batch` and raise it while the time to
+            prepare a job stays low. See also `pipen._limiter.PrepareLimiter`.
+        render_workers: How many worker processes to render the scripts of
+            the jobs. With `0`, the scripts are rendered in the event loop,
+            which is blocked by heavy templates. See also
+            `pipen._script_renderer.ScriptRenderer`.
+        job_bundle_size: How many consecutive jobs to submit to the scheduler
+            as one job (a bundle), which runs the jobs one after another (or
+            `job_bundle_forks` at a time). 1 to submit the jobs one by one.
+            See also `pipen.scheduler.JobBundler`.
+        job_bundle_forks: How many jobs in a bundle to run at the same time
         requires: The dependency processes
         scheduler: The scheduler to run the jobs
         scheduler_opts: The options for the scheduler
-        script: The script template for the process
+        script: The script template for the process, or a python function
+            called with the input data and the output data of a job and the
+            envs of the process (`script(in_, out, envs)`), which is run by
+            the `callable` scheduler regardless of `scheduler`.
+            See also `pipen.scheduler.CallableScheduler`.
+        stream: Whether to start the jobs as soon as the corresponding jobs
+            of the required processes are done. Only works when the processes
+            are running simultaneously (`proc_forks` > 1) and `input_data` is
+            not a callback, so that job `i` takes the outputs of job `i` of
+            the required processes.
         submission_batch: How many jobs to be submited simultaneously.
             The program entrance for some schedulers may take too much resources
             when submitting a job or checking the job status. So we may use a
@@ -181,6 +280,9 @@ class Proc(ABC, metaclass=ProcMeta):
     envs_depth: int | None = None
     cache: bool | None = None
     dirsig: bool | None = None
+    sigmode: str | None = None
+    sigstore: str | None = None
+    job_key: str | None = None
     export: bool | None = None
     error_strategy: str | None = None
     num_retries: int | None = None
@@ -194,14 +296,22 @@ class Proc(ABC, metaclass=ProcMeta):
     output: str | Sequence[str] | None = None
     output_flatten: bool | None = None
     plugin_opts: Mapping[str, Any] | None = None
+    job_window: int | None = None
+    prepare_concurrency: int | str | None = None
+    manifest_check: str | None = None
+    render_workers: int | None = None
+    job_bundle_size: int | None = None
+    job_bundle_forks: int | None = None
     requires: Type[Proc] | Sequence[Type[Proc]] | None = None
     scheduler: str | None = None  # type: ignore
     scheduler_opts: Mapping[str, Any] | None = None
-    script: str | None = None
+    script: str | Callable | None = None
+    stream: bool | None = None
     submission_batch: int | None = None
 
     nexts: Sequence[Type[Proc]] | None = None
-    output_data: Any | None = None
+    # The output data, see `ProcMeta.output_data`
+    _output_data: pandas.DataFrame | None = None
     workdir: str | Path | None = None
     # metadata that marks the process
     # Can also be used for plugins
@@ -297,7 +407,7 @@ class Proc(ABC, metaclass=ProcMeta):
             "input_data": input_data,
             "requires": requires,
             "nexts": None,
-            "output_data": None,
+            "_output_data": None,
         }
 
         locs = locals()
@@ -367,6 +477,8 @@ class Proc(ABC, metaclass=ProcMeta):
         )
         if callable(cls.input_data):
             cls.input_data = staticmethod(cls.input_data)
+        if callable(cls.__dict__.get("script")):
+            cls.script = staticmethod(cls.script)
 
         cls.__meta__ = {"procgroup": None}
 
@@ -384,6 +496,42 @@ class Proc(ABC, metaclass=ProcMeta):
         self.pbar: ProcPBar | None = None
         self.jobs: List[Any] = []
         self.xqute: Xqute | None = None
+        # The outputs of the jobs passed to the streaming processes
+        self._stream_outputs: List[asyncio.Future] | None = None
+        # The script before compiled, for the manifest to detect changes
+        self._script_source: str | None = None
+        # Whether all jobs are cached
+        self._all_cached = False
+        # The output data restored from the manifest
+        self._manifest_output: List[Dict[str, Any]] | None = None
+        # The signatures of the jobs in a single file, if sigstore is jsonl
+        self._signature_store: SignatureStore | None = None
+        # The keys of the jobs, if they are keyed by the input data
+        self._job_keys: List[str] | None = None
+        # The input data of the jobs with the paths resolved
+        self._input_records: List[Dict[str, Any]] | None = None
+        # The jobs alive (being prepared or running) with job_window,
+        # index => (position in self.jobs, job)
+        self._live_jobs: Dict[int, Tuple[int, Job]] = {}
+        # The number of the job slots taken, including the jobs being created
+        self._job_slots = 0
+        # The polls of the jobs while feeding, with job_window or streaming,
+        # since xqute doesn't poll the jobs until the feeding is stopped
+        self._feeding_polls = 0
+        self._feeding_poll_lock: asyncio.Lock | None = None
+        # The limiter of the number of jobs prepared at the same time
+        self._prepare_limiter: PrepareLimiter | None = None
+        # The worker processes to render the scripts of the jobs
+        self._script_renderer: ScriptRenderer | None = None
+        # The output data built when the process is done, or loaded from
+        # output_data_file
+        self._output_channel: pandas.DataFrame | None = None
+        # Whether output_data_file has the output data of the last run
+        self._output_data_saved = False
+        # The names, types and value templates of the outputs
+        self._output_spec: List[Tuple[str, str | None, Template | str]] | None = (
+            None
+        )
         self.__class__.workdir = (
             PanPath(self.pipeline.workdir) / self.name  # type: ignore
         )
@@ -426,11 +574,17 @@ class Proc(ABC, metaclass=ProcMeta):
 
     async def _init(self) -> None:
         """Async init for the process"""
+        self.stream = self.pipeline._proc_streams(self.__class__)
         # input
-        self.input = self._compute_input()  # type: ignore
+        if self.stream:
+            self.input = self._compute_stream_input()  # type: ignore
+        else:
+            self.input = self._compute_input()  # type: ignore
         # output
         self.output = self._compute_output()  # type: ignore
         await plugin.hooks.on_proc_input_computed(self)
+        self._job_keys = self._compute_job_keys()
+        self._output_spec = self._compile_output()
 
         if self.output_flatten is None:
             self.output_flatten = self.export and self.size == 1
@@ -442,38 +596,280 @@ class Proc(ABC, metaclass=ProcMeta):
 
         if self.submission_batch is None:
             self.submission_batch = self.pipeline.config.submission_batch
+        if self.job_bundle_size is None:
+            self.job_bundle_size = self.pipeline.config.job_bundle_size
+        if self.job_bundle_forks is None:
+            self.job_bundle_forks = self.pipeline.config.job_bundle_forks
 
         self.script = await self._compute_script()  # type: ignore
+        if callable(self.script):
+            self.scheduler = get_scheduler("callable")
+
+        if any(self.pipeline._proc_streams(nxt) for nxt in self.nexts or ()):
+            loop = asyncio.get_running_loop()
+            self._stream_outputs = [loop.create_future() for _ in range(self.size)]
+        else:
+            self._stream_outputs = None
+
+    def _job_window(self) -> int | None:
+        """Get the maximum number of jobs alive at the same time
+
+        Returns:
+            The window size, or None if the jobs are not windowed
+        """
+        return (
+            self.pipeline.config.job_window
+            if self.job_window is None
+            else self.job_window
+        ) or None
+
+    async def _take_job_slot(self) -> bool:
+        """Wait for a free slot to create a job with job_window
+
+        The alive jobs are polled to free the slots of the finished ones,
+        since xqute doesn't poll the jobs until the feeding is stopped.
+
+        Returns:
+            True if a slot is taken, False if the process is cancelled
+        """
+        window = self._job_window()
+        while self._job_slots >= window:  # type: ignore[operator]
+            if xqute_cancelled(self.xqute):  # type: ignore[arg-type]
+                return False
+
+            async with self._feeding_poll_lock:  # type: ignore[union-attr]
+                if self._job_slots < window:  # type: ignore[operator]
+                    # freed by another lane
+                    break
+                await poll_jobs(
+                    self.xqute,  # type: ignore[arg-type]
+                    [job for _, job in self._live_jobs.values()],
+                    self._feeding_polls,
+                )
+                self._feeding_polls += 1
+                for _, job in list(self._live_jobs.values()):
+                    if job._status in (JobStatus.FINISHED, JobStatus.FAILED):
+                        self._release_job(job)
+
+                if self._job_slots >= window:  # type: ignore[operator]
+                    await asyncio.sleep(SLEEP_INTERVAL_POLLING_JOBS)
+
+        self._job_slots += 1
+        return True
+
+    def _release_job(self, job: Job) -> None:
+        """Replace a finished job with its compact record and free its slot
 
-    async def _prepare_jobs_in_batch(self, indexes: Sequence[int]) -> List[int]:
+        Args:
+            job: The finished job
+        """
+        pos, _ = self._live_jobs.pop(job.index)
+        self.jobs[pos] = JobRecord(job)
+        with suppress(ValueError):  # cached jobs are not fed
+            self.xqute.jobs.remove(job)
+        self._job_slots -= 1
+
+    async def _prepare_job(self, index: int) -> bool:
+        """Create and prepare a job, and feed it to xqute if it is not cached
+
+        Args:
+            index: The job index
+
+        Returns:
+            True if the job is cached otherwise False
+        """
+        windowed = self._job_window() is not None
+        if windowed and not await self._take_job_slot():
+            return False
+
+        job = await self.xqute.scheduler.create_job(
+            index,
+            "",
+            envs={"PIPEN_JOB_KEY": self._job_key(index)},
+        )
+        self.jobs.append(job)
+        if windowed:
+            self._live_jobs[index] = (len(self.jobs) - 1, job)
+        await job.prepare(self)
+
+        if await job.cached:
+            await plugin.hooks.on_job_cached(job)
+            if windowed:
+                self._release_job(job)
+            return True
+
+        envs = {
+            "PIPEN_JOB_INDEX": job.index,
+            "PIPEN_JOB_METADIR_SPEC": str(job.metadir),
+            "PIPEN_JOB_OUTDIR_SPEC": str(job.outdir),
+            "PIPEN_JOB_METADIR": str(job.metadir.mounted),
+            "PIPEN_JOB_OUTDIR": str(job.outdir.mounted),
+        }
+        # The job is going to write to these directories
+        self.pipeline.path_cache.invalidate(job.metadir)
+        self.pipeline.path_cache.invalidate(job.outdir)
+        await self.xqute.feed(job, envs=envs)
+        return False
+
+    async def _prepare_jobs_in_batch(self, indexes: Iterable[int]) -> List[int]:
         """Prepare jobs in batch
 
         Args:
-            indexes: The job indexes to prepare
+            indexes: The job indexes to prepare, an iterator shared by the
+                lanes to take the next job from
         """
         cached_jobs = []
         for i in indexes:
-            job = await self.xqute.scheduler.create_job(i, "")
-            self.jobs.append(job)
-            await job.prepare(self)
+            async with self._prepare_limiter.slot():  # type: ignore[union-attr]
+                if await self._prepare_job(i):
+                    cached_jobs.append(i)
 
-            if await job.cached:
-                cached_jobs.append(job.index)
-                await plugin.hooks.on_job_cached(job)
-            else:
-                envs = {
-                    "PIPEN_JOB_INDEX": job.index,
-                    "PIPEN_JOB_METADIR_SPEC": str(job.metadir),
-                    "PIPEN_JOB_OUTDIR_SPEC": str(job.outdir),
-                    "PIPEN_JOB_METADIR": str(job.metadir.mounted),
-                    "PIPEN_JOB_OUTDIR": str(job.outdir.mounted),
-                }
-                await self.xqute.feed(job, envs=envs)
+        return cached_jobs
+
+    async def _prepare_jobs_from_queue(self, queue: asyncio.Queue) -> List[int]:
+        """Prepare jobs whose indexes are put in the queue, until None is got
+
+        Args:
+            queue: The queue of job indexes
+        """
+        cached_jobs = []
+        while True:
+            i = await queue.get()
+            if i is None:
+                break
+            async with self._prepare_limiter.slot():  # type: ignore[union-attr]
+                if await self._prepare_job(i):
+                    cached_jobs.append(i)
 
         return cached_jobs
 
+    async def _stream_jobs(self, queue: asyncio.Queue, lanes: int) -> None:
+        """Put the job indexes in the queue once their input is ready
+
+        The input of job `i` is ready when job `i` of all the required processes
+        are done. If any of them fails, job `i` is not put in the queue, and
+        it is passed to the next streaming processes as failed.
+
+        Args:
+            queue: The queue of job indexes
+            lanes: The number of lanes taking the indexes from the queue
+        """
+
+        async def _stream_job(index: int) -> None:
+            if await self._stream_input_row(index):
+                await queue.put(index)
+            elif self._stream_outputs is not None:
+                self._stream_outputs[index].set_result(None)
+
+        await asyncio.gather(*(_stream_job(i) for i in range(self.size)))
+        for _ in range(lanes):
+            await queue.put(None)
+
+    async def _poll_fed_jobs(self, fed: asyncio.Event) -> None:
+        """Poll the jobs fed to xqute until all the jobs are fed
+
+        xqute doesn't poll the jobs until the feeding is stopped, so the
+        finished jobs of a streaming process, which keeps feeding until the
+        input rows are all ready, don't free their forks for the next jobs,
+        nor get passed to the next streaming processes, without polling them.
+
+        Args:
+            fed: The event set when all the jobs are fed
+        """
+        while not fed.is_set() and not xqute_cancelled(
+            self.xqute  # type: ignore[arg-type]
+        ):
+            async with self._feeding_poll_lock:  # type: ignore[union-attr]
+                await poll_jobs(
+                    self.xqute,  # type: ignore[arg-type]
+                    [
+                        job
+                        for job in self.xqute.jobs  # type: ignore[union-attr]
+                        if job._status not in (JobStatus.FINISHED, JobStatus.FAILED)
+                    ],
+                    self._feeding_polls,
+                )
+                self._feeding_polls += 1
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(fed.wait(), SLEEP_INTERVAL_POLLING_JOBS)
+
+    def _create_prepare_limiter(self) -> PrepareLimiter:
+        """Create the limiter of the number of jobs prepared at the same time
+
+        Returns:
+            The limiter, adaptive if `prepare_concurrency` is "auto"
+        """
+        concurrency = (
+            self.pipeline.config.prepare_concurrency
+            if self.prepare_concurrency is None
+            else self.prepare_concurrency
+        )
+        if concurrency == "auto":
+            return PrepareLimiter(self.submission_batch, ADAPTIVE_MAX_CONCURRENCY)
+        if not concurrency:
+            return PrepareLimiter(self.submission_batch)
+        if not isinstance(concurrency, int):
+            raise ConfigurationError(
+                f"[{self.name}] Expect an integer or 'auto' for "
+                f"prepare_concurrency, got {concurrency!r}"
+            )
+        return PrepareLimiter(concurrency)
+
+    async def _prepare_jobs(self) -> List[int]:
+        """Prepare all jobs and feed the ones that are not cached to xqute
+
+        The number of jobs prepared (and checked for caching) at the same
+        time is limited by `prepare_concurrency`, independent of
+        `submission_batch`, which limits the submissions to the scheduler.
+
+        Returns:
+            The indexes of the cached jobs
+        """
+        # The limiter decides how many of the lanes are busy
+        lanes = self._prepare_limiter.maximum  # type: ignore[union-attr]
+        if self.stream:
+            # prepare the jobs in the order that their inputs are ready
+            queue: asyncio.Queue = asyncio.Queue()
+            fed = asyncio.Event()
+            polling = asyncio.ensure_future(self._poll_fed_jobs(fed))
+            try:
+                _, *cached_job_list = await asyncio.gather(
+                    self._stream_jobs(queue, lanes),
+                    *(self._prepare_jobs_from_queue(queue) for _ in range(lanes)),
+                )
+            finally:
+                fed.set()
+                await polling
+        else:
+            # the lanes take the next job index from the same iterator
+            indexes = iter(range(self.input.data.shape[0]))
+            cached_job_list = await asyncio.gather(
+                *(self._prepare_jobs_in_batch(indexes) for _ in range(lanes))
+            )
+
+        if self._prepare_limiter.adaptive:
+            self.log(
+                "debug",
+                "Prepared jobs with up to %s at the same time",
+                self._prepare_limiter.peak,
+            )
+        return [i for sublist in cached_job_list for i in sublist]
+
     async def run(self) -> None:
         """Init all other properties and jobs"""
+        try:
+            await self._run()
+        finally:
+            # The jobs not created or not done, i.e. when xqute halts or is
+            # cancelled, are failed for the next streaming processes, so
+            # that they don't wait forever
+            for future in self._stream_outputs or ():
+                if not future.done():
+                    future.set_result(None)
+
+    async def _run(self) -> None:
+        """Run the process, see `run()`"""
         scheduler_opts = copy_dict(self.pipeline.config.scheduler_opts or {}, -1)
         scheduler_opts = update_dict(
             scheduler_opts,
@@ -496,6 +892,9 @@ class Proc(ABC, metaclass=ProcMeta):
             jobname_prefix=self.name,
             scheduler_opts=scheduler_opts,
         )
+        # xqute registers the signal handlers to cancel itself only,
+        # make sure all the running processes get cancelled
+        self.pipeline._add_signal_handlers()
         self.submission_batch = self.xqute.scheduler.subm_batch
         await self.xqute.scheduler.init_proc(self)
         # for the plugin hooks to access
@@ -504,46 +903,148 @@ class Proc(ABC, metaclass=ProcMeta):
         self.pbar = self.pipeline.pbar.proc_bar(self.input.data.shape[0], self.name)
 
         await plugin.hooks.on_proc_start(self)
+        sigstore = (
+            self.pipeline.config.sigstore if self.sigstore is None else self.sigstore
+        )
+        if sigstore == "jsonl":
+            self._signature_store = SignatureStore(
+                self.workdir / "proc.signatures.jsonl"
+            )
+        # List the cloud directories at once for the checks of the jobs
+        await asyncio.gather(
+            self.pipeline.path_cache.prefetch(self.workdir),
+            *(
+                [self.pipeline.path_cache.prefetch(self._export_dir)]
+                if self.export
+                else []
+            ),
+        )
+        self._output_data_saved = False
+        self._prepare_limiter = self._create_prepare_limiter()
+        self._output_channel = await self._load_output_channel()
+        if self._output_channel is None:
+            self._manifest_output = await self._check_manifest()
+        if self._output_channel is not None or self._manifest_output is not None:
+            # all jobs are cached, no need to construct them
+            self._all_cached = True
+            self.log("info", "Cached jobs: %s", brief_list(list(range(self.size))))
+            if self._output_channel is None:
+                self._output_channel = _compact_output_data(self._manifest_output)
+                if self._manifest_check() == "fingerprint":
+                    await self._save_output_channel()
+            if self._stream_outputs is not None:
+                outputs = self._manifest_output or _expand_output_data(
+                    self._output_channel
+                ).to_dict("records")
+                for future, output in zip(self._stream_outputs, outputs):
+                    future.set_result(output)
+            self.pbar.update_jobs_cached()
+            self.pbar.done()
+            await plugin.hooks.on_proc_done(self, "cached")
+            return
+
+        await self._clear_manifest()
+        if not self.stream and self._job_window() is None:
+            # With a window, the jobs resolve their own rows instead, so
+            # that the resolved input is released with the jobs
+            self._input_records = self._resolve_input()
+        self._feeding_poll_lock = asyncio.Lock()
+        render_workers = (
+            self.pipeline.config.render_workers
+            if self.render_workers is None
+            else self.render_workers
+        )
+        if render_workers and self.script and not callable(self.script):
+            self._script_renderer = ScriptRenderer(self, render_workers)
         await self.xqute.run_until_complete(keep_feeding=True)
 
-        # split job preparation into batches (self.submission_batch)
-        # for example, job indexes: 0-9 and submission_batch=3
-        # will be split into [0,3,6,9], [1,4,7], [2,5,8]
-        job_indexes_batches: List[List[int]] = [
-            [] for _ in range(self.submission_batch)
-        ]
-        for i in range(self.input.data.shape[0]):
-            job_indexes_batches[i % self.submission_batch].append(i)
-
-        cached_job_list = await asyncio.gather(
-            *(self._prepare_jobs_in_batch(batch) for batch in job_indexes_batches)
-        )
+        try:
+            cached_jobs = await self._prepare_jobs()
+        finally:
+            if self._script_renderer is not None:
+                self._script_renderer.shutdown()
+                self._script_renderer = None
 
-        cached_jobs = [i for sublist in cached_job_list for i in sublist]
         if cached_jobs:
             self.log("info", "Cached jobs: %s", brief_list(cached_jobs))
 
-        await self.xqute.stop_feeding()
+        try:
+            await self.xqute.stop_feeding()
+        finally:
+            self.xqute.scheduler.shutdown()
+        if self._signature_store is not None:
+            await self._signature_store.flush()
+        self._all_cached = len(cached_jobs) == self.size
+        if self.succeeded and (
+            self.pipeline.config.cache if self.cache is None else self.cache
+        ):
+            if self._manifest_check():
+                await self._write_manifest()
+            self._output_channel = _compact_output_data(
+                job.output for job in sorted(self.jobs, key=lambda j: j.index)
+            )
+            # to be loaded by the next runs
+            if self._manifest_check() == "fingerprint":
+                await self._save_output_channel()
+
         self.pbar.done()
         await plugin.hooks.on_proc_done(
             self,
             (
                 False
                 if not self.succeeded
-                else "cached" if len(cached_jobs) == self.size else True
+                else "cached" if self._all_cached else True
             ),
         )
 
+    async def _spill_output_data(self) -> None:
+        """Save the output data to `output_data_file` before it is released,
+        if it is not saved yet"""
+        if not self._output_data_saved:
+            self._output_channel = self.__class__._output_data
+            await self._save_output_channel()
+            self._output_channel = None
+
+    @classmethod
+    def load_output_data(cls) -> pandas.DataFrame | None:
+        """Get the output data of the last run of the process, which is
+        loaded from `output_data_file` if it is released with
+        `release_output_data = "spill"` (or it is saved for caching)
+
+        Returns:
+            The output data, or None if the process hasn't run, or the output
+            data is released without being saved
+        """
+        if cls.output_data is not None:
+            return cls.output_data
+
+        proc = cls._INSTANCES.get(cls)
+        if proc is None or not proc._output_data_saved:
+            return None
+
+        return _expand_output_data(
+            _output_data_from_json(
+                json.loads(proc.output_data_file.read_text())["data"]
+            )
+        )
+
     def gc(self):
         """GC process for the process to save memory after it's done"""
-        import pandas
-
         # store the output data for the next processes
-        self.__class__.output_data = pandas.DataFrame(
-            (job.output for job in sorted(self.jobs, key=lambda j: j.index))
-        )
+        if self._output_channel is None:
+            self._output_channel = _compact_output_data(
+                job.output for job in sorted(self.jobs, key=lambda j: j.index)
+            )
+        self.__class__.output_data = self._output_channel
+        self._output_channel = None
+        self._manifest_output = None
 
         self._duplicate_fields_check: dict[str, set] = {}
+        self._signature_store = None
+        self._job_keys = None
+        self._input_records = None
+        self._live_jobs = {}
+        self._job_slots = 0
 
         del self.xqute.jobs[:]
         self.xqute.jobs = []
@@ -597,8 +1098,14 @@ class Proc(ABC, metaclass=ProcMeta):
     @cached_property
     def succeeded(self) -> bool:
         """Check if the process is succeeded (all jobs succeeded)"""
+        # Jobs may be missing for streaming processes when the corresponding
+        # jobs of the required processes fail
         # _status was updated by xqute
-        return all(job._status == JobStatus.FINISHED for job in self.jobs)
+        if self._manifest_output is not None or self._output_channel is not None:
+            return True
+        return len(self.jobs) == self.size and all(
+            job._status == JobStatus.FINISHED for job in self.jobs
+        )
 
     # Private methods
     @classmethod
@@ -635,15 +1142,12 @@ class Proc(ABC, metaclass=ProcMeta):
 
         return requires  # type: ignore
 
-    def _compute_input(self) -> Mapping[str, Mapping[str, Any]]:
-        """Calculate the input based on input and input data
+    def _compute_input_type(self) -> Mapping[str, str]:
+        """Compute the input types from the input keys
 
         Returns:
-            A dict with type and data
+            A dict with input keys as keys and input types as values
         """
-        import pandas
-        from .channel import Channel
-
         # split input keys into keys and types
         input_keys = self.__class__.input
         if input_keys and isinstance(input_keys, str):
@@ -652,10 +1156,10 @@ class Proc(ABC, metaclass=ProcMeta):
         if not input_keys:
             raise ProcInputKeyError(f"[{self.name}] No input provided")
 
-        out = Diot(type={}, data=None)
+        out = {}
         for input_key_type in input_keys:
             if ":" not in input_key_type:
-                out.type[input_key_type] = ProcInputType.VAR
+                out[input_key_type] = ProcInputType.VAR
                 continue
 
             input_key, input_type = strsplit(input_key_type, ":", 1)
@@ -663,7 +1167,20 @@ class Proc(ABC, metaclass=ProcMeta):
                 raise ProcInputTypeError(
                     f"[{self.name}] Unsupported input type: {input_type}"
                 )
-            out.type[input_key] = input_type
+            out[input_key] = input_type
+
+        return out
+
+    def _compute_input(self) -> Mapping[str, Mapping[str, Any]]:
+        """Calculate the input based on input and input data
+
+        Returns:
+            A dict with type and data
+        """
+        import pandas
+        from .channel import Channel
+
+        out = Diot(type=self._compute_input_type(), data=None)
 
         # get the data
         if not self.requires and self.input_data is None:
@@ -685,46 +1202,167 @@ class Proc(ABC, metaclass=ProcMeta):
                 )
 
             out.data = pandas.concat(
-                (req.output_data for req in self.requires),  # type: ignore
+                (req._output_data for req in self.requires),  # type: ignore
                 axis=1,
             ).ffill()
 
-        make_df_colnames_unique_inplace(out.data)
+        out.data = self._match_input_data(out.type, out.data)
+        return out
+
+    def _match_input_data(
+        self,
+        input_type: Mapping[str, str],
+        data: pandas.DataFrame,
+        warn: bool = True,
+    ) -> pandas.DataFrame:
+        """Match the columns of the data with the input keys
+
+        Args:
+            input_type: The input types
+            data: The input data
+            warn: Whether to warn about wasted or missing columns
+
+        Returns:
+            The data with columns named and ordered as the input keys
+        """
+        make_df_colnames_unique_inplace(data)
 
         # try match the column names
         # if none matched, use the first columns
-        # rest_cols = out.data.columns.difference(out.type, False)
-        rest_cols = [col for col in out.data.columns if col not in out.type]
+        # rest_cols = data.columns.difference(input_type, False)
+        rest_cols = [col for col in data.columns if col not in input_type]
         len_rest_cols = len(rest_cols)
-        # matched_cols = out.data.columns.intersection(out.type)
-        matched_cols = [col for col in out.data.columns if col in out.type]
-        needed_cols = [col for col in out.type if col not in matched_cols]
+        # matched_cols = data.columns.intersection(input_type)
+        matched_cols = [col for col in data.columns if col in input_type]
+        needed_cols = [col for col in input_type if col not in matched_cols]
         len_needed_cols = len(needed_cols)
 
         if len_rest_cols > len_needed_cols:
-            self.log(
-                "warning",
-                "Wasted %s column(s) of input data.",
-                len_rest_cols - len_needed_cols,
-            )
+            if warn:
+                self.log(
+                    "warning",
+                    "Wasted %s column(s) of input data.",
+                    len_rest_cols - len_needed_cols,
+                )
         elif len_rest_cols < len_needed_cols:
-            self.log(
-                "warning",
-                "No data column for input: %s, using None.",
-                needed_cols[len_rest_cols:],
-            )
+            if warn:
+                self.log(
+                    "warning",
+                    "No data column for input: %s, using None.",
+                    needed_cols[len_rest_cols:],
+                )
             # Add None
             # Use loop to keep order
             for needed_col in needed_cols[len_rest_cols:]:
-                out.data.insert(out.data.shape[1], needed_col, None)
+                data.insert(data.shape[1], needed_col, None)
             len_needed_cols = len_rest_cols
 
-        out.data = out.data.rename(
+        return data.rename(
             columns=dict(zip(rest_cols[:len_needed_cols], needed_cols))
-        ).loc[:, list(out.type)]
+        ).loc[:, list(input_type)]
+
+    def _resolve_input(self) -> List[Dict[str, Any]]:
+        """Resolve the input data of all jobs at once
+
+        The file/directory inputs are processed column by column, instead of
+        row by row for each job, which is slow with a large number of jobs.
+
+        Returns:
+            The input data of the jobs, with the file/directory inputs
+            processed
+        """
+        data = self.input.data
+        columns = {
+            inkey: _resolve_input_column(
+                inkey,
+                self.input.type.get(inkey, ProcInputType.VAR),
+                data[inkey].tolist(),
+                self.name,
+            )
+            for inkey in data.columns
+        }
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
 
+    def _compute_stream_input(self) -> Mapping[str, Mapping[str, Any]]:
+        """Calculate the input for a streaming process
+
+        The data is filled row by row as the jobs of the required processes
+        are done (see `_stream_input_row()`).
+
+        Returns:
+            A dict with type and data
+        """
+        import pandas
+
+        out = Diot(type=self._compute_input_type(), data=None)
+        if self.input_data:
+            self.log(
+                "warning",
+                "Ignoring input data, this is not a start process.",
+            )
+
+        size = max(
+            len(req._INSTANCES[req]._stream_outputs)  # type: ignore
+            for req in self.requires  # type: ignore
+        )
+        out.data = pandas.DataFrame(
+            None,
+            index=range(size),
+            columns=list(out.type),
+            dtype=object,
+        )
+        self._stream_warned = False
         return out
 
+    async def _stream_input_row(self, index: int) -> bool:
+        """Wait for job `index` of the required processes and fill the input data
+
+        Like `pandas.concat(..., axis=1).ffill()` used by `_compute_input()`,
+        the last job of a required process is used for the rest rows, if it has
+        less jobs than others.
+
+        Args:
+            index: The job index
+
+        Returns:
+            True if the input is filled, False if any of the jobs failed
+        """
+        import pandas
+
+        outputs = []
+        for req in self.requires:  # type: ignore
+            stream_outputs = req._INSTANCES[req]._stream_outputs  # type: ignore
+            if not stream_outputs:
+                continue
+            output = await stream_outputs[min(index, len(stream_outputs) - 1)]
+            if output is None:
+                return False
+            outputs.append(pandas.DataFrame([dict(output)]))
+
+        row = self._match_input_data(
+            self.input.type,
+            pandas.concat(outputs, axis=1),
+            warn=not self._stream_warned,
+        )
+        self._stream_warned = True
+        for i, value in enumerate(row.iloc[0, :]):
+            self.input.data.iat[index, i] = value
+        return True
+
+    def _stream_job_done(self, job: Any, succeeded: bool = True) -> None:
+        """Pass the output of a done job to the streaming processes
+
+        Args:
+            job: The job
+            succeeded: Whether the job succeeded
+        """
+        if self._stream_outputs is None:
+            return
+
+        future = self._stream_outputs[job.index]
+        if not future.done():
+            future.set_result(job.output if succeeded else None)
+
     def _compute_output(self) -> Template | List[Template]:
         """Compute the output for jobs to render"""
         output = self.__class__.output
@@ -739,13 +1377,94 @@ class Proc(ABC, metaclass=ProcMeta):
 
         return self.template(output, **self.template_opts)  # type: ignore[operator]
 
-    async def _compute_script(self) -> Template | None:
-        """Compute the script for jobs to render"""
+    def _compile_output(
+        self,
+    ) -> List[Tuple[str, str | None, Template | str]] | None:
+        """Parse the output into the names, types and values once for all jobs,
+        so that the jobs only need to render the values
+
+        The values without any template tags are not rendered at all.
+
+        Returns:
+            The names, types (None if not given) and value templates (or
+            strings for static values) of the outputs. None if the output
+            can't be parsed before rendering, i.e. the names or types are
+            templated, or there are template blocks, or a template engine
+            other than the builtin ones is used, and the whole output is
+            rendered for each job as usual.
+        """
+        output = self.__class__.output
+        if not output or not is_subclass(
+            self.template, (TemplateLiquid, TemplateJinja2)  # type: ignore[arg-type]
+        ):
+            return None
+
+        # customized delimiters, i.e. variable_start_string for jinja2
+        if any(
+            key.endswith(("_string", "_prefix")) for key in self.template_opts or {}
+        ):
+            return None
+
+        if isinstance(output, (list, tuple)):
+            pieces = list(output)
+        else:
+            pieces = strsplit(output, ",")
+
+        spec: List[Tuple[str, str | None, Template | str]] = []
+        for piece in pieces:
+            if ":" not in piece or "{%" in piece or "%}" in piece:
+                return None
+            if piece.count("{") != piece.count("}"):
+                # i.e. commas in the tags
+                return None
+
+            output_name, value = piece.split(":", 1)
+            output_type = None
+            head, sep, rest = value.partition(":")
+            if sep and head in ProcOutputType.__dict__.values():
+                output_type, value = head, rest
+            elif sep and ("{" in head or "%" in head):
+                # the type may be rendered
+                return None
+
+            if "{" in output_name or "%" in output_name:
+                return None
+
+            spec.append(
+                (
+                    output_name,
+                    output_type,
+                    (
+                        value
+                        if "{" not in value and "%" not in value
+                        else self.template(  # type: ignore[operator]
+                            value, **self.template_opts
+                        )
+                    ),
+                )
+            )
+
+        return spec
+
+    async def _compute_script(self) -> Template | Callable | None:
+        """Compute the script for jobs to render, or the function to call"""
         if not self.__class__.script:
             self.log("warning", "No script specified.")
             return None
 
         script = self.__class__.script
+        if callable(script):
+            # The source is also saved as the script of the jobs, so that the
+            # changes of the function are detected for caching
+            try:
+                self._script_source = textwrap.dedent(inspect.getsource(script))
+            except (OSError, TypeError):
+                self._script_source = "{}.{}".format(
+                    getattr(script, "__module__", None),
+                    getattr(script, "__qualname__", type(script).__qualname__),
+                )
+            return script
+
         if script.startswith("file://"):
             script_file = PanPath(script)
             if not script_file.is_absolute():
@@ -765,6 +1484,7 @@ class Proc(ABC, metaclass=ProcMeta):
             self.lang = get_shebang(self.script)
 
         await plugin.hooks.on_proc_script_computed(self)
+        self._script_source = self.script
         return self.template(self.script, **self.template_opts)  # type: ignore
 
     def _log_info(self):
@@ -133,6 +133,16 @@ class ProcPBar:
         except ValueError:  # pragma: no cover
             pass
 
+    def update_jobs_cached(self):
+        """Update the progress bar when all jobs are cached at once"""
+        if self.bar_format:
+            self.counter.bar_format = self.bar_format.format("Cached")
+        self.counter.update(self.proc_size)
+        try:
+            self.success_counter.update_from(self.counter, self.proc_size)
+        except ValueError:  # pragma: no cover
+            pass
+
     def update_job_failed(self):
         """Update the progress bar when a job is failed"""
         if self.bar_format:
@@ -2,14 +2,35 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Type
+import asyncio
+import hashlib
+import os
+import pickle
+import re
+import shlex
+from abc import ABC, abstractmethod
+from traceback import format_exception
+from xml.etree import ElementTree
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Set,
+    Tuple,
+    Type,
+)
 from pathlib import Path
 
 from diot import Diot
-from panpath import GSPath, PanPath
-from xqute import Scheduler
+from panpath import CloudPath, GSPath, PanPath
+from xqute import JobStatus, Scheduler
 from xqute.path import SpecPath
-from xqute.defaults import DEFAULT_WORKDIR_NAME
+from xqute.plugin import plugin as xqute_plugin
+from xqute.utils import logger
+from xqute.defaults import DEFAULT_WORKDIR_NAME, JOBCMD_WRAPPER_LANG
 from xqute.schedulers.local_scheduler import LocalScheduler as XquteLocalScheduler
 from xqute.schedulers.sge_scheduler import SgeScheduler as XquteSgeScheduler
 from xqute.schedulers.slurm_scheduler import SlurmScheduler as XquteSlurmScheduler
@@ -23,6 +44,9 @@ from xqute.schedulers.container_scheduler import (
     ContainerScheduler as XquteContainerScheduler,
 )
 
+from ._callable_pool import CallablePool
+from ._pyworker import PythonWorkerPool
+from ._status_poller import StatusPoller
 from .defaults import SCHEDULER_ENTRY_GROUP
 from .exceptions import NoSuchSchedulerError, WrongSchedulerTypeError
 from .job import Job
@@ -31,8 +55,280 @@ from .utils import is_subclass, load_entrypoints
 if TYPE_CHECKING:
     from .proc import Proc
 
+# The most jobs to submit as an array job with `array_jobs=True`
+ARRAY_JOBS_MAX_TASKS = 1000
+# How long (in seconds) to wait for more jobs before submitting an array job
+ARRAY_JOBS_WAIT = 0.5
+# The most job ids to query at once with squeue
+SQUEUE_MAX_JOBS = 500
+# How long (in seconds) to wait for the rest of a bundle of jobs, i.e. when
+# some of them are cached
+JOB_BUNDLE_WAIT = 0.5
+# The interpreters of the jobs to run in the workers of the pyworker scheduler
+PYTHON_INTERPRETER = re.compile(r"python[\d.]*")
+
+
+class JobBundler:
+    """Provides job bundling for all schedulers
+
+    With process option `job_bundle_size` larger than 1, the jobs are
+    grouped by `job.index // job_bundle_size`, and the jobs of a group are
+    submitted together as one job of the scheduler, once the group is full,
+    or `JOB_BUNDLE_WAIT` seconds after a job is collected (i.e. when some
+    jobs of the group are cached). The bundle is submitted as its first job,
+    whose wrapped script is replaced by one that runs the wrapped scripts of
+    all the jobs in the bundle, `job_bundle_forks` at a time. So the status,
+    rc, stdout, stderr and signature are still written for each job, and
+    the jobs share the jid of the bundle. A failed job is retried in a new
+    bundle with the other failed jobs of its group.
+
+    Attributes:
+        job_bundle_size: The number of jobs in a bundle, 1 to disable
+        job_bundle_forks: How many jobs of a bundle to run at the same time
+    """
+
+    job_bundle_size: int = 1
+    job_bundle_forks: int = 1
+
+    def _init_bundler(self, proc: Proc) -> None:
+        """Initialize the bundling with the options of the proc
+
+        Args:
+            proc: The proc
+        """
+        self.job_bundle_size = int(getattr(proc, "job_bundle_size", None) or 1)
+        self.job_bundle_forks = max(
+            int(getattr(proc, "job_bundle_forks", None) or 1),
+            1,
+        )
+        self._bundle_pending: Dict[int, List[Job]] = {}
+        self._bundle_timer: asyncio.TimerHandle | None = None
+        self._bundle_tasks: Set[asyncio.Future] = set()
+        # The other jobs of the bundles by the indexes of the first jobs,
+        # until the first jobs are submitted
+        self._bundles: Dict[int, List[Job]] = {}
+        # The scripts written for the bundled jobs, the bundle script for the
+        # first jobs, and the wrapped scripts for the others
+        self._bundle_scripts: Dict[int, SpecPath] = {}
+        # The indexes of the bundled jobs, except the first ones
+        self._bundled: Set[int] = set()
+
+    def in_bundle(self, job: Job) -> bool:
+        """Check if the job is run by the bundle of another job
+
+        Args:
+            job: The job
+
+        Returns:
+            True if the job is bundled but not the first job of the bundle
+        """
+        return self.job_bundle_size > 1 and job.index in self._bundled
+
+    async def wrapped_job_script(self, job: Job) -> SpecPath:
+        script = (
+            self._bundle_scripts.get(job.index)
+            if self.job_bundle_size > 1
+            else None
+        )
+        if script is not None:
+            return script
+        return await super().wrapped_job_script(job)  # type: ignore[misc]
+
+    async def submit_job_and_update_status(self, job: Job) -> None:
+        """Collect the job to submit in a bundle, or submit it directly if
+        `job_bundle_size` is not larger than 1
+
+        Args:
+            job: The job
+        """
+        if self.job_bundle_size <= 1:
+            await super().submit_job_and_update_status(job)  # type: ignore[misc]
+            return
+
+        key = job.index // self.job_bundle_size
+        group = self._bundle_pending.setdefault(key, [])
+        group.append(job)
+        if len(group) >= self.job_bundle_size:
+            self._submit_bundle(self._bundle_pending.pop(key))
+        elif self._bundle_timer is None:
+            self._bundle_timer = asyncio.get_running_loop().call_later(
+                JOB_BUNDLE_WAIT,
+                self._flush_bundles,
+            )
+
+    def _flush_bundles(self) -> None:
+        """Submit all the collected bundles"""
+        if self._bundle_timer is not None:
+            self._bundle_timer.cancel()
+            self._bundle_timer = None
+
+        groups, self._bundle_pending = self._bundle_pending, {}
+        for group in groups.values():
+            self._submit_bundle(group)
 
-class SchedulerPostInit:
+    def _submit_bundle(self, jobs: List[Job]) -> None:
+        """Start submitting the jobs as a bundle
+
+        Args:
+            jobs: The jobs
+        """
+        task = asyncio.ensure_future(
+            self._submit_bundle_jobs(sorted(jobs, key=lambda job: job.index))
+        )
+        self._bundle_tasks.add(task)
+        task.add_done_callback(self._bundle_tasks.discard)
+
+    async def _submit_bundle_jobs(self, jobs: List[Job]) -> None:
+        """Submit the jobs as a bundle
+
+        Args:
+            jobs: The jobs, sorted by their indexes
+        """
+        leader, *others = jobs
+        members = [leader]
+        for job in others:
+            # The steps before submission, done by the scheduler for the
+            # first job
+            if await self.job_is_submitted_or_running(job):  # type: ignore
+                logger.warning(
+                    "/Job-%s Skip submitting, already submitted or running.",
+                    job.index,
+                )
+                continue
+
+            try:
+                if await xqute_plugin.hooks.on_job_submitting(self, job) is False:
+                    logger.info("/Job-%s submission cancelled by hook.", job.index)
+                    continue
+
+                await job.clean()
+            except Exception as exc:
+                await _job_submission_failed(self, job, exc)
+                continue
+
+            members.append(job)
+
+        for job in members:
+            self._bundled.discard(job.index)
+            self._bundle_scripts.pop(job.index, None)
+
+        if len(members) > 1:
+            try:
+                self._bundled.update(job.index for job in members[1:])
+                for job in members:
+                    self._bundle_scripts[job.index] = (
+                        await self.wrapped_job_script(job)
+                    )
+                script = leader.metadir / f"job.bundle.{self.name}"  # type: ignore
+                await script.a_write_text(self.bundle_script(members))
+            except Exception as exc:
+                for job in members:
+                    self._bundled.discard(job.index)
+                    self._bundle_scripts.pop(job.index, None)
+                    await _job_submission_failed(self, job, exc)
+                return
+
+            self._bundle_scripts[leader.index] = script
+            self._bundles[leader.index] = members[1:]
+
+        if await super().submit_job_and_update_status(leader):  # type: ignore
+            # Collected for an array job, see ArrayJobSubmitter
+            return
+
+        # The first job is not submitted, i.e. skipped or cancelled by a
+        # hook, submit the others on their own
+        for job in self._bundles.pop(leader.index, ()):
+            self._bundled.discard(job.index)
+            self._bundle_scripts.pop(job.index, None)
+            await super().submit_job_and_update_status(job)  # type: ignore
+
+    def bundle_script(self, jobs: List[Job]) -> str:
+        """The script to run the wrapped scripts of the jobs in a bundle
+
+        The script is run by bash, whatever the wrapper language of the
+        scheduler is, with the directives of the scheduler for the first job
+        (i.e. `#SBATCH` lines). Each wrapped script is run with the
+        `XQUTE_JOB_*` environment variables of its own job.
+
+        Args:
+            jobs: The jobs in the bundle
+
+        Returns:
+            The script
+        """
+        shebang = self.jobcmd_shebang(jobs[0])  # type: ignore[attr-defined]
+        lines = ["#!/usr/bin/env bash"]
+        lines.extend(line for line in shebang.splitlines()[1:] if line)
+        lines.append(
+            "throttle() { while (( $(jobs -pr | wc -l) >= "
+            f"{self.job_bundle_forks} )); do wait -n; done; }}"
+        )
+        wrapper_lang = shlex.join(_wrapper_lang())
+        for job in jobs:
+            envs = " ".join(
+                f"{key}={shlex.quote(str(val))}" for key, val in job.envs.items()
+            )
+            script = shlex.quote(str(self._bundle_scripts[job.index].mounted))
+            lines.append("throttle")
+            lines.append(f"{envs} {wrapper_lang} {script} &".lstrip())
+        lines.append("wait")
+        return "\n".join(lines) + "\n"
+
+    async def transition_job_status(
+        self,
+        job: Job,
+        new_status: int,
+        *args,
+        **kwargs,
+    ) -> None:
+        others = (
+            self._bundles.pop(job.index, None)
+            if self.job_bundle_size > 1
+            and new_status in (JobStatus.SUBMITTED, JobStatus.FAILED)
+            else None
+        )
+        await super().transition_job_status(  # type: ignore[misc]
+            job,
+            new_status,
+            *args,
+            **kwargs,
+        )
+        if not others:
+            return
+
+        if new_status == JobStatus.SUBMITTED:
+            jid = await job.get_jid()
+            for other in others:
+                await other.set_jid(jid)
+                # The status files are written by the jobs in the bundle
+                await self.transition_job_status(
+                    other,
+                    JobStatus.SUBMITTED,
+                    flush=False,
+                )
+            return
+
+        # The bundle failed to submit
+        error = await job.stderr_file.a_read_text()
+        for other in others:
+            self._bundled.discard(other.index)
+            self._bundle_scripts.pop(other.index, None)
+            await other.stderr_file.a_write_text(error)
+            await self.transition_job_status(other, JobStatus.FAILED, rc="-2")
+
+    async def job_fails_before_running(self, job: Job) -> bool:
+        if await super().job_fails_before_running(job):  # type: ignore[misc]
+            return True
+        # A job in a bundle never runs if the bundle is gone before it
+        # writes its status file
+        return (
+            self.in_bundle(job)
+            and not await self.job_is_running(job)  # type: ignore
+            and not await job.status_file.a_is_file()
+        )
+
+
+class SchedulerPostInit(JobBundler):
     """Provides post init function for all schedulers"""
 
     job_class = Job
@@ -48,23 +344,873 @@ class SchedulerPostInit:
         self._post_init_called = True
 
         proc.workdir = self.workdir = self.workdir / proc.name  # type: ignore
+        self._init_bundler(proc)
+
+    def shutdown(self) -> None:
+        """Release the resources of the scheduler when the jobs of the proc
+        are done"""
+
+
+class ArrayJobSubmitter(ABC):
+    """Provides array job submission for the cluster schedulers
+
+    With scheduler option `array_jobs`, the jobs are not submitted one by
+    one. They are collected for `ARRAY_JOBS_WAIT` seconds (or until there
+    are `array_jobs` of them, `ARRAY_JOBS_MAX_TASKS` for `True`), and
+    submitted as the tasks of one array job. The task runs the wrapped script
+    of its job, so the status, rc, stdout and stderr are still written to
+    the metadir of each job. The jid of a job is the one of its task, i.e.
+    `<array id>_<task id>` for slurm, so that the jobs can still be polled,
+    killed and retried (resubmitted in a new array job) on their own.
+
+    Attributes:
+        array_task_env: The environment variable with the task id
+        array_first_task: The id of the first task of an array job
+    """
+
+    array_task_env: str
+    array_first_task: int = 0
+
+    def __init__(self, *args, **kwargs):
+        array_jobs = kwargs.pop("array_jobs", False)
+        self.array_jobs = (
+            ARRAY_JOBS_MAX_TASKS if array_jobs is True else int(array_jobs or 0)
+        )
+        self._array_pending: List = []
+        self._array_timer: asyncio.TimerHandle | None = None
+        self._array_tasks: Set[asyncio.Future] = set()
+        self._array_count = 0
+        # The wrapped scripts written for the jobs to submit, so that they
+        # are not written again (i.e. for logging) while the tasks run them
+        self._array_scripts: Dict[int, SpecPath] = {}
+        super().__init__(*args, **kwargs)
+
+    async def wrapped_job_script(self, job: Job) -> SpecPath:
+        script = self._array_scripts.get(job.index)
+        if script is not None:
+            return script
+        return await super().wrapped_job_script(job)  # type: ignore[misc]
+
+    async def submit_job_and_update_status(self, job: Job) -> bool:
+        """Collect the job to submit as a task of an array job, or submit it
+        directly if `array_jobs` is not enabled
+
+        Args:
+            job: The job
+
+        Returns:
+            True if the job is collected for an array job
+        """
+        if not self.array_jobs:
+            await super().submit_job_and_update_status(job)  # type: ignore[misc]
+            return False
+
+        if await self.job_is_submitted_or_running(job):  # type: ignore[attr-defined]
+            logger.warning(
+                "/Job-%s Skip submitting, already submitted or running.",
+                job.index,
+            )
+            return False
+
+        try:
+            if await xqute_plugin.hooks.on_job_submitting(self, job) is False:
+                logger.info("/Job-%s submission cancelled by hook.", job.index)
+                return False
+
+            await job.clean()
+            self._array_scripts.pop(job.index, None)
+            self._array_scripts[job.index] = await self.wrapped_job_script(job)
+        except Exception as exc:
+            await _job_submission_failed(self, job, exc)
+            return False
+
+        self._array_pending.append(job)
+        if len(self._array_pending) >= self.array_jobs:
+            self._flush_array_jobs()
+        elif self._array_timer is None:
+            self._array_timer = asyncio.get_running_loop().call_later(
+                ARRAY_JOBS_WAIT,
+                self._flush_array_jobs,
+            )
+        return True
+
+    def _flush_array_jobs(self) -> None:
+        """Submit the collected jobs as an array job"""
+        if self._array_timer is not None:
+            self._array_timer.cancel()
+            self._array_timer = None
+
+        jobs, self._array_pending = self._array_pending, []
+        if jobs:
+            task = asyncio.ensure_future(self._submit_array_jobs(jobs))
+            self._array_tasks.add(task)
+            task.add_done_callback(self._array_tasks.discard)
+
+    async def _submit_array_jobs(self, jobs: List[Job]) -> None:
+        """Submit the jobs as the tasks of an array job, and update their
+        status
+
+        Args:
+            jobs: The jobs
+        """
+        self._array_count += 1
+        script = self.workdir / (  # type: ignore[attr-defined]
+            f"proc.array.{self._array_count}.{self.name}"  # type: ignore
+        )
+        wrapped = "\n".join(
+            f"    {shlex.quote(str(self._array_scripts[job.index].mounted))}"
+            for job in jobs
+        )
+        # bash for the arrays, with the directives of the scheduler
+        shebang = self.jobcmd_shebang(jobs[0])  # type: ignore[attr-defined]
+        directives = "".join(
+            f"{line}\n" for line in shebang.splitlines()[1:] if line
+        )
+        try:
+            await script.a_write_text(
+                "#!/usr/bin/env bash\n"
+                f"{directives}"
+                f"wrapped_scripts=(\n{wrapped}\n)\n"
+                f"exec {shlex.join(_wrapper_lang())} "
+                f'"${{wrapped_scripts[$(( ${self.array_task_env} - '
+                f'{self.array_first_task} ))]}}"\n'
+            )
+            array_id = await self.submit_array(script, len(jobs))
+        except Exception as exc:
+            for job in jobs:
+                await _job_submission_failed(self, job, exc)
+            return
+
+        logger.info(
+            "/Sched-%s Array job %s submitted with %s jobs",
+            self.name,  # type: ignore[attr-defined]
+            array_id,
+            len(jobs),
+        )
+        for task, job in enumerate(jobs, self.array_first_task):
+            await job.set_jid(self.array_task_jid(array_id, task))
+            # Don't write the status file, the task may be running already
+            await self.transition_job_status(  # type: ignore[attr-defined]
+                job,
+                JobStatus.SUBMITTED,
+                flush=False,
+            )
+
+    def array_job_name(self) -> str:
+        """The name of the array jobs"""
+        sha = hashlib.sha256(
+            str(self.workdir).encode()  # type: ignore[attr-defined]
+        ).hexdigest()[:8]
+        return f"{self.jobname_prefix}-{sha}-array"  # type: ignore[attr-defined]
+
+    @abstractmethod
+    async def submit_array(self, script: SpecPath, ntasks: int) -> str:
+        """Submit an array job
+
+        Args:
+            script: The script of the array job
+            ntasks: The number of tasks
+
+        Returns:
+            The id of the array job
+        """
+
+    @abstractmethod
+    def array_task_jid(self, array_id: str, task: int) -> str:
+        """The jid of a task of an array job
+
+        Args:
+            array_id: The id of the array job
+            task: The id of the task
+
+        Returns:
+            The jid of the task
+        """
+
+
+class BulkStatusPolling(ABC):
+    """Provides bulk status polling for the cluster schedulers
+
+    The jobs are watched by a `StatusPoller` once they are submitted, so
+    that the statuses of all running jobs of the process are queried from
+    the scheduler with one command in each polling iteration, instead of
+    one for each job.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status_poller = StatusPoller(self.query_statuses)
+        # The keys of the watched jobs by their indexes
+        self._watched_keys: Dict[int, str] = {}
+
+    def status_key(self, jid: str) -> str:
+        """The key of a job in the results of `query_statuses`
+
+        Args:
+            jid: The jid of the job
+
+        Returns:
+            The key
+        """
+        return jid
+
+    async def transition_job_status(
+        self,
+        job: Job,
+        new_status: int,
+        *args,
+        **kwargs,
+    ) -> None:
+        if new_status in (
+            JobStatus.SUBMITTED,
+            JobStatus.FINISHED,
+            JobStatus.FAILED,
+        ) and job.index in self._watched_keys:
+            self.status_poller.unwatch(self._watched_keys.pop(job.index))
+        if new_status == JobStatus.SUBMITTED:
+            key = self.status_key(str(await job.get_jid()).strip())
+            self._watched_keys[job.index] = key
+            self.status_poller.watch(key)
+        await super().transition_job_status(  # type: ignore[misc]
+            job,
+            new_status,
+            *args,
+            **kwargs,
+        )
+
+    @abstractmethod
+    async def query_statuses(self, keys: List[str]) -> Dict[str, str]:
+        """Query the statuses of the jobs from the scheduler
+
+        Args:
+            keys: The keys of the jobs, see `status_key()`
+
+        Returns:
+            The statuses of the jobs that are in the scheduler
+        """
+
+
+class NoSleepInBundle:
+    """Removes the waits (`sleep 1`) from the wrapped scripts of the jobs in
+    a bundle for the local and ssh schedulers
+
+    The waits give xqute time to update the status of a job, but the
+    statuses of the jobs in a bundle (except the first one) are not written
+    by xqute, see `JobBundler`. The first wait is kept if the jobs run in
+    parallel, so that the jobs starting with the first one don't finish
+    before their jids are written.
+    """
+
+    _in_bundle = False
+
+    def wrap_job_script(self, job: Job) -> str:
+        self._in_bundle = self.in_bundle(job)  # type: ignore[attr-defined]
+        try:
+            return super().wrap_job_script(job)  # type: ignore[misc]
+        finally:
+            self._in_bundle = False
+
+    @property
+    def jobcmd_wrapper_init(self) -> str:
+        if self._in_bundle and self.job_bundle_forks == 1:  # type: ignore
+            return Scheduler.jobcmd_wrapper_init.fget(self)  # type: ignore
+        return super().jobcmd_wrapper_init  # type: ignore[misc]
+
+    def jobcmd_prep(self, job: Job) -> str:
+        if self._in_bundle:
+            return Scheduler.jobcmd_prep(self, job)  # type: ignore[arg-type]
+        return super().jobcmd_prep(job)  # type: ignore[misc]
+
+
+def _wrapper_lang() -> List[str]:
+    """The command to run the wrapped job scripts"""
+    return (
+        list(JOBCMD_WRAPPER_LANG)
+        if isinstance(JOBCMD_WRAPPER_LANG, (tuple, list))
+        else [JOBCMD_WRAPPER_LANG]
+    )
+
+
+async def _job_submission_failed(scheduler: Scheduler, job: Job, exc: Exception):
+    """Mark the job as failed when it can't be submitted
+
+    Args:
+        scheduler: The scheduler
+        job: The job
+        exc: The exception
+    """
+    exception = RuntimeError(f"Failed to submit job: {exc}")
+    exception.__traceback__ = exc.__traceback__
+    await job.stderr_file.a_write_text(
+        "".join(
+            format_exception(
+                type(exception),
+                exception,
+                exception.__traceback__,
+            )
+        )
+    )
+    await scheduler.transition_job_status(job, JobStatus.FAILED, rc="-2")
 
 
-class LocalScheduler(SchedulerPostInit, XquteLocalScheduler):  # type: ignore[misc]
+def _sge_task_listed(task: int, tasks: str) -> bool:
+    """Check if a task of an array job is in the tasks listed by qstat
+
+    Args:
+        task: The id of the task
+        tasks: The tasks listed by qstat, e.g. `3`, `2-4:1` or `1,5-9:2`
+
+    Returns:
+        True if the task is listed
+    """
+    for part in tasks.split(","):
+        span, _, step = part.partition(":")
+        first, _, last = span.partition("-")
+        if not first.strip().isdigit():
+            continue
+        start = int(first)
+        end = int(last) if last.strip().isdigit() else start
+        if start <= task <= end and (task - start) % int(step or 1) == 0:
+            return True
+    return False
+
+
+async def _run_command(*cmd: str) -> Tuple[int, str, str]:
+    """Run a command of the scheduler
+
+    Args:
+        *cmd: The command
+
+    Returns:
+        The return code, stdout and stderr of the command
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    return proc.returncode, stdout.decode(), stderr.decode()  # type: ignore
+
+
+async def _run_submission(*cmd: str) -> str:
+    """Run a command to submit an array job
+
+    Args:
+        *cmd: The command
+
+    Returns:
+        The stdout of the command
+    """
+    rc, stdout, stderr = await _run_command(*cmd)
+    if rc != 0:
+        raise RuntimeError(f"Can't submit array job: {stderr.strip()}")
+    return stdout
+
+
+class PoolJobRunner(ABC):
+    """Run the jobs in a pool of the main process, instead of submitting
+    them to the scheduler
+
+    The subclasses set `pool` (with a `shutdown()` method), and implement
+    `runs_in_pool()` and `run_in_pool()`, and `kill_in_pool()` if the jobs
+    can be stopped. The jobs not run in the pool are submitted by the next
+    scheduler in the MRO.
+
+    A job in the pool gets a jid of `<scheduler>.<pid>.<n>`, and starts when
+    it is SUBMITTED. The status, rc, stdout and stderr files of the job are
+    written as the wrapper does, so that the job is polled, retried and
+    cached as usual.
+    """
+
+    pool: Any
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The jids, the events to start the jobs and the tasks running them,
+        # for the jobs run in the pool, by their indexes
+        self._pool_jobs: Dict[int, Tuple[str, asyncio.Event, asyncio.Future]] = {}
+        self._pool_killed: Set[int] = set()
+        self._pool_count = 0
+
+    @abstractmethod
+    def runs_in_pool(self, job: Job) -> bool:
+        """Check if the job runs in the pool
+
+        Args:
+            job: The job
+
+        Returns:
+            True if the job runs in the pool, otherwise False
+        """
+
+    @abstractmethod
+    async def run_in_pool(self, job: Job) -> int:
+        """Run the job in the pool
+
+        Args:
+            job: The job
+
+        Returns:
+            The return code of the job
+        """
+
+    def kill_in_pool(self, job: Job) -> bool:
+        """Stop the job running in the pool
+
+        Args:
+            job: The job
+
+        Returns:
+            True if the job is running in the pool, False if it is not
+            started yet, so that it is cancelled
+        """
+        return False
+
+    async def submit_job(self, job: Job) -> int | str:  # type: ignore[override]
+        if not self.runs_in_pool(job):
+            return await super().submit_job(job)  # type: ignore[misc]
+
+        self._pool_count += 1
+        jid = f"{self.name}.{os.getpid()}.{self._pool_count}"  # type: ignore
+        # The job starts when it is SUBMITTED, so that the status written
+        # when it runs is not overwritten
+        ready = asyncio.Event()
+        task = asyncio.ensure_future(self._run_in_pool(job, ready))
+        self._pool_jobs[job.index] = (jid, ready, task)
+        self._pool_killed.discard(job.index)
+        return jid
+
+    async def _run_in_pool(self, job: Job, ready: asyncio.Event) -> None:
+        """Run the job in the pool, and write the status, rc, stdout and
+        stderr files of the job
+
+        Args:
+            job: The job
+            ready: The event set when the job is SUBMITTED
+        """
+        await ready.wait()
+        try:
+            await job.status_file.a_write_text(str(JobStatus.RUNNING))
+            rc = await self.run_in_pool(job)
+        except Exception as exc:
+            if job.index in self._pool_killed:
+                return
+            await job.stderr_file.a_write_text(
+                "".join(format_exception(type(exc), exc, exc.__traceback__))
+            )
+            rc = 1
+
+        if job.index in self._pool_killed:
+            return
+
+        await job.rc_file.a_write_text(str(rc))
+        try:
+            await job.jid_file.a_rename(job.metadir / f"{job.jid_file.name}.used")
+        except FileNotFoundError:  # pragma: no cover
+            pass
+        await job.status_file.a_write_text(
+            str(JobStatus.FINISHED if rc == 0 else JobStatus.FAILED)
+        )
+
+    def _pool_entry(
+        self,
+        job: Job,
+        jid: str | None,
+    ) -> Tuple[str, asyncio.Event, asyncio.Future] | None:
+        """Get the entry of the job run in the pool with the jid"""
+        entry = self._pool_jobs.get(job.index)
+        if entry is None or entry[0] != jid:
+            return None
+        return entry
+
+    async def transition_job_status(
+        self,
+        job: Job,
+        new_status: int,
+        *args,
+        **kwargs,
+    ) -> None:
+        await super().transition_job_status(  # type: ignore[misc]
+            job,
+            new_status,
+            *args,
+            **kwargs,
+        )
+        if new_status == JobStatus.SUBMITTED:
+            entry = self._pool_entry(job, str(await job.get_jid()).strip())
+            if entry is not None:
+                entry[1].set()
+
+    async def kill_job(self, job: Job):
+        entry = self._pool_entry(job, str(await job.get_jid()).strip())
+        if entry is None:
+            await super().kill_job(job)  # type: ignore[misc]
+            return
+
+        self._pool_killed.add(job.index)
+        if not self.kill_in_pool(job):
+            entry[2].cancel()
+
+    async def job_is_running(self, job: Job) -> bool:
+        try:
+            jid = (await job.jid_file.a_read_text()).strip()
+        except FileNotFoundError:
+            jid = None
+        entry = self._pool_entry(job, jid)
+        if entry is None:
+            return await super().job_is_running(job)  # type: ignore[misc]
+        return not entry[2].done()
+
+    def shutdown(self) -> None:
+        for _, _, task in self._pool_jobs.values():
+            task.cancel()
+        self._pool_jobs = {}
+        self.pool.shutdown()
+        super().shutdown()  # type: ignore[misc]
+
+
+class LocalScheduler(  # type: ignore[misc]
+    SchedulerPostInit,
+    NoSleepInBundle,
+    XquteLocalScheduler,
+):
     """Local scheduler"""
 
 
-class SgeScheduler(SchedulerPostInit, XquteSgeScheduler):  # type: ignore[misc]
-    """SGE scheduler"""
+class PyworkerScheduler(PoolJobRunner, LocalScheduler):  # type: ignore[misc]
+    """Local scheduler that runs the python jobs in warm worker processes
+
+    The jobs with `lang` of a python interpreter (i.e. `python`, `python3`
+    or `/path/to/python3.11`) are run by `PythonWorkerPool` without the
+    wrapper script, so that the modules are imported once by a worker,
+    instead of once for each job. The status, rc, stdout and stderr files of
+    the jobs are written as the wrapper does. The other jobs, and the jobs
+    with code from the plugins (`on_jobcmd_*` hooks), with `prescript` or
+    `postscript`, or in bundles (`job_bundle_size`), run the same way as
+    they do with the local scheduler.
+
+    Args:
+        workers: The number of worker processes, `forks` by default
+        preload: The modules to import when a worker starts
+        max_jobs_per_worker: How many jobs a worker runs before it is
+            replaced, 0 to never replace the workers
+    """
+
+    name = "pyworker"
+
+    def __init__(
+        self,
+        *args,
+        workers: int | None = None,
+        preload: str | List[str] = (),  # type: ignore[assignment]
+        max_jobs_per_worker: int = 100,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.pool = PythonWorkerPool(
+            int(workers or self.forks),
+            [preload] if isinstance(preload, str) else preload,
+            int(max_jobs_per_worker or 0),
+            self.timeout,
+        )
+
+    def runs_in_pool(self, job: Job) -> bool:
+        return (
+            self.job_bundle_size <= 1
+            and len(job.cmd) == 2
+            and PYTHON_INTERPRETER.fullmatch(os.path.basename(str(job.cmd[0])))
+            is not None
+            and not self.prescript
+            and not self.postscript
+            and not isinstance(self.workdir.mounted, CloudPath)
+            and not any(
+                code
+                for hook in (
+                    xqute_plugin.hooks.on_jobcmd_init,
+                    xqute_plugin.hooks.on_jobcmd_prep,
+                    xqute_plugin.hooks.on_jobcmd_end,
+                )
+                for code in hook(self, job)
+            )
+        )
+
+    async def run_in_pool(self, job: Job) -> int:
+        return await self.pool.run(
+            job.index,
+            str(job.cmd[0]),
+            str(job.cmd[1]),
+            await job.stdout_file.mounted.get_fspath(),
+            await job.stderr_file.mounted.get_fspath(),
+            envs=job.envs,
+            cwd=self.cwd,
+        )
+
+    def kill_in_pool(self, job: Job) -> bool:
+        return self.pool.kill(job.index)
+
+
+class CallableScheduler(PoolJobRunner, LocalScheduler):  # type: ignore[misc]
+    """Scheduler for the processes with a python function as `script`
+
+    The function is called with the input data, the output data of a job
+    and the envs of the process by `CallablePool`, without any script or
+    shell. The status, rc, stdout and stderr files of the jobs are written
+    as the wrapper does. It is used for such processes regardless of the
+    `scheduler` option, and the jobs are never bundled.
+
+    Args:
+        executor: `process` to call the functions in worker processes, or
+            `thread` to call them in the threads of the main process, i.e.
+            for the IO-bound jobs
+        workers: The number of workers, `forks` by default
+    """
+
+    name = "callable"
+
+    def __init__(
+        self,
+        *args,
+        executor: str = "process",
+        workers: int | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.pool = CallablePool(int(workers or self.forks), executor)
+        self.func: Callable | None = None
+        self.proc_envs: Mapping[str, Any] = {}
+
+    async def init_proc(self, proc: Proc) -> None:
+        await super().init_proc(proc)
+        if isinstance(self.workdir.mounted, CloudPath):
+            raise ValueError(
+                f"[{proc.name}] Python functions as scripts are not supported "
+                f"with cloud working directories: {self.workdir}"
+            )
+
+        self.func = proc.script  # type: ignore[assignment]
+        self.proc_envs = proc.envs
+        if self.pool.executor == "process":
+            try:
+                pickle.dumps(self.func)
+            except Exception as exc:
+                proc.log(
+                    "warning",
+                    "Calling the script in threads, "
+                    "it can't be sent to the worker processes: %s",
+                    exc,
+                )
+                self.pool.executor = "thread"
+
+    def _init_bundler(self, proc: Proc) -> None:
+        super()._init_bundler(proc)
+        self.job_bundle_size = 1
+
+    def runs_in_pool(self, job: Job) -> bool:
+        return True
+
+    async def run_in_pool(self, job: Job) -> int:
+        return await self.pool.run(
+            self.func,  # type: ignore[arg-type]
+            Diot(job.template_data["in"]),
+            Diot(job.template_data["out"]),
+            self.proc_envs,
+            await job.stdout_file.mounted.get_fspath(),
+            await job.stderr_file.mounted.get_fspath(),
+        )
+
+
+class SgeScheduler(  # type: ignore[misc]
+    SchedulerPostInit,
+    ArrayJobSubmitter,
+    BulkStatusPolling,
+    XquteSgeScheduler,
+):
+    """SGE scheduler
+
+    Args:
+        array_jobs: Submit the jobs as array jobs (`qsub -t`), True or the
+            most jobs in an array job. See `ArrayJobSubmitter`.
+    """
 
+    array_task_env = "SGE_TASK_ID"
+    array_first_task = 1
 
-class SlurmScheduler(SchedulerPostInit, XquteSlurmScheduler):  # type: ignore[misc]
-    """Slurm scheduler"""
+    async def submit_array(self, script: SpecPath, ntasks: int) -> str:
+        # The command line options override the ones in the script
+        stdout = await _run_submission(
+            self.qsub,
+            "-t",
+            f"1-{ntasks}",
+            "-N",
+            self.array_job_name(),
+            str(script.mounted),
+        )
+        # Your job-array 613815.1-3:1 ("name") has been submitted
+        return stdout.split()[2].split(".")[0]
+
+    def array_task_jid(self, array_id: str, task: int) -> str:
+        return f"{array_id}.{task}"
+
+    async def kill_job(self, job: Job):
+        jid = str(await job.get_jid())
+        if "." not in jid:
+            await super().kill_job(job)
+            return
+
+        array_id, task = jid.split(".", 1)
+        proc = await asyncio.create_subprocess_exec(
+            self.qdel,
+            array_id,
+            "-t",
+            task,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        await proc.wait()
 
+    async def job_is_running(self, job: Job) -> bool:
+        try:
+            jid = (await job.jid_file.a_read_text()).strip()
+        except FileNotFoundError:
+            return False
 
-class SshScheduler(SchedulerPostInit, XquteSshScheduler):  # type: ignore[misc]
+        if not jid:
+            return False
+
+        return await self.status_poller.status(self.status_key(jid)) is not None
+
+    async def query_statuses(self, keys: List[str]) -> Dict[str, str]:
+        # all jobs of the user at once
+        rc, stdout, _ = await _run_command(self.qstat, "-xml")
+        if rc != 0:
+            return {}
+
+        # job number => [(tasks, state)], the tasks of array jobs are listed
+        # on their own when running, and as ranges (e.g. 2-4:1) when pending
+        listed: Dict[str, List[Tuple[str | None, str]]] = {}
+        for job in ElementTree.fromstring(stdout).iter("job_list"):
+            listed.setdefault(job.findtext("JB_job_number", ""), []).append(
+                (job.findtext("tasks"), job.findtext("state", ""))
+            )
+
+        statuses = {}
+        for key in keys:
+            # <job number>.<task id> for the tasks of array jobs
+            number, _, task = key.partition(".")
+            for tasks, state in listed.get(number, ()):
+                if not task or tasks is None or _sge_task_listed(int(task), tasks):
+                    statuses[key] = state
+                    break
+        return statuses
+
+
+class SlurmScheduler(  # type: ignore[misc]
+    SchedulerPostInit,
+    ArrayJobSubmitter,
+    BulkStatusPolling,
+    XquteSlurmScheduler,
+):
+    """Slurm scheduler
+
+    Args:
+        array_jobs: Submit the jobs as array jobs (`sbatch --array`), True or
+            the most jobs in an array job. See `ArrayJobSubmitter`.
+    """
+
+    array_task_env = "SLURM_ARRAY_TASK_ID"
+
+    async def submit_array(self, script: SpecPath, ntasks: int) -> str:
+        # The command line options override the ones in the script
+        stdout = await _run_submission(
+            self.sbatch,
+            f"--array=0-{ntasks - 1}",
+            f"--job-name={self.array_job_name()}",
+            str(script.mounted),
+        )
+        # Submitted batch job 65537
+        return stdout.strip().split()[-1]
+
+    def array_task_jid(self, array_id: str, task: int) -> str:
+        return f"{array_id}_{task}"
+
+    async def _get_job_status(self, job: Job) -> str:
+        try:
+            jid = (await job.jid_file.a_read_text()).strip()
+        except FileNotFoundError:
+            return "UNKNOWN"
+
+        if not jid:
+            return "UNKNOWN"
+
+        return (await self.status_poller.status(jid) or "UNKNOWN").upper()
+
+    async def query_statuses(self, keys: List[str]) -> Dict[str, str]:
+        statuses = {}
+        for i in range(0, len(keys), SQUEUE_MAX_JOBS):
+            rc, stdout, _ = await _run_command(
+                self.squeue,
+                "--noheader",
+                # one line for each task of the array jobs
+                "--array",
+                "--format=%i %t",
+                "--jobs",
+                ",".join(keys[i : i + SQUEUE_MAX_JOBS]),
+            )
+            # all jobs finished
+            if rc != 0:
+                continue
+            for line in stdout.splitlines():
+                if line.strip():
+                    jid, status = line.split()[:2]
+                    statuses[jid] = status
+        return statuses
+
+
+class SshScheduler(  # type: ignore[misc]
+    SchedulerPostInit,
+    NoSleepInBundle,
+    BulkStatusPolling,
+    XquteSshScheduler,
+):
     """SSH scheduler"""
 
+    async def job_is_running(self, job: Job) -> bool:
+        try:
+            jid = (await job.jid_file.a_read_text()).strip()
+        except FileNotFoundError:
+            return False
+
+        # Can be the jid file by a different scheduler from previous runs
+        if jid.partition("@")[2] not in self.servers:
+            return False
+
+        return await self.status_poller.status(jid) is not None
+
+    async def query_statuses(self, keys: List[str]) -> Dict[str, str]:
+        pids: Dict[str, List[str]] = {}
+        for key in keys:
+            pid, _, server = key.partition("@")
+            if server in self.servers:
+                pids.setdefault(server, []).append(pid)
+
+        statuses = {}
+        for server, server_pids in pids.items():
+            try:
+                proc = await self.servers[server].create_proc(
+                    "ps",
+                    "-o",
+                    "pid=",
+                    "-p",
+                    ",".join(server_pids),
+                )
+                stdout, _ = await proc.communicate()
+            except Exception:  # pragma: no cover
+                continue
+            for pid in stdout.decode().split():
+                statuses[f"{pid}@{server}"] = "running"
+        return statuses
+
 
 class GbatchScheduler(SchedulerPostInit, XquteGbatchScheduler):  # type: ignore[misc]
     __doc__ = XquteGbatchScheduler.__doc__
@@ -148,6 +1294,20 @@ class ContainerScheduler(  # type: ignore[misc]
     __doc__ = XquteContainerScheduler.__doc__
     fs_shared = False  # Container scheduler does not share file system with the host
 
+    def _init_bundler(self, proc: Proc) -> None:
+        super()._init_bundler(proc)
+        if self.job_bundle_size > 1:
+            # The script is run by the entrypoint of the container, which may
+            # not be bash, and the container is started with the envs of the
+            # first job
+            proc.log(
+                "warning",
+                "Job bundling is not supported by the container scheduler, "
+                "ignoring job_bundle_size=%s",
+                self.job_bundle_size,
+            )
+            self.job_bundle_size = 1
+
     async def init_proc(self, proc: Proc):
         await super().init_proc(proc)
 
@@ -214,6 +1374,12 @@ def get_scheduler(scheduler: str | Type[Scheduler]) -> Type[Scheduler]:
     if scheduler == "local":
         return LocalScheduler
 
+    if scheduler == "pyworker":
+        return PyworkerScheduler
+
+    if scheduler == "callable":
+        return CallableScheduler
+
     if scheduler == "sge":
         return SgeScheduler
 
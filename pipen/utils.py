@@ -7,6 +7,8 @@
 # pyright: reportGeneralTypeIssues=false
 from __future__ import annotations
 
+import asyncio
+import os
 import re
 import sys
 import importlib
@@ -20,6 +22,7 @@ from itertools import groupby
 from operator import itemgetter
 from io import StringIO
 from os import get_terminal_size, environ
+from stat import S_ISDIR
 from collections import defaultdict
 from pathlib import Path
 from typing import (
@@ -495,6 +498,115 @@ def pipen_banner() -> RenderableType:
     return table
 
 
+# How many entries in a cloud directory to check simultaneously
+# when getting the last modification time
+GET_MTIME_CLOUD_CONCURRENCY = 32
+
+
+def _is_fake_symlink_local(path: str) -> bool:
+    """Check if a local file is a fake symlink created by `path_symlink_to()`
+
+    Args:
+        path: The path to the file, should be a regular file with size
+            between 8 and 4096 bytes
+
+    Returns:
+        True if the file is a fake symlink, otherwise False
+    """
+    try:
+        with open(path, "rb") as f:
+            prefix = f.read(14)
+    except Exception:  # pragma: no cover
+        return False
+    return prefix == b"pipen-symlink:" or prefix.startswith(b"symlink:")
+
+
+def _get_mtime_local(
+    path: str,
+    dir_depth: int,
+    deferred: List[Tuple[str, int]],
+) -> float:
+    """Get the modification time of a local path synchronously
+
+    The fake symlinks (pointing to cloud paths) that need to be followed
+    are put in `deferred` to be checked asynchronously.
+
+    Args:
+        path: The local path
+        dir_depth: The depth of the directory to check
+        deferred: The list to put the fake symlinks and their depths in
+
+    Returns:
+        The last modification time of path
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        # not exists or a dead link
+        return 0.0
+
+    if os.path.islink(path):
+        if dir_depth == 0 or not S_ISDIR(st.st_mode):
+            return os.lstat(path).st_mtime
+    elif not S_ISDIR(st.st_mode):
+        if (
+            dir_depth > 0
+            and 8 <= st.st_size <= 4096
+            and _is_fake_symlink_local(path)
+        ):
+            deferred.append((path, dir_depth))
+            return 0.0
+        return st.st_mtime
+    elif dir_depth == 0:
+        return st.st_mtime
+
+    return _get_mtime_local_dir(path, dir_depth, deferred)
+
+
+def _get_mtime_local_dir(
+    path: str,
+    dir_depth: int,
+    deferred: List[Tuple[str, int]],
+) -> float:
+    """Get the last modification time of the contents in a local directory
+
+    Uses `os.scandir()` so that the stats of the entries are cached.
+
+    Args:
+        path: The local directory
+        dir_depth: The depth of the directory to check, should be > 0
+        deferred: The list to put the fake symlinks and their depths in
+
+    Returns:
+        The last modification time of the contents in the directory
+    """
+    mtime = 0.0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_symlink():
+                entry_mtime = _get_mtime_local(entry.path, dir_depth - 1, deferred)
+            elif entry.is_dir(follow_symlinks=False):
+                entry_mtime = (
+                    entry.stat(follow_symlinks=False).st_mtime
+                    if dir_depth == 1
+                    else _get_mtime_local_dir(entry.path, dir_depth - 1, deferred)
+                )
+            else:
+                st = entry.stat(follow_symlinks=False)
+                if (
+                    dir_depth > 1
+                    and 8 <= st.st_size <= 4096
+                    and _is_fake_symlink_local(entry.path)
+                ):
+                    deferred.append((entry.path, dir_depth - 1))
+                    continue
+                entry_mtime = st.st_mtime
+
+            mtime = max(mtime, entry_mtime)
+
+    return mtime
+
+
 async def get_mtime(
     path: str | Path,  # type: ignore
     dir_depth: int = 1,
@@ -503,6 +615,9 @@ async def get_mtime(
     If path is a directory, try to get the last modification time of the
     contents in the directory at given dir_depth
 
+    Local paths are walked through in a thread with `os.scandir()`, and the
+    contents of cloud directories are checked concurrently.
+
     Args:
         dir_depth: The depth of the directory to check the
             last modification time
@@ -513,9 +628,31 @@ async def get_mtime(
         The last modification time of path
     """
     path = getattr(path, "path", path)
+    path: Path = PanPath(path)  # type: ignore[assignment,abstract]
+    if not isinstance(path, LocalPath):
+        return await _get_mtime_async(path, dir_depth)
 
+    deferred: List[Tuple[str, int]] = []
+    mtime = await asyncio.to_thread(_get_mtime_local, str(path), dir_depth, deferred)
+    for fake_link, depth in deferred:
+        mtime = max(mtime, await _get_mtime_async(PanPath(fake_link), depth))
+
+    return mtime
+
+
+async def _get_mtime_async(path: Path, dir_depth: int) -> float:
+    """Get the modification time of a path asynchronously
+
+    This is used for the cloud paths and the fake symlinks.
+
+    Args:
+        path: The path
+        dir_depth: The depth of the directory to check
+
+    Returns:
+        The last modification time of path
+    """
     mtime = 0.0
-    path: Path = PanPath(path)  # type: ignore[assignment,abstract]
     if not await path.a_exists():
         return mtime
 
@@ -525,10 +662,7 @@ async def get_mtime(
             out = (await path.a_stat()).st_mtime
             return out.timestamp() if isinstance(out, datetime) else out
 
-        async for file in path.a_iterdir():
-            mtime = max(mtime, await get_mtime(file, dir_depth - 1))
-
-        return mtime
+        return await _get_mtime_of_contents(path, dir_depth)
 
     # It is a real symlink
     if isinstance(path, LocalPath) and await path.a_is_symlink():
@@ -536,10 +670,7 @@ async def get_mtime(
             out = (await path.a_stat(follow_symlinks=False)).st_mtime
             return out.timestamp() if isinstance(out, datetime) else out
 
-        async for file in path.a_iterdir():
-            mtime = max(mtime, await get_mtime(file, dir_depth - 1))
-
-        return mtime
+        return await _get_mtime_of_contents(path, dir_depth)
 
     # Fake symlink
     dest = (
@@ -552,8 +683,32 @@ async def get_mtime(
         out = (await path.a_stat(follow_symlinks=False)).st_mtime
         return out.timestamp() if isinstance(out, datetime) else out
 
-    async for file in dpath.a_iterdir():
-        mtime = max(mtime, await get_mtime(file, dir_depth - 1))
+    return await _get_mtime_of_contents(dpath, dir_depth)
+
+
+async def _get_mtime_of_contents(path: Path, dir_depth: int) -> float:
+    """Get the last modification time of the contents in a directory
+
+    The contents are checked concurrently, at most
+    `GET_MTIME_CLOUD_CONCURRENCY` at a time.
+
+    Args:
+        path: The directory
+        dir_depth: The depth of the directory to check
+
+    Returns:
+        The last modification time of the contents
+    """
+    mtime = 0.0
+    files = [file async for file in path.a_iterdir()]
+    for i in range(0, len(files), GET_MTIME_CLOUD_CONCURRENCY):
+        mtimes = await asyncio.gather(
+            *(
+                get_mtime(file, dir_depth - 1)
+                for file in files[i : i + GET_MTIME_CLOUD_CONCURRENCY]
+            )
+        )
+        mtime = max(mtime, *mtimes)
 
     return mtime
 
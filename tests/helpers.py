@@ -293,6 +293,33 @@ async def create_dead_link(path):
     await target.a_unlink()
 
 
+class FakeBucket:
+    """A local directory as a cloud bucket, to list the objects from
+
+    Use `list_objects` as a lister in `pipen._path_cache.OBJECT_LISTERS`
+    """
+
+    def __init__(self, root, page_size=1000):
+        self.root = PanPath(root)
+        self.page_size = page_size
+        self.list_calls = 0
+
+    async def list_objects(self, path):
+        prefix = f"{path.key}/" if path.key else ""
+        objects = []
+        for obj in sorted(self.root.rglob("*")):
+            key = str(obj.relative_to(self.root)) + ("/" if obj.is_dir() else "")
+            if key.startswith(prefix) and key != prefix:
+                stat = obj.stat()
+                size = 0 if obj.is_dir() else stat.st_size
+                objects.append((key, size, stat.st_mtime))
+
+        for i in range(0, max(len(objects), 1), self.page_size):
+            self.list_calls += 1
+            for obj in objects[i:i + self.page_size]:
+                yield obj
+
+
 # for load_pipeline tests
 pipeline = Pipen(
     name=f"simple_pipeline_{Pipen.PIPELINE_COUNT + 1}",
@@ -0,0 +1,149 @@
+"""Benchmarks, the larger ones are only run with PIPEN_BENCHMARK=1
+
+Run with `-s` to see the numbers.
+"""
+
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from pipen import Pipen, Proc
+from pipen._script_renderer import ScriptRenderer
+from pipen.template import TemplateLiquid
+
+BENCHMARK = bool(os.environ.get("PIPEN_BENCHMARK"))
+skip_unless_benchmark = pytest.mark.skipif(
+    not BENCHMARK,
+    reason="PIPEN_BENCHMARK not set",
+)
+
+SCRIPT = """
+{% for key, value in envs.items() %}
+export {{key | upper}}="{{value | replace: '_', '-'}}"
+{% endfor %}
+cat {{in.infile}} > {{out.outfile}}
+echo {{proc.name}} {{job.index}} >> {{out.outfile}}
+"""
+ENVS = {f"option_{i}": f"value_{i}" for i in range(100)}
+
+
+def _fake_proc():
+    return SimpleNamespace(
+        name="BenchmarkProc",
+        envs=ENVS,
+        template=TemplateLiquid,
+        template_opts={},
+        _script_source=SCRIPT,
+        script=TemplateLiquid(SCRIPT),
+        log=lambda *args, **kwargs: None,
+    )
+
+
+def _template_data(proc, index):
+    return {
+        "job": {"index": index},
+        "in": {"infile": f"/path/to/input/{index}.txt"},
+        "out": {"outfile": f"/path/to/output/{index}/out.txt"},
+        "proc": proc,
+        "envs": ENVS,
+    }
+
+
+async def _render(njobs, workers):
+    """Render the scripts of njobs like the jobs do in Job.prepare(), with 8
+    jobs prepared concurrently, and measure the longest time that the event
+    loop is blocked
+    """
+    proc = _fake_proc()
+    renderer = ScriptRenderer(proc, workers) if workers else None
+    blocked = 0.0
+    done = False
+
+    async def _ticker():
+        nonlocal blocked
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            blocked = max(blocked, now - last)
+            last = now
+
+    async def _render_batch(indexes):
+        out = []
+        for i in indexes:
+            data = _template_data(proc, i)
+            if renderer is None:
+                out.append(proc.script.render(data))
+            else:
+                out.append(await renderer.render(data))
+            # the other async operations of the job preparation
+            await asyncio.sleep(0)
+        return out
+
+    ticker = asyncio.ensure_future(_ticker())
+    start = time.perf_counter()
+    batches = await asyncio.gather(
+        *(_render_batch(range(b, njobs, 8)) for b in range(8))
+    )
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticker
+    if renderer is not None:
+        renderer.shutdown()
+
+    print(
+        f"\n{njobs} jobs, render_workers={workers}: "
+        f"{njobs / elapsed:.0f} jobs/s, event loop blocked for at most "
+        f"{blocked * 1000:.1f} ms"
+    )
+    return [script for batch in batches for script in batch]
+
+
+@pytest.mark.parametrize(
+    "njobs",
+    [10_000, pytest.param(100_000, marks=skip_unless_benchmark)],
+)
+async def test_benchmark_script_rendering(njobs):
+    inline = await _render(njobs, 0)
+    rendered = await _render(njobs, 4)
+    assert rendered == inline
+    assert "echo BenchmarkProc 9999 >>" in rendered[9999]
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize(
+    "nprocs",
+    [1_000, pytest.param(10_000, marks=skip_unless_benchmark)],
+)
+def test_benchmark_build_proc_relationships(nprocs):
+    """Build a layered DAG of nprocs processes, each of which requires two
+    processes in the previous layer"""
+    width = 100
+    procs = [Proc.from_proc(Proc, name=f"P{i}") for i in range(width)]
+    start = Proc.from_proc(Proc, name="Start")
+    for proc in procs:
+        proc.requires = start
+    for i in range(width, nprocs):
+        procs.append(
+            Proc.from_proc(
+                Proc,
+                name=f"P{i}",
+                requires=[procs[i - width], procs[i - width + 1 - (i % 2) * 2]],
+            )
+        )
+
+    pipeline = Pipen(name=f"benchmark_{nprocs}").set_starts(start)
+    begin = time.perf_counter()
+    pipeline.build_proc_relationships()
+    elapsed = time.perf_counter() - begin
+    print(f"\n{nprocs} processes: relationships built in {elapsed:.3f} s")
+
+    assert len(pipeline.procs) == nprocs + 1
+    position = {proc: i for i, proc in enumerate(pipeline.procs)}
+    assert all(
+        position[req] < position[proc]
+        for proc in pipeline.procs
+        for req in proc.requires or ()
+    )
@@ -6,8 +6,9 @@ from unittest.mock import MagicMock
 
 from panpath import PanPath
 from xqute.path import SpecPath, MountedPath, CloudPath
-from pipen import Proc
-from pipen.job import Job, _process_input_file_or_dir
+from pipen import Pipen, Proc
+from pipen.job import Job, _process_input_file_or_dir, _resolve_input_column
+from pipen._path_cache import PathCache
 from pipen.exceptions import (
     ProcInputTypeError,
     ProcOutputNameError,
@@ -19,6 +20,7 @@ from pipen.exceptions import (
 from .helpers import (  # noqa: F401
     BUCKET,
     ErrorProc,
+    FakeBucket,
     FileInputProc,
     FileInputProcToDiff,
     FileInputsProc,
@@ -279,6 +281,173 @@ def test_check_cached_infile_newer(caplog, pipen, infile):
     assert "Not cached (Input file is newer:" in caplog.text
 
 
+@pytest.mark.forked
+def test_shared_infile_mtime_fetched_once(pipen, infile, monkeypatch):
+    from pipen import _path_cache
+
+    fetched = []
+
+    async def get_mtime(path, dir_depth=1):
+        fetched.append(str(path))
+        return await orig_get_mtime(path, dir_depth)
+
+    orig_get_mtime = _path_cache.get_mtime
+    monkeypatch.setattr(_path_cache, "get_mtime", get_mtime)
+
+    proc = Proc.from_proc(
+        MixedInputProc,
+        input_data=[(i, infile) for i in range(4)],
+    )
+    pipen.set_starts(proc).run()
+    assert fetched.count(str(infile)) == 1
+
+
+@pytest.mark.forked
+async def test_path_cache_prefetch(tmp_path, monkeypatch):
+    from pipen._path_cache import OBJECT_LISTERS
+
+    bucket = FakeBucket(tmp_path, page_size=2)
+    monkeypatch.setitem(OBJECT_LISTERS, "gs", bucket.list_objects)
+    (tmp_path / "wd" / "proc" / "0" / "output").mkdir(parents=True)
+    (tmp_path / "wd" / "proc" / "0" / "job.signature.toml").write_text("ctime = 0")
+    bigfile = tmp_path / "wd" / "proc" / "0" / "output" / "big.txt"
+    bigfile.write_text("x" * 5000)
+
+    path_cache = PathCache()
+    workdir = PanPath("gs://fake-bucket/wd")
+    await path_cache.prefetch(workdir)
+    # 3 dirs and 2 files, 2 per page
+    assert bucket.list_calls == 3
+
+    assert await path_cache.is_file(workdir / "proc/0/job.signature.toml")
+    assert await path_cache.is_dir(workdir / "proc/0/output")
+    assert not await path_cache.exists(workdir / "proc/1")
+    assert not await path_cache.is_symlink(workdir / "proc/0/output/big.txt")
+    assert (
+        await path_cache.get_mtime(workdir / "proc/0/output/big.txt")
+        == bigfile.stat().st_mtime
+    )
+
+    async def a_exists(self):
+        return "fetched"
+
+    # written paths are not answered from the listing
+    monkeypatch.setattr(type(workdir), "a_exists", a_exists)
+    path_cache.invalidate(workdir / "proc/0/output")
+    assert await path_cache.exists(workdir / "proc/0/output/big.txt") == "fetched"
+    assert await path_cache.exists(workdir / "proc/0/job.signature.toml") is True
+
+
+@pytest.mark.forked
+def test_check_cached_infile_newer_content(caplog, pipen, infile):
+    class ProcInfileNewerContent(MixedInputProc):
+        input_data = [(1, infile)]
+        sigmode = "content"
+
+    pipen.set_starts(ProcInfileNewerContent).run()
+    assert (pipen.workdir / "hash.cache.json").is_file()
+
+    caplog.clear()
+    os.utime(infile, (time.time() + 10,) * 2)
+    pipen.set_starts(ProcInfileNewerContent).run()
+    assert "Content unchanged, though it is newer" in caplog.text
+    assert "Cached jobs:" in caplog.text
+
+    caplog.clear()
+    infile.write_text("changed")
+    os.utime(infile, (time.time() + 20,) * 2)
+    pipen.set_starts(ProcInfileNewerContent).run()
+    assert "Not cached (Input file is newer:" in caplog.text
+
+
+@pytest.mark.forked
+def test_early_cutoff(caplog, tmp_path):
+    class CutoffProc1(Proc):
+        input = "a"
+        input_data = [1]
+        output = "b:file:b.txt"
+        script = "echo {{in.a}} > {{out.b}}"
+        sigmode = "content"
+
+    class CutoffProc2(Proc):
+        requires = CutoffProc1
+        input = "b:file"
+        output = "c:file:c.txt"
+        script = "cat {{in.b}} > {{out.c}}"
+
+    def run_pipeline():
+        return Pipen(
+            name="cutoff_pipeline",
+            loglevel="debug",
+            workdir=tmp_path / "workdir",
+            outdir=tmp_path / "outdir",
+        ).set_starts(CutoffProc1).run()
+
+    assert run_pipeline()
+
+    # CutoffProc1 reruns but generates the same output
+    CutoffProc1.script = "# comment\necho {{in.a}} > {{out.b}}"
+    caplog.clear()
+    assert run_pipeline()
+    assert "Job script updated." in caplog.text
+    assert "Content unchanged, though it is newer" in caplog.text
+    assert caplog.text.count("Cached jobs:") == 1
+
+    # CutoffProc1 generates a different output
+    CutoffProc1.script = "echo 2 > {{out.b}}"
+    caplog.clear()
+    assert run_pipeline()
+    assert "Not cached (Input file is newer: b)" in caplog.text
+    assert "Cached jobs:" not in caplog.text
+
+
+@pytest.mark.forked
+def test_check_cached_sigstore_jsonl(caplog, pipen, infile):
+    class ProcSigstoreJsonl(MixedInputProc):
+        input_data = [(i, infile) for i in range(3)]
+        sigstore = "jsonl"
+
+    pipen.set_starts(ProcSigstoreJsonl).run()
+    workdir = pipen.workdir / "ProcSigstoreJsonl"
+    assert len((workdir / "proc.signatures.jsonl").read_text().splitlines()) == 3
+    assert not (workdir / "0" / "job.signature.toml").exists()
+
+    caplog.clear()
+    pipen.set_starts(ProcSigstoreJsonl).run()
+    assert "Signature file not found" not in caplog.text
+    assert "Cached jobs: 0-2" in caplog.text
+
+    caplog.clear()
+    os.utime(infile, (time.time() + 10,) * 2)
+    pipen.set_starts(ProcSigstoreJsonl).run()
+    assert "Not cached (Input file is newer: infile)" in caplog.text
+    # appended
+    assert len((workdir / "proc.signatures.jsonl").read_text().splitlines()) == 6
+
+
+@pytest.mark.forked
+def test_check_cached_job_key_input(caplog, pipen):
+    class ProcJobKeyInput(NormalProc):
+        input_data = [1, 2, 2]
+        job_key = "input"
+
+    pipen.set_starts(ProcJobKeyInput).run()
+    workdir = pipen.workdir / "ProcJobKeyInput"
+    keys = sorted(p.name for p in workdir.iterdir() if p.is_dir())
+    assert len(keys) == 3
+    assert "0" not in keys
+    # the duplicated rows
+    assert len([key for key in keys if key.endswith("-1")]) == 1
+
+    # insert a row at the top
+    ProcJobKeyInput.input_data = [0, 1, 2, 2]
+    caplog.clear()
+    pipen.set_starts(ProcJobKeyInput).run()
+    assert "Cached jobs: 1-3" in caplog.text
+    assert ProcJobKeyInput.output_data["output"].tolist() == ["0", "1", "2", "2"]
+    assert len([p for p in workdir.iterdir() if p.is_dir()]) == 4
+
+
 @pytest.mark.forked
 def test_check_cached_infile_none(caplog, pipen, infile):
     proc_infile_none = Proc.from_proc(MixedInputProc, input_data=[(1, None)])
@@ -546,6 +715,24 @@ def test_process_input_file_or_dir(inval, expected):
     assert out.spec == expected.spec
 
 
+def test_resolve_input_column():
+    out = _resolve_input_column("a", "file", ["/a", "/a", None, "/b"], "proc")
+    assert out[0] == SpecPath("/a").mounted
+    # processed once and shared
+    assert out[0] is out[1]
+    assert out[2] is None
+    assert out[3].spec == PanPath("/b")
+
+    out = _resolve_input_column("a", "files", ["/a", ["/a", "/b"]], "proc")
+    assert out[0] == [SpecPath("/a").mounted]
+    assert out[1][0] is out[0][0]
+
+    assert _resolve_input_column("a", "var", (1, None), "proc") == [1, None]
+
+    with pytest.raises(ProcInputTypeError, match="Expected an iterable"):
+        _resolve_input_column("a", "files", [1], "proc")
+
+
 async def test_prepare_export_dir_specpath(tmp_path):
     """prepare() uses _export_dir as-is when it is already a SpecPath
 
@@ -558,6 +745,7 @@ async def test_prepare_export_dir_specpath(tmp_path):
 
     job = Job(index=0, cmd=(), workdir=workdir)
     proc = MagicMock(
+        pipeline=MagicMock(path_cache=PathCache()),
         export=True,
         _export_dir=outdir,
         output_flatten=True,
@@ -568,3 +756,32 @@ async def test_prepare_export_dir_specpath(tmp_path):
 
     assert job.outdir is outdir
     assert await outdir.a_exists()
+
+
+@pytest.mark.forked
+def test_render_workers(pipen):
+    class RenderWorkersProc(Proc):
+        input = "a:var"
+        input_data = [1, 2, 3]
+        output = "b:var:{{in.a}}"
+        render_workers = 2
+        script = "echo {{proc.name}} {{in.a}} {{envs.x}}"
+        envs = {"x": "y"}
+
+    class RenderWorkersFallbackProc(RenderWorkersProc):
+        requires = RenderWorkersProc
+        input = "a:var"
+        script = "echo {{in.a | double}}"
+        # lambdas can't be sent to the workers
+        template_opts = {"filters": {"double": lambda x: int(x) * 2}}
+
+    assert pipen.set_starts(RenderWorkersProc).run()
+
+    workdir = pipen.workdir / "RenderWorkersProc"
+    for i in range(3):
+        assert (workdir / str(i) / "job.script").read_text() == (
+            f"echo RenderWorkersProc {i + 1} y"
+        )
+
+    workdir = pipen.workdir / "RenderWorkersFallbackProc"
+    assert (workdir / "2" / "job.script").read_text() == "echo 6"
@@ -1,8 +1,10 @@
+import asyncio
 import pytest
 from uuid import uuid4
 from panpath import PanPath
-from pipen import Proc, Pipen, run, async_run
+from pipen import Proc, Pipen, plugin, run, async_run
 from pipen.exceptions import (
+    ConfigurationError,
     ProcDependencyError,
     PipenSetDataError,
 )
@@ -11,6 +13,7 @@ from pipen.proc import PipenOrProcNameError
 from .helpers import (  # noqa: F401
     ErrorProc,
     NormalProc,
+    SleepingProc,
     SimpleProc,
     RelPathScriptProc,
     pipen,
@@ -170,6 +173,251 @@ def test_proc_order(pipen):
     assert pipen.procs == [proc1, proc3, proc2]
 
 
+@pytest.mark.forked
+def test_proc_forks(tmp_path):
+    events = []
+
+    class EventPlugin:
+        @plugin.impl
+        async def on_proc_start(proc):
+            events.append(("start", proc.name))
+
+        @plugin.impl
+        async def on_proc_done(proc, succeeded):
+            events.append(("done", proc.name))
+
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(SleepingProc, requires=proc1)
+    proc3 = Proc.from_proc(SleepingProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=[proc2, proc3])
+
+    pipeline = Pipen(
+        name="dag_pipeline",
+        proc_forks=2,
+        plugins=[EventPlugin],
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(proc1).run()
+    assert pipeline.procs[-1] is proc4
+    assert events[0] == ("start", "proc1")
+    assert events[1] == ("done", "proc1")
+    # proc2 and proc3 are running simultaneously
+    assert set(events[2:4]) == {("start", "proc2"), ("start", "proc3")}
+    assert set(events[4:6]) == {("done", "proc2"), ("done", "proc3")}
+    assert events[6:] == [("start", "proc4"), ("done", "proc4")]
+
+
+@pytest.mark.forked
+def test_proc_forks_error(tmp_path):
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(ErrorProc, requires=proc1)
+    proc3 = Proc.from_proc(SleepingProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=proc2)
+
+    pipeline = Pipen(
+        name="dag_pipeline_error",
+        proc_forks=4,
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    assert not pipeline.set_starts(proc1).run()
+    # proc3 is not affected by the failure of proc2
+    assert proc3.output_data is not None
+    # proc4 never started
+    assert proc4.output_data is None
+
+
+@pytest.mark.forked
+async def test_proc_forks_exception(tmp_path):
+    def _error(ch):
+        raise RuntimeError("input error")
+
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(SleepingProc, input_data=[10])
+    proc3 = Proc.from_proc(NormalProc, requires=proc1, input_data=_error)
+
+    pipeline = Pipen(
+        name="dag_pipeline_exception",
+        proc_forks=2,
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    ).set_starts(proc1, proc2)
+    with pytest.raises(RuntimeError, match="input error"):
+        await pipeline.async_run()
+
+    # the cancelled proc2 is done before the exception is raised
+    assert [
+        task
+        for task in asyncio.all_tasks()
+        if task is not asyncio.current_task() and not task.done()
+    ] == []
+    assert proc3.output_data is None
+
+
+@pytest.mark.forked
+def test_stream(tmp_path):
+    events = []
+
+    class EventPlugin:
+        @plugin.impl
+        async def on_job_queued(job):
+            events.append(("queued", job.proc.name, job.index))
+
+        @plugin.impl
+        async def on_job_succeeded(job):
+            events.append(("succeeded", job.proc.name, job.index))
+
+    marker = tmp_path / "marker"
+
+    # job 0 of StreamProc1 waits for job 1 of StreamProc2 to be done,
+    # which fails if job 1 of StreamProc2 waits for job 0 of StreamProc1
+    class StreamProc1(Proc):
+        input = "wait"
+        input_data = [1, 0]
+        output = "wait:var:{{in.wait}}"
+        script = f"""
+            [ {{{{in.wait}}}} = 0 ] && exit 0
+            for i in $(seq 600); do
+                [ -e {marker} ] && exit 0
+                sleep 0.1
+            done
+            exit 1
+        """
+        forks = 2
+
+    class StreamProc2(Proc):
+        requires = StreamProc1
+        input = "wait"
+        output = "out:var:{{in.wait}}"
+        script = f"[ {{{{in.wait}}}} = 0 ] && touch {marker}; echo {{{{in.wait}}}}"
+        stream = True
+        forks = 2
+
+    pipeline = Pipen(
+        name="stream_pipeline",
+        proc_forks=2,
+        plugins=[EventPlugin],
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(StreamProc1).run()
+    assert events.index(("queued", "StreamProc2", 1)) < events.index(
+        ("succeeded", "StreamProc1", 0)
+    )
+    assert StreamProc2.output_data.out.tolist() == ["1", "0"]
+
+
+@pytest.mark.forked
+def test_stream_error(tmp_path):
+    class StreamErrorProc1(Proc):
+        input = "rc"
+        input_data = [0, 1]
+        output = "rc:var:{{in.rc}}"
+        script = "exit {{in.rc}}"
+        forks = 2
+
+    class StreamErrorProc2(Proc):
+        requires = StreamErrorProc1
+        input = "rc"
+        output = "out:var:{{in.rc}}"
+        script = "echo {{in.rc}}"
+        stream = True
+
+    pipeline = Pipen(
+        name="stream_pipeline_error",
+        proc_forks=2,
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    assert not pipeline.set_starts(StreamErrorProc1).run()
+    assert StreamErrorProc2.output_data is None
+
+
+@pytest.mark.forked
+def test_stream_error_chain(tmp_path):
+    class StreamChainProc1(Proc):
+        input = "rc"
+        input_data = [0, 0, 1]
+        output = "rc:var:{{in.rc}}"
+        script = "exit {{in.rc}}"
+        error_strategy = "ignore"
+
+    class StreamChainProc2(Proc):
+        requires = StreamChainProc1
+        input = "rc"
+        output = "out:var:{{in.rc}}"
+        script = "echo {{in.rc}}"
+        stream = True
+
+    class StreamChainProc3(Proc):
+        requires = StreamChainProc2
+        input = "rc"
+        output = "out:var:{{in.rc}}"
+        script = "echo {{in.rc}}"
+        stream = True
+
+    pipeline = Pipen(
+        name="stream_pipeline_error_chain",
+        proc_forks=3,
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    # the failed row is skipped by both streaming processes, without hanging
+    assert not pipeline.set_starts(StreamChainProc1).run()
+    workdir = tmp_path / "workdir" / pipeline.name
+    for proc in (StreamChainProc2, StreamChainProc3):
+        assert (workdir / proc.name / "1" / "job.rc").read_text().strip() == "0"
+        assert not (workdir / proc.name / "2").exists()
+
+
+@pytest.mark.forked
+def test_stream_forks(tmp_path):
+    # the last row is ready long after the others
+    class StreamForksProc1(Proc):
+        input = "wait"
+        input_data = [0, 0, 15]
+        output = "wait:var:{{in.wait}}"
+        script = "sleep {{in.wait}}; date +%s.%N"
+        forks = 3
+
+    class StreamForksProc2(Proc):
+        requires = StreamForksProc1
+        input = "wait"
+        output = "wait:var:{{in.wait}}"
+        script = "date +%s.%N"
+        stream = True
+        forks = 1
+
+    class StreamForksProc3(Proc):
+        requires = StreamForksProc2
+        input = "wait"
+        output = "wait:var:{{in.wait}}"
+        script = "date +%s.%N"
+        stream = True
+        forks = 1
+
+    pipeline = Pipen(
+        name="stream_pipeline_forks",
+        proc_forks=3,
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(StreamForksProc1).run()
+
+    workdir = tmp_path / "workdir" / pipeline.name
+
+    def time_of(proc, index):
+        return float((workdir / proc.name / str(index) / "job.stdout").read_text())
+
+    last_row_ready = time_of(StreamForksProc1, 2)
+    # the jobs of the ready rows are not blocked by the only fork, nor by the
+    # last row
+    for proc in (StreamForksProc2, StreamForksProc3):
+        assert max(time_of(proc, 0), time_of(proc, 1)) < last_row_ready
+        assert time_of(proc, 2) > last_row_ready
+
+
 @pytest.mark.forked
 def test_proc_inherited(pipen):
     proc1 = Proc.from_proc(RelPathScriptProc)
@@ -287,3 +535,147 @@ async def test_cloud_workdir_outdir(uid):
         )
     finally:
         await cloud_dir.a_rmtree()
+
+
+@pytest.mark.forked
+def test_run_db(tmp_path):
+    from pipen._run_db import RunDB
+
+    proc1 = Proc.from_proc(NormalProc, input_data=[1, 2])
+    proc2 = Proc.from_proc(ErrorProc, requires=proc1)
+    pipeline = Pipen(
+        name="run_db_pipeline",
+        run_db=True,
+        manifest_check="files",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        loglevel="debug",
+    ).set_starts(proc1)
+    assert not pipeline.run()
+
+    db = RunDB(pipeline.workdir / "run.db")
+    jobs = db.jobs()
+    assert [(job["proc"], job["job_index"]) for job in jobs] == [
+        (proc1.name, 0),
+        (proc1.name, 1),
+        (proc2.name, 0),
+        (proc2.name, 1),
+    ]
+    assert [job["status"] for job in db.jobs(proc=proc1.name)] == [
+        "succeeded",
+        "succeeded",
+    ]
+    failed = db.jobs(status="failed")
+    assert [job["proc"] for job in failed] == [proc2.name, proc2.name]
+    assert [job["rc"] for job in failed] == [1, 1]
+    assert all(job["ended"] >= job["submitted"] for job in jobs)
+
+    conn = db._connect()
+    assert dict(conn.execute("SELECT proc, status FROM procs").fetchall()) == {
+        proc1.name: "succeeded",
+        proc2.name: "failed",
+    }
+    assert conn.execute("SELECT succeeded FROM runs").fetchone()[0] == 0
+
+    # a new run, with proc1 cached by the manifest, no jobs constructed
+    assert not pipeline.run()
+    conn = db._connect()
+    assert conn.execute(
+        "SELECT status FROM procs WHERE run_id = 2 AND proc = ?",
+        (proc1.name,),
+    ).fetchone()[0] == "cached"
+    assert [job["proc"] for job in db.jobs()] == [proc2.name, proc2.name]
+    assert len(db.jobs(run_id=1)) == 4
+
+
+async def test_run_db_writer_thread(tmp_path, monkeypatch):
+    import threading
+    from types import SimpleNamespace
+    from pipen import _run_db
+    from pipen._run_db import RunDB
+
+    monkeypatch.setattr(_run_db, "RUN_DB_BATCH_SIZE", 2)
+    db = RunDB(tmp_path / "run.db")
+    threads = set()
+    connect = db._connect
+
+    def _connect():
+        threads.add(threading.current_thread())
+        return connect()
+
+    db._connect = _connect
+    proc = SimpleNamespace(name="proc", size=3)
+    await db.start_run("pipeline", "default")
+    await db.update_proc(proc, "running")
+    for i in range(3):
+        db.update_job(
+            SimpleNamespace(proc=proc, index=i, trial_count=0),
+            "succeeded",
+            rc=0,
+        )
+    await db.update_proc(proc, "succeeded")
+    await db.end_run(True)
+
+    assert threads and threading.main_thread() not in threads
+    db = RunDB(tmp_path / "run.db")
+    assert [job["job_index"] for job in db.jobs()] == [0, 1, 2]
+    assert db._connect().execute("SELECT succeeded FROM runs").fetchone()[0] == 1
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("release", ["drop", "spill"])
+def test_release_output_data(tmp_path, release):
+    proc1 = Proc.from_proc(NormalProc, input_data=[1, 2])
+    proc2 = Proc.from_proc(NormalProc, requires=proc1)
+    proc3 = Proc.from_proc(NormalProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=[proc2, proc3])
+    released = []
+
+    class ReleasePlugin:
+        @plugin.impl
+        async def on_proc_start(proc):
+            released.append((proc.name, proc1.output_data is None))
+
+    pipeline = Pipen(
+        name=f"release_{release}_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        release_output_data=release,
+        # not saved for caching
+        cache=False,
+        plugins=[ReleasePlugin],
+    ).set_starts(proc1)
+    assert pipeline.run()
+
+    # released once both proc2 and proc3 have computed their input
+    assert released == [
+        (proc1.name, True),
+        (proc2.name, False),
+        (proc3.name, True),
+        (proc4.name, True),
+    ]
+    assert proc2.output_data is None
+    assert proc3.output_data is None
+    # the end processes are kept
+    assert proc4.output_data["output"].tolist() == ["1", "2"]
+
+    if release == "drop":
+        assert proc1.load_output_data() is None
+    else:
+        assert proc1.load_output_data()["output"].tolist() == ["1", "2"]
+        assert proc2.load_output_data()["output"].tolist() == ["1", "2"]
+
+
+@pytest.mark.forked
+def test_release_output_data_invalid(tmp_path):
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(NormalProc, requires=proc1)
+    pipeline = Pipen(
+        name="release_invalid_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        release_output_data="x",
+    ).set_starts(proc1)
+    with pytest.raises(ConfigurationError):
+        pipeline.run()
+    assert proc2.output_data is None
@@ -1,8 +1,10 @@
+import asyncio
+import json
 import os
 import pytest
 
 import pandas
-from pipen import Proc
+from pipen import Pipen, Proc, plugin
 from pipen.exceptions import (
     ProcInputKeyError,
     ProcInputTypeError,
@@ -154,6 +156,100 @@ def test_cached_run(caplog, pipen):
     assert caplog.text.count("Cached jobs:") == 1
 
 
+@pytest.mark.forked
+def test_cached_run_by_manifest(caplog, tmp_path):
+    inited = []
+
+    class InitPlugin:
+        @plugin.impl
+        async def on_job_init(job):
+            inited.append((job.proc.name, job.index))
+
+    class ManifestProc1(Proc):
+        input = "a"
+        input_data = [1, 2]
+        output = "b:file:{{in.a}}.txt"
+        script = "echo {{in.a}} > {{out.b}}"
+
+    class ManifestProc2(Proc):
+        requires = ManifestProc1
+        input = "b:file"
+        output = "c:var:{{in.b.stem}}"
+
+    def run_pipeline():
+        # plugins are only enabled for the first run of a pipeline object
+        return Pipen(
+            name="manifest_pipeline",
+            plugins=[InitPlugin],
+            manifest_check="files",
+            loglevel="debug",
+            workdir=tmp_path / "workdir",
+            outdir=tmp_path / "outdir",
+        ).set_starts(ManifestProc1).run()
+
+    assert run_pipeline()
+    assert len(inited) == 4
+    assert (ManifestProc1.workdir / "proc.manifest.json").is_file()
+    # the output data is only saved with manifest_check = "fingerprint"
+    assert not (ManifestProc1.workdir / "proc.output.json").exists()
+
+    caplog.clear()
+    assert run_pipeline()
+    # no jobs are constructed
+    assert len(inited) == 4
+    assert caplog.text.count("Cached jobs:") == 2
+    assert list(map(str, ManifestProc1.output_data.b)) == [
+        str(
+            tmp_path / "workdir" / "manifest_pipeline" / "ManifestProc1" / str(i)
+            / "output" / f"{i + 1}.txt"
+        )
+        for i in range(2)
+    ]
+    assert ManifestProc2.output_data.c.tolist() == ["1", "2"]
+
+    # removing output files invalidates the manifest
+    os.unlink(ManifestProc1.output_data.b[0])
+    assert run_pipeline()
+    # ManifestProc2 is not cached by the manifest since ManifestProc1 is not
+    assert sorted(inited[4:]) == [
+        ("ManifestProc1", 0),
+        ("ManifestProc1", 1),
+        ("ManifestProc2", 0),
+        ("ManifestProc2", 1),
+    ]
+    assert "Manifest not matched (job #0 output b was removed)" in caplog.text
+
+
+@pytest.mark.forked
+def test_cached_run_without_manifest(tmp_path):
+    cached = []
+
+    class CachedPlugin:
+        @plugin.impl
+        async def on_job_cached(job):
+            cached.append(job.index)
+
+    class NoManifestProc(Proc):
+        input = "a"
+        input_data = [1, 2]
+        output = "b:var:{{in.a}}"
+
+    def run_pipeline():
+        return Pipen(
+            name="no_manifest_pipeline",
+            plugins=[CachedPlugin],
+            workdir=tmp_path / "workdir",
+            outdir=tmp_path / "outdir",
+        ).set_starts(NoManifestProc).run()
+
+    assert run_pipeline()
+    assert not (NoManifestProc.workdir / "proc.manifest.json").exists()
+
+    # the jobs are constructed and the hooks are called for the cached jobs
+    assert run_pipeline()
+    assert sorted(cached) == [0, 1]
+
+
 def test_proc_repr():
     assert repr(SimpleProc) == "<Proc:SimpleProc>"
 
@@ -252,3 +348,314 @@ def test_inherit_proc_envs():
     assert Proc1_1.envs == {"a": {"b": 1, "c": 2}}
     assert Proc1_2.envs == {"a": {"b": 1, "c": 2}}
     assert Proc1_3.envs == {"a": {"b": 1, "c": 2}}
+
+
+@pytest.mark.forked
+def test_compiled_output(pipen):
+    class CompiledOutputProc(NormalProc):
+        input_data = ["x", "a:b"]
+        output = "out:{{in.input | size}}, s:var:static, t:var:{{in.input}}"
+
+    class UncompiledOutputProc(NormalProc):
+        requires = CompiledOutputProc
+        # the type is rendered
+        output = "out:{{'var'}}:{{in.input}}"
+
+    assert pipen.set_starts(CompiledOutputProc).run()
+
+    spec = CompiledOutputProc._INSTANCES[CompiledOutputProc]._output_spec
+    assert [(name, outtype) for name, outtype, _ in spec] == [
+        ("out", None),
+        ("s", "var"),
+        ("t", "var"),
+    ]
+    assert spec[1][2] == "static"
+    assert UncompiledOutputProc._INSTANCES[UncompiledOutputProc]._output_spec is None
+
+    out = CompiledOutputProc.output_data
+    assert out["out"].tolist() == ["1", "3"]
+    assert out["s"].tolist() == ["static", "static"]
+    assert out["t"].tolist() == ["x", "a:b"]
+    assert UncompiledOutputProc.output_data["out"].tolist() == ["1", "3"]
+
+
+@pytest.mark.forked
+def test_job_window(tmp_path, caplog):
+    from pipen.job import JobRecord
+
+    live = []
+    records = []
+    resolved = []
+
+    class JobWindowPlugin:
+        @plugin.impl
+        async def on_job_init(job):
+            live.append(len(job.proc._live_jobs))
+            resolved.append(job.proc._input_records)
+
+        @plugin.impl
+        async def on_proc_done(proc, succeeded):
+            records.extend(isinstance(job, JobRecord) for job in proc.jobs)
+
+    class JobWindowProc(NormalProc):
+        input_data = list(range(12))
+        job_window = 3
+        forks = 2
+
+    pipeline = Pipen(
+        name="job_window_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        plugins=[JobWindowPlugin()],
+    ).set_starts(JobWindowProc)
+    assert pipeline.run()
+
+    assert len(live) == 12
+    assert max(live) <= 3
+    # the input is not resolved for all jobs at once
+    assert resolved == [None] * 12
+    # all but the last window are compacted
+    assert len(records) == 12
+    assert sum(records) >= 9
+    assert JobWindowProc.output_data["output"].tolist() == [
+        str(i) for i in range(12)
+    ]
+
+    # cached jobs are released right away
+    caplog.clear()
+    assert pipeline.run()
+    assert "Cached jobs: 0-11" in caplog.text
+    assert JobWindowProc.output_data["output"].tolist() == [
+        str(i) for i in range(12)
+    ]
+
+
+@pytest.mark.forked
+def test_xqute_compat(tmp_path):
+    from xqute import JobStatus, Xqute
+    from pipen._xqute_compat import poll_jobs, xqute_cancelled
+
+    async def _run():
+        # without the plugin of pipen, which works with the jobs of pipen
+        xqute = Xqute(
+            workdir=tmp_path, forks=2, num_retries=0, plugins=["-xqute.pipen"]
+        )
+        await xqute.run_until_complete(keep_feeding=True)
+        await xqute.feed(["true"])
+        await xqute.feed(["false"])
+        for counter in range(100):
+            await poll_jobs(xqute, xqute.jobs, counter)
+            if all(
+                job._status in (JobStatus.FINISHED, JobStatus.FAILED)
+                for job in xqute.jobs
+            ):
+                break
+            await asyncio.sleep(0.1)
+
+        statuses = [job._status for job in xqute.jobs]
+        cancelled = xqute_cancelled(xqute)
+        await xqute.stop_feeding()
+        return statuses, cancelled, xqute_cancelled(xqute)
+
+    statuses, cancelled, stopped = asyncio.run(_run())
+    assert statuses == [JobStatus.FINISHED, JobStatus.FAILED]
+    assert not cancelled
+    # xqute cancels itself when all jobs are done
+    assert stopped
+
+
+@pytest.mark.forked
+def test_prepare_concurrency(tmp_path):
+    active = []
+
+    class PrepareConcurrencyPlugin:
+        @plugin.impl
+        async def on_job_init(job):
+            active.append(job.proc._prepare_limiter._active)
+
+    class PrepareConcurrencyProc(NormalProc):
+        input_data = list(range(12))
+        submission_batch = 1
+        prepare_concurrency = 4
+
+    pipeline = Pipen(
+        name="prepare_concurrency_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        plugins=[PrepareConcurrencyPlugin()],
+    ).set_starts(PrepareConcurrencyProc)
+    assert pipeline.run()
+
+    assert len(active) == 12
+    assert max(active) == 4
+    assert PrepareConcurrencyProc.output_data["output"].tolist() == [
+        str(i) for i in range(12)
+    ]
+
+
+async def test_prepare_limiter_adaptive():
+    from pipen._limiter import PrepareLimiter
+
+    limiter = PrepareLimiter(2, 16)
+    assert limiter.adaptive
+    assert not PrepareLimiter(2).adaptive
+
+    # fast jobs raise the limit, checked after every `limit` jobs
+    for _ in range(2 + 4 + 8):
+        limiter._record(0.01)
+    assert limiter.limit == limiter.peak == 16
+
+    # slow jobs lower it, but not below the initial one
+    for _ in range(16 + 8 + 4 + 2 + 2):
+        limiter._record(0.1)
+    assert limiter.limit == 2
+    assert limiter.peak == 16
+
+    active = []
+
+    async def _prepare():
+        async with limiter.slot():
+            active.append(limiter._active)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(_prepare() for _ in range(20)))
+    assert 2 <= max(active) <= 16
+
+
+def test_compact_output_data(tmp_path):
+    from xqute.path import MountedPath
+    from pipen.job import (
+        _compact_output_data,
+        _expand_output_data,
+        _output_data_from_json,
+        _output_data_to_json,
+    )
+
+    rows = [
+        {
+            "b": MountedPath(f"/mnt/{i}.txt", spec=tmp_path / f"{i}.txt"),
+            "c": "static",
+            "d": str(i),
+        }
+        for i in range(4)
+    ]
+    out = _compact_output_data(rows)
+    assert out.attrs["pipen_paths"] == ["b"]
+    assert out["b"].tolist()[0] == f"{tmp_path}/0.txt:/mnt/0.txt"
+    assert isinstance(out["c"].dtype, pandas.CategoricalDtype)
+    assert not isinstance(out["d"].dtype, pandas.CategoricalDtype)
+
+    expanded = _expand_output_data(out)
+    assert "pipen_paths" not in expanded.attrs
+    assert all(isinstance(path, MountedPath) for path in expanded["b"])
+    assert str(expanded["b"][0]) == "/mnt/0.txt"
+    assert str(expanded["b"][0].spec) == f"{tmp_path}/0.txt"
+    assert expanded["c"].dtype == object
+    assert (expanded["c"] + "_s").tolist() == ["static_s"] * 4
+    assert _expand_output_data(expanded) is expanded
+
+    # saved as JSON with manifest_check = "fingerprint"
+    loaded = _output_data_from_json(
+        json.loads(json.dumps(_output_data_to_json(expanded)))
+    )
+    assert loaded.attrs["pipen_paths"] == ["b"]
+    assert _expand_output_data(loaded)["b"][1].spec == tmp_path / "1.txt"
+    assert loaded["d"].tolist() == ["0", "1", "2", "3"]
+
+
+@pytest.mark.forked
+def test_compact_output_data_to_next_procs(pipen):
+    from xqute.path import MountedPath
+
+    received = []
+
+    class CompactOutputProc(Proc):
+        input = "a"
+        input_data = [1, 2, 3, 4]
+        output = "b:file:{{in.a}}.txt, c:var:static, d:var:{{in.a}}"
+        script = "echo {{in.a}} > {{out.b}}"
+
+    def _input_data(ch):
+        received.extend(ch.b)
+        return ch.assign(c=ch.c + "_s")
+
+    class ExpandOutputProc(Proc):
+        requires = CompactOutputProc
+        input = "b:file, c, d"
+        input_data = _input_data
+        output = "e:var:{{in.b.stem}}_{{in.c}}"
+
+    class ReadOutputProc(Proc):
+        requires = CompactOutputProc
+        input = "b:file"
+        output = "e:var:{{in.b.name}}"
+
+    assert pipen.set_starts(CompactOutputProc).run()
+
+    # turned back to paths and strings for the input_data callbacks
+    assert all(isinstance(path, MountedPath) for path in received)
+    assert ExpandOutputProc.output_data["e"].tolist() == [
+        "1_static_s",
+        "2_static_s",
+        "3_static_s",
+        "4_static_s",
+    ]
+    # and for the jobs
+    assert ReadOutputProc.output_data["e"].tolist() == [
+        "1.txt",
+        "2.txt",
+        "3.txt",
+        "4.txt",
+    ]
+    # and for the users
+    out = CompactOutputProc.output_data
+    assert "pipen_paths" not in out.attrs
+    assert all(isinstance(path, MountedPath) for path in out["b"])
+    assert out["b"][0].name == "1.txt"
+    assert out["c"].dtype == object
+    assert out["c"].tolist() == ["static"] * 4
+
+
+@pytest.mark.forked
+def test_manifest_check_fingerprint(caplog, tmp_path):
+    class FingerprintProc1(Proc):
+        input = "a"
+        input_data = [1, 2]
+        output = "b:file:{{in.a}}.txt"
+        script = "echo {{in.a}} > {{out.b}}"
+
+    class FingerprintProc2(Proc):
+        requires = FingerprintProc1
+        input = "b:file"
+        output = "c:var:{{in.b.stem}}"
+
+    pipeline = Pipen(
+        name="fingerprint_pipeline",
+        loglevel="debug",
+        manifest_check="fingerprint",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    ).set_starts(FingerprintProc1)
+
+    assert pipeline.run()
+    proc1 = FingerprintProc1._INSTANCES[FingerprintProc1]
+    assert proc1.output_data_file.is_file()
+    assert proc1._output_data_saved
+    saved = json.loads(proc1.output_data_file.read_text())
+    assert saved["data"]["columns"] == ["b"]
+    assert saved["data"]["paths"] == ["b"]
+
+    # the files are not checked
+    os.unlink(FingerprintProc1.output_data.b[0])
+    caplog.clear()
+    assert pipeline.run()
+    assert caplog.text.count("Cached jobs: 0-1") == 2
+    assert "Manifest not matched" not in caplog.text
+    assert FingerprintProc2.output_data.c.tolist() == ["1", "2"]
+
+    # the input data is changed
+    FingerprintProc1.input_data = [1, 3]
+    caplog.clear()
+    assert pipeline.run()
+    assert "Saved output data not matched" in caplog.text
+    assert FingerprintProc2.output_data.c.tolist() == ["1", "3"]
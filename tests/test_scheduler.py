@@ -1,17 +1,28 @@
+import asyncio
+import sys
+
 import pytest
 from unittest.mock import MagicMock
 
 from pathlib import Path
 from panpath import PanPath
+from pipen import Pipen, Proc
+from pipen._pyworker import PythonWorkerPool
+from pipen._status_poller import StatusPoller
 from pipen.scheduler import (
     get_scheduler,
     LocalScheduler,
+    CallableScheduler,
+    PyworkerScheduler,
     SgeScheduler,
     SshScheduler,
     SlurmScheduler,
     GbatchScheduler,
     ContainerScheduler,
     NoSuchSchedulerError,
+    ArrayJobSubmitter,
+    BulkStatusPolling,
+    PoolJobRunner,
 )
 from .helpers import SimpleProc, pipen_container  # noqa: F401
 
@@ -24,6 +35,9 @@ def test_get_scheduler():
     local = get_scheduler(local)
     assert local is LocalScheduler
 
+    assert get_scheduler("pyworker") is PyworkerScheduler
+    assert get_scheduler("callable") is CallableScheduler
+
     sge = get_scheduler("sge")
     assert sge is SgeScheduler
 
@@ -77,6 +91,23 @@ async def test_container_scheduler_init(tmp_path):
     )
 
 
+async def test_container_scheduler_no_job_bundles(tmp_path):
+    tmp_path = PanPath(tmp_path)
+    scheduler = get_scheduler("container")(
+        image="bash:latest",
+        entrypoint="/bin/sh",
+        workdir=tmp_path / "workdir",
+        bin="true",
+    )
+    pipeline = MagicMock(outdir=tmp_path / "outdir")
+    pipeline.name = "test_pipeline"
+    proc = MagicMock(pipeline=pipeline, job_bundle_size=3)
+    proc.name = "test_proc"
+    await scheduler.init_proc(proc)
+    assert scheduler.job_bundle_size == 1
+    assert proc.log.call_args.args[0] == "warning"
+
+
 async def test_gbatch_scheduler_init():
     gbatch_sched = get_scheduler("gbatch")
     sched = gbatch_sched(
@@ -329,3 +360,774 @@ async def test_container_cwd_mount_not_found(tmp_path):
     proc.name = "Process"
     with pytest.raises(ValueError):
         await container.init_proc(proc)
+
+
+# Stand-ins of sbatch and qsub that run the tasks of the array jobs locally,
+# with the interpreter in the shebang of the script
+FAKE_SBATCH = r"""#!/usr/bin/env bash
+echo "$@" >> {log}
+interpreter=$(head -n1 "${{@: -1}}" | cut -c3-)
+array=0-0
+for arg in "$@"; do
+    case $arg in --array=*) array=${{arg#--array=}};; esac
+done
+for ((i=${{array%-*}}; i<=${{array#*-}}; i++)); do
+    SLURM_ARRAY_TASK_ID=$i $interpreter "${{@: -1}}" >/dev/null 2>&1 &
+done
+echo "Submitted batch job $(wc -l < {log})"
+"""
+
+FAKE_QSUB = r"""#!/usr/bin/env bash
+echo "$@" >> {log}
+interpreter=$(head -n1 "${{@: -1}}" | cut -c3-)
+array=1-1
+if [[ $1 == "-t" ]]; then array=$2; fi
+for ((i=${{array%-*}}; i<=${{array#*-}}; i++)); do
+    SGE_TASK_ID=$i $interpreter "${{@: -1}}" >/dev/null 2>&1 &
+done
+echo "Your job-array $(wc -l < {log}).$array:1 (\"name\") has been submitted"
+"""
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("scheduler", ["slurm", "sge"])
+def test_array_jobs(tmp_path, scheduler):
+    log = tmp_path / "submissions.log"
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    submit = bindir / "submit"
+    submit.write_text(
+        (FAKE_SBATCH if scheduler == "slurm" else FAKE_QSUB).format(log=log)
+    )
+    # job not found in the queue
+    query = bindir / "query"
+    query.write_text("#!/usr/bin/env bash\nexit 1\n")
+    submit.chmod(0o755)
+    query.chmod(0o755)
+    if scheduler == "slurm":
+        scheduler_opts = {"sbatch": str(submit), "squeue": str(query)}
+    else:
+        scheduler_opts = {"qsub": str(submit), "qstat": str(query)}
+
+    markers = [tmp_path / f"marker{i}" for i in range(4)]
+    # jobs 1 and 3 fail at the first trial
+    markers[0].touch()
+    markers[2].touch()
+
+    class ArrayProc(Proc):
+        input = "a, marker"
+        input_data = list(zip(range(4), map(str, markers)))
+        output = "outfile:file:{{in.a}}.txt"
+        script = """
+            if [[ ! -e {{in.marker}} ]]; then touch {{in.marker}}; exit 1; fi
+            echo {{in.a}} > {{out.outfile}}
+        """
+        error_strategy = "retry"
+        num_retries = 1
+
+    pipeline = Pipen(
+        name=f"array_{scheduler}_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        scheduler=scheduler,
+        scheduler_opts={**scheduler_opts, "array_jobs": True},
+        forks=4,
+    ).set_starts(ArrayProc)
+    assert pipeline.run()
+
+    submissions = [line.split()[0:2] for line in log.read_text().splitlines()]
+    # the tasks in each array job
+    if scheduler == "slurm":
+        ntasks = [int(opts[0].split("-")[-1]) + 1 for opts in submissions]
+    else:
+        ntasks = [int(opts[1].split("-")[-1]) for opts in submissions]
+    # all jobs in one array job, and the failed ones retried in other ones
+    # (in one, unless they fail in different polls)
+    assert ntasks[0] == 4
+    assert sum(ntasks[1:]) == 2
+
+    workdir = tmp_path / "workdir" / pipeline.name / ArrayProc.name
+    array_script = (workdir / f"proc.array.1.{scheduler}").read_text()
+    assert array_script.startswith("#!/usr/bin/env bash\n")
+    assert ("#SBATCH --job-name=" if scheduler == "slurm" else "#$ -N ") in (
+        array_script
+    )
+    for i in range(4):
+        assert (workdir / str(i) / "job.rc").read_text().strip() == "0"
+        assert (workdir / str(i) / "output" / f"{i}.txt").read_text() == f"{i}\n"
+    assert ArrayProc.output_data["outfile"].map(
+        lambda path: Path(path).name
+    ).tolist() == ["0.txt", "1.txt", "2.txt", "3.txt"]
+
+
+def test_array_job_submitter_abstract(tmp_path):
+    class IncompleteArrayScheduler(ArrayJobSubmitter, LocalScheduler):
+        array_task_env = "TASK_ID"
+
+    assert IncompleteArrayScheduler.__abstractmethods__ == {
+        "submit_array",
+        "array_task_jid",
+    }
+    with pytest.raises(TypeError):
+        IncompleteArrayScheduler(workdir=tmp_path)
+
+
+def test_bulk_status_polling_abstract(tmp_path):
+    class IncompletePollingScheduler(BulkStatusPolling, LocalScheduler):
+        pass
+
+    with pytest.raises(TypeError, match="query_statuses"):
+        IncompletePollingScheduler(workdir=tmp_path)
+
+
+async def test_status_poller():
+    queried = []
+
+    async def query(keys):
+        queried.append(sorted(keys))
+        return {key: "R" for key in keys if key != "3"}
+
+    poller = StatusPoller(query, interval=60)
+    for key in ("1", "2", "3"):
+        poller.watch(key)
+
+    # all watched jobs in one query
+    assert await poller.status("1") == "R"
+    assert await poller.status("2") == "R"
+    assert await poller.status("3") is None
+    assert queried == [["1", "2", "3"]]
+
+    # not watched, queried on its own
+    assert await poller.status("4") == "R"
+    assert queried[-1] == ["4"]
+
+    # newly watched
+    poller.unwatch("1")
+    poller.watch("5")
+    assert await poller.status("5") == "R"
+    assert queried[-1] == ["2", "3", "5"]
+    assert poller.queries == 3
+
+    poller.interval = 0
+    assert await poller.status("2") == "R"
+    assert poller.queries == 4
+
+
+@pytest.mark.forked
+def test_slurm_bulk_status_polling(tmp_path):
+    log = tmp_path / "squeue.log"
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    sbatch = bindir / "sbatch"
+    # the jobs are pending for a while
+    sbatch.write_text(
+        f"#!{sys.executable}\n"
+        "import os, subprocess, sys\n"
+        "subprocess.Popen(\n"
+        "    ['bash', '-c', 'sleep 3; bash ' + sys.argv[1]],\n"
+        "    stdout=subprocess.DEVNULL,\n"
+        "    stderr=subprocess.DEVNULL,\n"
+        ")\n"
+        "print('Submitted batch job', os.getpid())\n"
+    )
+    squeue = bindir / "squeue"
+    squeue.write_text(
+        "#!/usr/bin/env bash\n"
+        f'echo "$@" >> {log}\n'
+        'jids="${@: -1}"\n'
+        'for jid in ${jids//,/ }; do echo "$jid PD"; done\n'
+    )
+    sbatch.chmod(0o755)
+    squeue.chmod(0o755)
+
+    class PendingProc(Proc):
+        input = "a"
+        input_data = list(range(4))
+        script = "echo {{in.a}}"
+
+    pipeline = Pipen(
+        name="bulk_polling_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        scheduler="slurm",
+        scheduler_opts={"sbatch": str(sbatch), "squeue": str(squeue)},
+        forks=4,
+    ).set_starts(PendingProc)
+    assert pipeline.run()
+
+    queries = log.read_text().splitlines()
+    # the jobs are polled together for about 3 times while pending,
+    # instead of 12 times one by one
+    assert 0 < len(queries) < 8
+    assert any(len(query.split()[-1].split(",")) == 4 for query in queries)
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("job_bundle_forks", [1, 3])
+def test_job_bundles(tmp_path, job_bundle_forks):
+    marker = tmp_path / "marker"
+
+    class BundleProc(Proc):
+        input = "a"
+        input_data = list(range(6))
+        output = "outfile:file:{{in.a}}.txt"
+        # job 1 fails at the first trial
+        script = f"""
+            if [[ {{{{in.a}}}} == 1 && ! -e {marker} ]]; then
+                touch {marker}
+                exit 1
+            fi
+            echo {{{{in.a}}}} > {{{{out.outfile}}}}
+            echo {{{{in.a}}}}
+        """
+        error_strategy = "retry"
+        num_retries = 1
+
+    pipeline = Pipen(
+        name=f"bundle_pipeline_{job_bundle_forks}",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        forks=6,
+        job_bundle_size=3,
+        job_bundle_forks=job_bundle_forks,
+    ).set_starts(BundleProc)
+    assert pipeline.run()
+
+    workdir = tmp_path / "workdir" / pipeline.name / BundleProc.name
+    jids = [(workdir / str(i) / "job.jid.used").read_text() for i in range(6)]
+    # job 1 is retried on its own
+    assert jids[0] == jids[2] != jids[1]
+    assert jids[3] == jids[4] == jids[5] != jids[0]
+    assert (workdir / "1" / "job.retry").is_dir()
+    for i in range(6):
+        assert (workdir / str(i) / "job.bundle.local").exists() is (i in (0, 3))
+        assert (workdir / str(i) / "job.rc").read_text().strip() == "0"
+        assert (workdir / str(i) / "job.stdout").read_text() == f"{i}\n"
+        assert (workdir / str(i) / "job.signature.toml").is_file()
+        assert (workdir / str(i) / "output" / f"{i}.txt").read_text() == f"{i}\n"
+
+
+# Stand-ins of sbatch and qsub that run the bundles locally after a while,
+# like they are pending in a real queue, and of squeue and qstat that list
+# the submitted jobs as running
+FAKE_BUNDLE_SUBMIT = """#!{python}
+import os, subprocess, sys
+with open({log!r}, 'a') as f:
+    print(*sys.argv[1:], file=f)
+# start after the jid is written, so the job is not finished before it is
+# marked as submitted
+jid_file = os.path.join(os.path.dirname(sys.argv[-1]), 'job.jid')
+subprocess.Popen(
+    [
+        'bash',
+        '-c',
+        'while [[ ! -s "$0" ]]; do sleep .1; done; sleep 1; exec bash "$1"',
+        jid_file,
+        sys.argv[-1],
+    ],
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+)
+print({message!r} % os.getpid())
+"""
+
+FAKE_BUNDLE_SQUEUE = r"""#!/usr/bin/env bash
+jids="${@: -1}"
+for jid in ${jids//,/ }; do echo "$jid R"; done
+"""
+
+FAKE_BUNDLE_QSTAT = """#!{python}
+import sys
+sys.stdout.write('<job_info><queue_info>')
+with open({log!r}) as f:
+    for line in f:
+        sys.stdout.write(
+            '<job_list><JB_job_number>%s</JB_job_number>'
+            '<state>r</state></job_list>' % line.split()[0]
+        )
+sys.stdout.write('</queue_info></job_info>')
+"""
+
+# A stand-in of ssh that runs the commands locally, with the submitted jobs
+# run in the background after a while, instead of by the submitter of xqute,
+# which waits for the jobs to finish
+FAKE_SSH = """#!{python}
+import os, subprocess, sys
+args = sys.argv[1:]
+while args[0] in ('-o', '-p', '-i'):
+    if args[1].startswith('ControlPath='):
+        open(args[1][len('ControlPath='):], 'a').close()
+    args = args[2:]
+if len(args) < 3 or not args[2].endswith('submitter.py'):
+    os.execvp(args[1], args[1:])
+server, cwd, *cmds = args[3:]
+with open({log!r}, 'a') as f:
+    print(*cmds, file=f)
+# start after the jid is written, so the job is not finished before it is
+# marked as submitted. xqute waits for the stdout file before writing it.
+metadir = os.path.dirname(cmds[-1])
+open(os.path.join(metadir, 'job.stdout'), 'a').close()
+jid_file = os.path.join(metadir, 'job.jid')
+proc = subprocess.Popen(
+    [
+        'bash',
+        '-c',
+        'while [[ ! -s "$0" ]]; do sleep .1; done; sleep 1; exec "$@"',
+        jid_file,
+        *cmds,
+    ],
+    cwd=cwd,
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+    start_new_session=True,
+)
+print(f'{{proc.pid}}@{{server}}', end='')
+"""
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("scheduler", ["slurm", "sge", "ssh"])
+def test_cluster_job_bundles(tmp_path, scheduler):
+    log = tmp_path / "submissions.log"
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    submit = bindir / "submit"
+    query = bindir / "query"
+    if scheduler == "slurm":
+        submit.write_text(
+            FAKE_BUNDLE_SUBMIT.format(
+                python=sys.executable,
+                log=str(log),
+                message="Submitted batch job %s",
+            )
+        )
+        query.write_text(FAKE_BUNDLE_SQUEUE)
+        scheduler_opts = {"sbatch": str(submit), "squeue": str(query)}
+    elif scheduler == "sge":
+        # the pids are logged for qstat to list
+        submit.write_text(
+            FAKE_BUNDLE_SUBMIT.format(
+                python=sys.executable,
+                log=str(tmp_path / "qsub.log"),
+                message='Your job %s ("name") has been submitted',
+            ).replace(
+                "print(*sys.argv[1:], file=f)",
+                "print(os.getpid(), *sys.argv[1:], file=f)",
+            )
+        )
+        query.write_text(
+            FAKE_BUNDLE_QSTAT.format(
+                python=sys.executable,
+                log=str(tmp_path / "qsub.log"),
+            )
+        )
+        scheduler_opts = {"qsub": str(submit), "qstat": str(query)}
+    else:
+        submit.write_text(FAKE_SSH.format(python=sys.executable, log=str(log)))
+        scheduler_opts = {
+            "ssh": str(submit),
+            "servers": {"localhost": {"ctrl_dir": str(tmp_path)}},
+        }
+    submit.chmod(0o755)
+    query.touch()
+    query.chmod(0o755)
+
+    class ClusterBundleProc(Proc):
+        input = "a"
+        input_data = list(range(6))
+        script = "echo {{in.a}} $XQUTE_JOB_INDEX"
+
+    pipeline = Pipen(
+        name=f"{scheduler}_bundle_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        scheduler=scheduler,
+        scheduler_opts=scheduler_opts,
+        forks=6,
+        job_bundle_size=3,
+    ).set_starts(ClusterBundleProc)
+    assert pipeline.run()
+
+    workdir = tmp_path / "workdir" / pipeline.name / ClusterBundleProc.name
+    bundles = [
+        workdir / "0" / f"job.bundle.{scheduler}",
+        workdir / "3" / f"job.bundle.{scheduler}",
+    ]
+    if scheduler == "sge":
+        submissions = [
+            line.split()[-1]
+            for line in (tmp_path / "qsub.log").read_text().splitlines()
+        ]
+        assert sorted(submissions) == list(map(str, bundles))
+    else:
+        # ssh runs the bundles with the wrapper language
+        submissions = [
+            line.split()[-1] for line in log.read_text().splitlines()
+        ]
+        assert sorted(submissions) == list(map(str, bundles))
+
+    bundle = bundles[0].read_text()
+    assert bundle.startswith("#!/usr/bin/env bash\n")
+    if scheduler == "slurm":
+        assert "\n#SBATCH --job-name=" in bundle
+    elif scheduler == "sge":
+        assert "\n#$ -N " in bundle
+
+    jids = [(workdir / str(i) / "job.jid.used").read_text() for i in range(6)]
+    assert jids[0] == jids[1] == jids[2] != jids[3] == jids[4] == jids[5]
+    for i in range(6):
+        # each job runs with its own envs
+        assert (workdir / str(i) / "job.stdout").read_text() == f"{i} {i}\n"
+
+
+@pytest.mark.forked
+async def test_gbatch_job_bundles(tmp_path, monkeypatch):
+    # the files are written to memory instead of the bucket
+    written = {}
+
+    class MemoryFile:
+        def __init__(self, path, mode="r", *args, **kwargs):
+            self.path = str(path)
+            self.mode = mode
+
+        async def __aenter__(self):
+            if "w" in self.mode:
+                written[self.path] = ""
+            else:
+                self.data = written[self.path].encode()
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def read(self, size=-1):
+            data, self.data = self.data, b""
+            return data
+
+        async def write(self, data):
+            written[self.path] += data
+
+    async def a_write_text(self, data, *args, **kwargs):
+        written[str(self)] = data
+
+    async def a_mkdir(self, *args, **kwargs):
+        pass
+
+    async def a_is_false(self):
+        return False
+
+    gspath = type(PanPath("gs://test-bucket"))
+    monkeypatch.setattr(gspath, "a_write_text", a_write_text)
+    monkeypatch.setattr(gspath, "a_mkdir", a_mkdir)
+    monkeypatch.setattr(gspath, "a_is_dir", a_is_false)
+    monkeypatch.setattr(gspath, "a_is_symlink", a_is_false)
+    # where the config files are copied to, to get the local paths
+    monkeypatch.setenv("XQUTE_CLOUD_FSPATH", str(tmp_path))
+    monkeypatch.setattr(
+        gspath,
+        "a_open",
+        lambda self, *args, **kwargs: MemoryFile(self, *args, **kwargs),
+    )
+
+    gbatch = get_scheduler("gbatch")(
+        project="test_project",
+        location="test_location",
+        workdir="gs://test-bucket/workdir",
+    )
+    pipeline = MagicMock(outdir=PanPath("gs://test-bucket/outdir"))
+    pipeline.name = "test_pipeline"
+    proc = MagicMock(pipeline=pipeline, job_bundle_size=3, job_bundle_forks=2)
+    proc.name = "test_proc"
+    await gbatch.init_proc(proc)
+    assert gbatch.job_bundle_size == 3
+
+    jobs = [await gbatch.create_job(i, ["echo", str(i)]) for i in range(3)]
+    for job in jobs:
+        gbatch._bundle_scripts[job.index] = await gbatch.wrapped_job_script(job)
+    bundle = gbatch.bundle_script(jobs)
+    lines = bundle.splitlines()
+    assert lines[0] == "#!/usr/bin/env bash"
+    assert "wc -l) >= 2 ))" in lines[1]
+    for i in range(3):
+        # the scripts are run on the VM with their own envs
+        assert (
+            f"XQUTE_JOB_INDEX={i} XQUTE_METADIR=/mnt/disks/.pipen/test_proc "
+            f"XQUTE_JOB_METADIR=/mnt/disks/.pipen/test_proc/{i} /bin/bash "
+            f"/mnt/disks/.pipen/test_proc/{i}/job.wrapped.gbatch &"
+        ) in lines
+
+    # the bundle is submitted as the first job
+    gbatch._bundle_scripts[0] = jobs[0].metadir / "job.bundle.gbatch"
+    conf_file = await gbatch.job_config_file(jobs[0])
+    assert "/mnt/disks/.pipen/test_proc/0/job.bundle.gbatch" in written[
+        str(conf_file)
+    ]
+
+
+async def test_sge_query_statuses(tmp_path):
+    qstat = tmp_path / "qstat"
+    qstat.write_text(
+        "#!/usr/bin/env bash\n"
+        "cat <<EOF\n"
+        '<?xml version="1.0"?>\n'
+        "<job_info>\n"
+        "  <queue_info>\n"
+        '    <job_list state="running">\n'
+        "      <JB_job_number>101</JB_job_number>\n"
+        "      <state>r</state>\n"
+        "    </job_list>\n"
+        '    <job_list state="running">\n'
+        "      <JB_job_number>102</JB_job_number>\n"
+        "      <state>r</state>\n"
+        "      <tasks>2</tasks>\n"
+        "    </job_list>\n"
+        "  </queue_info>\n"
+        "  <job_info>\n"
+        '    <job_list state="pending">\n'
+        "      <JB_job_number>102</JB_job_number>\n"
+        "      <state>qw</state>\n"
+        "      <tasks>3-7:2</tasks>\n"
+        "    </job_list>\n"
+        "  </job_info>\n"
+        "</job_info>\n"
+        "EOF\n"
+    )
+    qstat.chmod(0o755)
+    sge = SgeScheduler(workdir=tmp_path / "workdir", qstat=str(qstat))
+    assert await sge.query_statuses(
+        ["101", "102.1", "102.2", "102.4", "102.5", "103"]
+    ) == {"101": "r", "102.2": "r", "102.5": "qw"}
+
+    job = await sge.create_job(0, ["echo"])
+    await job.set_jid("102.3")
+    assert await sge.job_is_running(job)
+    # task 1 is done, though the other tasks of the array job are not
+    await job.set_jid("102.1")
+    assert not await sge.job_is_running(job)
+    await job.set_jid("103")
+    assert not await sge.job_is_running(job)
+
+
+async def test_ssh_query_statuses(tmp_path):
+    # runs the command locally
+    ssh = tmp_path / "ssh"
+    ssh.write_text('#!/usr/bin/env bash\nshift 3\nexec "$@"\n')
+    ssh.chmod(0o755)
+    scheduler = SshScheduler(
+        workdir=tmp_path / "workdir",
+        ssh=str(ssh),
+        servers=["localhost"],
+    )
+    proc = await asyncio.create_subprocess_exec("sleep", "10")
+    try:
+        statuses = await scheduler.query_statuses(
+            [f"{proc.pid}@localhost:22", "999999999@localhost:22", "1@other:22"]
+        )
+    finally:
+        proc.kill()
+        await proc.wait()
+    assert statuses == {f"{proc.pid}@localhost:22": "running"}
+
+
+async def test_python_worker_pool(tmp_path):
+    pool = PythonWorkerPool(1, preload=["colorsys"], max_jobs=3, timeout=3)
+
+    async def run(code, index):
+        script = tmp_path / f"script{index}.py"
+        script.write_text(code)
+        rc = await pool.run(
+            index,
+            sys.executable,
+            str(script),
+            str(tmp_path / f"stdout{index}"),
+            str(tmp_path / f"stderr{index}"),
+            envs={"PYWORKER_TEST": index},
+        )
+        return (
+            rc,
+            (tmp_path / f"stdout{index}").read_text(),
+            (tmp_path / f"stderr{index}").read_text(),
+        )
+
+    code = (
+        "import os, sys\n"
+        "os.environ.setdefault('PYWORKER_LEAK', '1')\n"
+        "print(os.getpid(), os.environ['PYWORKER_TEST'], 'colorsys' in sys.modules)\n"
+        "print(os.environ['PYWORKER_LEAK'], file=sys.stderr)\n"
+        "os.environ['PYWORKER_LEAK'] = '2'\n"
+    )
+    rc0, out0, err0 = await run(code, 0)
+    rc1, out1, err1 = await run(code, 1)
+    assert rc0 == rc1 == 0
+    pid, index, preloaded = out0.split()
+    assert (index, preloaded) == ("0", "True")
+    # the same worker, with the environment restored
+    assert out1.split() == [pid, "1", "True"]
+    assert err0 == err1 == "1\n"
+
+    rc, _, err = await run("raise SystemExit('bye')", 2)
+    assert (rc, err) == (1, "bye\n")
+    # recycled after 3 jobs
+    rc, out, _ = await run("import os; print(os.getpid())", 3)
+    assert rc == 0 and out.split()[0] != pid
+    assert pool.spawned == 2
+
+    rc, _, err = await run("raise ValueError('failed')", 4)
+    assert rc == 1
+    assert "_pyworker.py" not in err
+    assert err.strip().endswith("ValueError: failed")
+
+    # crashed
+    rc, _, err = await run("import os; os._exit(3)", 5)
+    assert rc == 3
+    assert "Python worker exited unexpectedly" in err
+    rc, _, err = await run("import os, signal; os.kill(os.getpid(), 9)", 6)
+    assert rc == 137
+    assert (await run("print(1)", 7))[:2] == (0, "1\n")
+
+    rc, _, err = await run("import time; time.sleep(10)", 8)
+    assert rc == 124
+    assert "timed out" in err
+    assert pool.spawned == 4
+    pool.shutdown()
+
+
+def test_pool_job_runner_abstract(tmp_path):
+    class IncompletePoolScheduler(PoolJobRunner, LocalScheduler):
+        def runs_in_pool(self, job):
+            return True
+
+    with pytest.raises(TypeError, match="run_in_pool"):
+        IncompletePoolScheduler(workdir=tmp_path)
+
+
+@pytest.mark.forked
+def test_pyworker_scheduler(tmp_path):
+
+    class PyworkerShell(Proc):
+        input = "a"
+        input_data = list(range(4))
+        output = "a:{{in.a}}"
+        script = "echo $$"
+
+    class PyworkerPython(Proc):
+        requires = PyworkerShell
+        input = "a"
+        output = "outfile:file:{{in.a}}.txt"
+        lang = sys.executable
+        script = """
+            import os
+            with open("{{out.outfile}}", "w") as f:
+                f.write("{{in.a}}")
+            print(os.getpid())
+        """
+
+    pipeline = Pipen(
+        name="pyworker_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+        scheduler="pyworker",
+        scheduler_opts={"workers": 2},
+        forks=4,
+    ).set_starts(PyworkerShell)
+    assert pipeline.run()
+
+    workdir = tmp_path / "workdir" / pipeline.name
+    pids = set()
+    for i in range(4):
+        jobdir = workdir / PyworkerPython.name / str(i)
+        assert (jobdir / "job.rc").read_text() == "0"
+        assert (jobdir / "job.jid.used").read_text().startswith("pyworker.")
+        assert (jobdir / "output" / f"{i}.txt").read_text() == str(i)
+        pids.add((jobdir / "job.stdout").read_text())
+        # bash jobs are run by the wrapper
+        shell_jobdir = workdir / PyworkerShell.name / str(i)
+        assert (shell_jobdir / "job.jid.used").read_text().strip().isdigit()
+
+    assert len(pids) <= 2
+
+
+def _callable_script(in_, out, envs):
+    with open(out.outfile, "w") as f:
+        f.write(str(in_.a * envs.factor))
+    print(in_.a)
+    print("to stderr", file=sys.stderr)
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_callable_scheduler(tmp_path, executor):
+
+    class CallableProc(Proc):
+        input = "a"
+        input_data = list(range(4))
+        output = "outfile:file:{{in.a}}.txt"
+        envs = {"factor": 2}
+        script = _callable_script
+
+    class CallableMethodProc(Proc):
+        requires = CallableProc
+        input = "infile:file"
+        output = "outfile:file:out.txt"
+
+        def script(in_, out, envs):
+            with open(in_.infile) as fin, open(out.outfile, "w") as fout:
+                fout.write(fin.read() + "!")
+
+    def _pipeline():
+        return Pipen(
+            name=f"callable_pipeline_{executor}",
+            workdir=tmp_path / "workdir",
+            outdir=tmp_path / "outdir",
+            # not used by the callable processes
+            scheduler="pyworker",
+            scheduler_opts={"executor": executor},
+            forks=2,
+        ).set_starts(CallableProc)
+
+    pipeline = _pipeline()
+    assert pipeline.run()
+
+    workdir = tmp_path / "workdir" / pipeline.name
+    for i in range(4):
+        jobdir = workdir / CallableProc.name / str(i)
+        assert (jobdir / "job.rc").read_text() == "0"
+        assert (jobdir / "job.jid.used").read_text().startswith("callable.")
+        assert (jobdir / "job.stdout").read_text() == f"{i}\n"
+        assert (jobdir / "job.stderr").read_text() == "to stderr\n"
+        assert "def _callable_script" in (jobdir / "job.script").read_text()
+        assert (
+            tmp_path / "outdir" / CallableMethodProc.name / str(i) / "out.txt"
+        ).read_text() == f"{i * 2}!"
+
+    # cached on the second run
+    mtime = (workdir / CallableProc.name / "0" / "job.rc").stat().st_mtime
+    pipeline = _pipeline()
+    assert pipeline.run()
+    assert (workdir / CallableProc.name / "0" / "job.rc").stat().st_mtime == mtime
+
+
+@pytest.mark.forked
+def test_callable_scheduler_failure(tmp_path):
+
+    class CallableFailProc(Proc):
+        input = "a"
+        input_data = [1]
+
+        def script(in_, out, envs):
+            print("partial")
+            raise ValueError(f"bad {in_.a}")
+
+    pipeline = Pipen(
+        name="callable_failure_pipeline",
+        workdir=tmp_path / "workdir",
+        outdir=tmp_path / "outdir",
+    ).set_starts(CallableFailProc)
+    assert not pipeline.run()
+
+    jobdir = tmp_path / "workdir" / pipeline.name / CallableFailProc.name / "0"
+    assert (jobdir / "job.rc").read_text() == "1"
+    assert (jobdir / "job.stdout").read_text() == "partial\n"
+    stderr = (jobdir / "job.stderr").read_text()
+    assert "ValueError: bad 1" in stderr
+    assert "_callable_pool" not in stderr
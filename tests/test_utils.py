@@ -1,3 +1,4 @@
+import os
 import pytest
 import pipen
 from uuid import uuid4
@@ -69,6 +70,29 @@ async def test_get_mtime_symlink_dir(tmp_path):
     assert mtime > 0
 
 
+@pytest.mark.forked
+async def test_get_mtime_local_depth(tmp_path):
+    tmp_path = PanPath(tmp_path)
+    dir = tmp_path / "dir"
+    subdir = dir / "subdir"
+    subdir.mkdir(parents=True)
+    file1 = dir / "file1"
+    file1.touch()
+    file2 = subdir / "file2"
+    file2.touch()
+    link = dir / "link"
+    link.symlink_to(tmp_path / "nonexist")
+    os.utime(file1, (100, 100))
+    os.utime(file2, (300, 300))
+    os.utime(subdir, (200, 200))
+    os.utime(dir, (50, 50))
+
+    assert await get_mtime(dir, 0) == 50
+    assert await get_mtime(dir, 1) == 200
+    assert await get_mtime(dir, 2) == 300
+    assert await get_mtime(tmp_path / "nonexist") == 0
+
+
 @pytest.mark.forked
 async def test_get_mtime_cloud_file():
     file = PanPath(f"{BUCKET}/pipen-test/channel/test1.txt")